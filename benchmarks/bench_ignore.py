@@ -0,0 +1,106 @@
+"""Microbenchmark: compiled IgnoreMatcher vs. the per-file fnmatch loop.
+
+Also compares IgnoreFiles, reading a `.gitignore` with as many rules, with
+matching each of its rules in turn.
+
+Usage: python benchmarks/bench_ignore.py [PATTERNS] [PATHS]
+"""
+
+import re
+import sys
+import timeit
+from fnmatch import fnmatch
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from emanate.config import Config
+from emanate.gitignore import IgnoreFiles, Rule, _translate
+from emanate.ignore import IgnoreMatcher, _is_dir
+
+
+def legacy_ignored(ignore, path):
+    """The matching loop formerly used by Emanate.valid_file."""
+    ignore_patterns = []
+    for pattern in ignore:
+        ignore_patterns.append(pattern)
+        if _is_dir(pattern):
+            ignore_patterns.append(pattern / "*")
+
+    return any(fnmatch(path, str(pattern)) for pattern in ignore_patterns)
+
+
+def main(n_patterns=300, n_paths=2000):
+    with TemporaryDirectory() as tmpdir:
+        src = Path(tmpdir)
+        for i in range(10):
+            (src / f"vendor{i}").mkdir()
+
+        patterns = [f"vendor{i}/" for i in range(10)]
+        patterns += [f"*.ext{i}" for i in range(n_patterns // 3)]
+        patterns += [f"build{i}/*" for i in range(n_patterns // 3)]
+        patterns += [f"docs/file{i}.md" for i in range(n_patterns // 3)]
+        ignore = Config.defaults(src).merge(
+            Config({'ignore': patterns}).resolve(src),
+        ).ignore
+
+        paths = [str(src / f".config/app{i % 50}/sub/file{i}.conf")
+                 for i in range(n_paths)]
+
+        matcher = IgnoreMatcher(ignore)
+        assert [matcher(p) for p in paths] == \
+            [legacy_ignored(ignore, p) for p in paths]
+
+        legacy = timeit.timeit(
+            lambda: [legacy_ignored(ignore, p) for p in paths], number=1)
+
+        def compiled_run():
+            # Include the cost of building the matcher, paid once per run.
+            ignored = IgnoreMatcher(ignore)
+            return [ignored(p) for p in paths]
+
+        compiled = timeit.timeit(compiled_run, number=1)
+
+        print(f"{len(ignore)} patterns, {len(paths)} paths")
+        print(f"legacy fnmatch loop: {legacy * 1e3:9.2f} ms")
+        print(f"IgnoreMatcher:       {compiled * 1e3:9.2f} ms "
+              f"({legacy / compiled:.0f}x)")
+
+        rules = [f"vendor{i}/" for i in range(10)]
+        rules += [f"*.ext{i}" for i in range(n_patterns // 4)]
+        rules += [f"/build{i}" for i in range(n_patterns // 4)]
+        rules += [f"docs/**/file{i}.md" for i in range(n_patterns // 4)]
+        rules += [f"!keep{i}.ext0" for i in range(n_patterns // 4)]
+        (src / ".gitignore").write_text("\n".join(rules))
+        paths += [str(src / f"keep{i}.ext0") for i in range(n_paths // 10)]
+
+        def rule_by_rule(path):
+            # Match each rule in turn; the last one matching wins.
+            rel = path[len(str(src)) + 1:]
+            verdict = False
+            for rule in map(Rule.parse, rules):
+                target = rel if rule.anchored else rel.rpartition("/")[2]
+                if not rule.dir_only and re.fullmatch(_translate(rule.pattern), target):
+                    verdict = not rule.negate
+            return verdict
+
+        def ignore_files_run():
+            # Include reading and compiling the file (if it changed), once per run.
+            ignored = IgnoreFiles(str(src), [".gitignore"], lambda *_: False)
+            return [ignored(p) for p in paths]
+
+        assert ignore_files_run() == [rule_by_rule(p) for p in paths]
+        naive = timeit.timeit(lambda: [rule_by_rule(p) for p in paths], number=1)
+        IgnoreFiles._cache.clear()  # pylint: disable=protected-access
+        cold = timeit.timeit(ignore_files_run, number=1)
+        cached = timeit.timeit(ignore_files_run, number=1)
+
+        print(f"{len(rules)} ignore file rules, {len(paths)} paths")
+        print(f"rule by rule:        {naive * 1e3:9.2f} ms")
+        print(f"IgnoreFiles (cold):  {cold * 1e3:9.2f} ms ({naive / cold:.0f}x)")
+        print(f"IgnoreFiles:         {cached * 1e3:9.2f} ms ({naive / cached:.0f}x)")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,75 @@
+"""Compare the memory used by plans held as `FilePair` lists and as `Plan`.
+
+Plans are built from a synthetic tree of each size, and measured with
+`tracemalloc`. Results are printed as JSON.
+
+Usage: python benchmarks/bench_plan_memory.py [--output FILE] [SIZE ...]
+"""
+
+import json
+import sys
+import tracemalloc
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic import make_tree
+
+from emanate import Emanate, __version__
+from emanate.config import Config
+from emanate.plan import Plan
+
+
+def measure(build):
+    """Return the number of entries built, and the memory they hold on to."""
+    tracemalloc.start()
+    try:
+        value = build()
+        size, _peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"entries": len(value), "bytes": size}
+
+
+def bench(size):
+    with TemporaryDirectory() as tmpdir:
+        src = make_tree(Path(tmpdir), size)
+        emanate = Emanate(Config.from_json(src / "emanate.json"),
+                          Config({"source": src, "destination": Path(tmpdir) / "dest"}))
+        # Walk once beforehand, so caches don't count towards either result.
+        actions = list(emanate.plan())
+
+        filepairs = measure(lambda: list(emanate.plan()))
+        compact = measure(lambda: Plan(src.absolute(), emanate.dest, emanate.plan()))
+        assert list(Plan(src.absolute(), emanate.dest, actions)) == actions
+        return {
+            "files": size,
+            "FilePair": filepairs,
+            "Plan": compact,
+            "ratio": round(filepairs["bytes"] / max(1, compact["bytes"]), 2),
+        }
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("sizes", nargs="*", type=int, default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    results = {
+        "emanate": __version__,
+        "python": sys.version.split()[0],
+        "results": [bench(size) for size in args.sizes],
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Benchmark Emanate on synthetic trees of increasing size.
+
+Times configuration loading, dry-runs, `create` and `clean`, and counts the
+filesystem calls made during each phase. Results are printed as JSON, so they
+can be compared between commits.
+
+Usage: python benchmarks/bench_scale.py [--output FILE] [SIZE ...]
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from collections import Counter
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic import make_tree
+
+from emanate import Emanate, __version__
+from emanate.config import Config
+
+# Filesystem calls counted during each phase.
+SYSCALLS = ("stat", "lstat", "scandir", "listdir", "mkdir", "symlink",
+            "readlink", "unlink", "rename", "replace")
+
+
+@contextlib.contextmanager
+def count_syscalls():
+    """Count calls to the functions in SYSCALLS (from the os module)."""
+    counts: Counter = Counter()
+    originals = {name: getattr(os, name) for name in SYSCALLS}
+
+    def counting(name, func):
+        def wrapper(*args, **kwargs):
+            counts[name] += 1
+            return func(*args, **kwargs)
+        return wrapper
+
+    for name, func in originals.items():
+        setattr(os, name, counting(name, func))
+    try:
+        yield counts
+    finally:
+        for name, func in originals.items():
+            setattr(os, name, func)
+
+
+def measure(func):
+    """Run `func` quietly, returning its wall time and filesystem calls."""
+    with count_syscalls() as counts, contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+    return {"seconds": round(elapsed, 4), "syscalls": dict(counts)}
+
+
+def bench(size):
+    with TemporaryDirectory() as tmpdir:
+        src = make_tree(Path(tmpdir), size)
+        config = src / "emanate.json"
+
+        def load():
+            return Emanate(Config.from_json(config), Config({"source": src}))
+
+        return {
+            "files": size,
+            "config": measure(load),
+            "dry-run": measure(lambda: load().create().dry()),
+            "create": measure(lambda: load().create().run()),
+            "create (no-op)": measure(lambda: load().create().run()),
+            "clean": measure(lambda: load().clean().run()),
+        }
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("sizes", nargs="*", type=int, default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    results = {
+        "emanate": __version__,
+        "python": sys.version.split()[0],
+        "results": [bench(size) for size in args.sizes],
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
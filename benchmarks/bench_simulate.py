@@ -0,0 +1,99 @@
+"""Simulate Emanate rollouts on in-memory trees, and check them exactly.
+
+Builds synthetic trees (see `synthetic.py`) in a `MemoryFileSystem`, then
+times planning, `create` and `clean` without touching the disk. After each
+phase, the destination is compared with the expected result: every file that
+isn't ignored is linked after `create`, and no link is left after `clean`.
+Results are printed as JSON, so they can be compared between commits.
+
+Usage: python benchmarks/bench_simulate.py [--output FILE] [SIZE ...]
+"""
+
+import contextlib
+import io
+import json
+import os
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic import layout, make_memory_tree
+
+from emanate import Emanate, __version__
+from emanate.config import Config
+from emanate.fs import MemoryFileSystem
+
+ROOT = Path("/simulation")
+
+
+def measure(func):
+    """Run `func` quietly, returning its wall time and result."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+    return round(elapsed, 4), result
+
+
+def links(fs, dest: Path):
+    """Map the relative path of each link under `dest` to its target."""
+    found = {}
+    for name in fs.listdir(dest):
+        path = dest / name
+        if fs.islink(path):
+            found[name] = fs.readlink(path)
+        elif fs.is_dir(path):
+            found.update({os.path.join(name, rel): target
+                          for rel, target in links(fs, path).items()})
+    return found
+
+
+def bench(size):
+    fs = MemoryFileSystem()
+    seconds, src = measure(lambda: make_memory_tree(fs, ROOT, size))
+    dest = ROOT / "dest"
+    expected = {
+        rel: str(src / rel) for rel, is_dir in layout(size)
+        if not is_dir and not rel.startswith(".git" + os.sep) and not rel.endswith("~")
+    }
+
+    def load():
+        return Emanate(Config({"confirm": False, "source": src, "destination": dest}),
+                       fs=fs)
+
+    result = {"files": size, "populate": seconds}
+    result["plan"], result["actions"] = measure(lambda: sum(1 for _ in load().plan()))
+    result["create"], _ = measure(lambda: load().create().run())
+    created = links(fs, dest)
+    result["create (no-op)"], _ = measure(lambda: load().create().run())
+    result["clean"], _ = measure(lambda: load().clean().run())
+    result["exact"] = created == expected and not links(fs, dest)
+    return result
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("sizes", nargs="*", type=int, default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    results = {
+        "emanate": __version__,
+        "python": sys.version.split()[0],
+        "results": [bench(size) for size in args.sizes],
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+    if not all(result["exact"] for result in results["results"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
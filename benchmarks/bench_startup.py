@@ -0,0 +1,117 @@
+"""Measure Emanate's startup time, and check it against a budget.
+
+Runs trivial commands (`--version`) and a dry-run on an empty tree, from the
+sources and from zipapps (with and without bytecode, see
+scripts/build_zipapp.py). For each, the wall time is measured, along with the
+import time reported by `python -X importtime` (minus that of Python starting
+up on its own). Results are printed as JSON; if the import time of
+`emanate --version` (from the sources) exceeds `--budget` milliseconds, the
+exit status is 1.
+
+Usage: python benchmarks/bench_startup.py [--budget MS] [--runs N] [--output FILE]
+"""
+
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from argparse import ArgumentParser
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "scripts"))
+
+from build_zipapp import ROOT, build
+
+from emanate import __version__
+
+_IMPORT_TIME = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \| (\S+)$")
+
+
+def import_time(command):
+    """Return the total time spent importing modules (in ms), for `command`."""
+    # Nested imports are indented, and don't match.
+    result = subprocess.run([sys.executable, "-X", "importtime", *command],
+                            capture_output=True, text=True, check=True,
+                            env={**os.environ, "PYTHONPATH": str(ROOT)})
+    total = 0
+    for line in result.stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        # Only count top-level imports: their time includes nested ones.
+        if match:
+            total += int(match.group(1))
+    return total / 1000
+
+
+def baseline():
+    """Return the import time (in ms) of Python itself starting up."""
+    return min(import_time(["-c", "pass"]) for _ in range(3))
+
+
+def wall_time(command, runs):
+    """Return the median wall time (in ms) of `command`, over `runs` runs."""
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, *command], capture_output=True, check=True,
+                       env={**os.environ, "PYTHONPATH": str(ROOT)})
+        times.append(time.perf_counter() - start)
+    return round(statistics.median(times) * 1000, 2)
+
+
+def bench(runs):
+    with TemporaryDirectory() as tmpdir:
+        tmp = Path(tmpdir)
+        (tmp / "src").mkdir()
+        (tmp / "dest").mkdir()
+        targets = {
+            "source": ["-m", "emanate"],
+            "zipapp": [str(build(tmp / "plain.pyz", compiled=False))],
+            "zipapp (bytecode)": [str(build(tmp / "compiled.pyz"))],
+        }
+        commands = {
+            "--version": ["--version"],
+            "dry-run": ["--source", str(tmp / "src"), "--destination",
+                        str(tmp / "dest"), "--dry-run"],
+        }
+        start = baseline()
+        return {
+            f"{target} {name}": {
+                "wall_ms": wall_time(prefix + args, runs),
+                "import_ms": round(import_time(prefix + args) - start, 3),
+            }
+            for target, prefix in targets.items()
+            for name, args in commands.items()
+        }
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget", type=float, default=20.0,
+                        help="Maximum import time of `emanate --version`, in ms.")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--output", type=Path, default=None)
+    args = parser.parse_args()
+
+    results = {
+        "emanate": __version__,
+        "python": sys.version.split()[0],
+        "budget_ms": args.budget,
+        "results": bench(args.runs),
+    }
+    output = json.dumps(results, indent=2)
+    if args.output:
+        args.output.write_text(output + "\n")
+    else:
+        print(output)
+
+    if results["results"]["source --version"]["import_ms"] > args.budget:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""Synthetic, dotfile-like source trees for Emanate's benchmarks."""
+
+import json
+import os
+from pathlib import Path
+
+
+def layout(n_files: int):
+    """Yield the directories and files of a synthetic tree, relative to it.
+
+    The tree looks like a (large) dotfiles repository: roughly a third of the
+    files are in `.git/`, most of the rest live in a deep `.config/`
+    hierarchy, and a few are editor backups matched by the default ignores.
+    Directories are yielded (as `(path, True)`) before their contents.
+    """
+    git = n_files // 3
+    objects = os.path.join(".git", "objects")
+    for i in range(256):
+        yield os.path.join(objects, f"{i:02x}"), True
+    for i in range(git):
+        yield os.path.join(objects, f"{i % 256:02x}", f"{i:038x}"), False
+
+    rest = n_files - git
+    for i in range(rest):
+        app, sub = i % 200, (i // 200) % 10
+        directory = os.path.join(".config", f"app{app}", f"sub{sub}", "deep")
+        if i < 2000:
+            yield directory, True
+        name = f"file{i}~" if i % 50 == 0 else f"file{i}.conf"
+        yield os.path.join(directory, name), False
+
+    for name in (".bashrc", ".profile", ".vimrc", ".gitconfig", ".tmux.conf"):
+        yield name, False
+
+
+def _config(n_ignores: int) -> str:
+    return json.dumps({
+        "destination": "../dest",
+        "ignore": [f"*.unused{i}" for i in range(n_ignores)],
+    })
+
+
+def make_tree(root: Path, n_files: int, n_ignores: int = 100) -> Path:
+    """Populate `root/src` with about `n_files` files, and return it.
+
+    The tree is described in `layout`. `emanate.json` adds `n_ignores` glob
+    patterns, which match nothing.
+    """
+    src = root / "src"
+    src.mkdir()
+
+    for rel, is_dir in layout(n_files):
+        if is_dir:
+            os.makedirs(os.path.join(src, rel), exist_ok=True)
+        else:
+            with open(os.path.join(src, rel), "w"):
+                pass
+
+    (src / "emanate.json").write_text(_config(n_ignores))
+    (root / "dest").mkdir()
+    return src
+
+
+def make_memory_tree(fs, root: Path, n_files: int, n_ignores: int = 100) -> Path:
+    """Like `make_tree`, in a `MemoryFileSystem`."""
+    src = root / "src"
+    fs.makedirs(src)
+
+    for rel, is_dir in layout(n_files):
+        if is_dir:
+            fs.makedirs(src / rel)
+        else:
+            fs.open(src / rel, "w").close()
+
+    fs.populate(src / "emanate.json", _config(n_ignores))
+    fs.mkdir(root / "dest")
+    return src
@@ -0,0 +1,166 @@
+"""Asynchronous API, for embedding Emanate in asyncio applications.
+
+Walking the source and changing the destination block, and `ask` conflict
+policies prompt on the standard input. `emanate.aio` moves that work off the
+event loop: planning and applying run in an executor (the loop's default
+one, which is bounded, unless another is given), a batch of actions at a
+time, so many `Emanate` instances (for different users, say) can run
+concurrently in one process, sharing the executor's threads.
+
+Conflicts are confirmed by an optional async callback, awaited on the event
+loop while the worker thread waits for the answer. Runs can be cancelled
+between batches: the batch in progress is finished, then the execution is
+stopped as by `Execution.steps`, recording what was applied so far.
+
+`Emanate.acreate`, `Emanate.aclean` and `Emanate.aplan` are shortcuts to the
+functions of this module.
+"""
+
+import asyncio
+import copy
+import threading
+from collections.abc import (
+    AsyncGenerator,
+    AsyncIterator,
+    Coroutine,
+    Iterable,
+    Iterator,
+    Sequence,
+)
+from concurrent.futures import Executor
+from itertools import islice
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, TypeVar
+
+if TYPE_CHECKING:
+    from .core import Emanate, Execution
+    from .output import Output
+    from .plan import FilePair
+
+T = TypeVar('T')  # pylint: disable=invalid-name
+
+# Actions planned or applied by each call to the executor.
+BATCH_SIZE = 256
+
+# Called with the files in the way of links, returning whether to replace them.
+Confirm = Callable[[Sequence[Path]], Coroutine[Any, Any, bool]]
+
+
+class _Batches:
+    """Consume an iterator in batches, from any thread (one at a time)."""
+
+    __slots__ = ('_iterator', '_lock')
+
+    def __init__(self, iterator: 'Iterator[Any]'):
+        self._iterator = iterator
+        self._lock = threading.Lock()
+
+    def next(self, size: int) -> 'list[Any]':
+        with self._lock:
+            return list(islice(self._iterator, size))
+
+    def close(self):
+        """Close the iterator, once the batch in progress (if any) is done."""
+        with self._lock:
+            close = getattr(self._iterator, 'close', None)
+            if close is not None:
+                close()
+
+
+async def _batches(iterator: 'Iterable[T]', executor: 'Executor | None',
+                   batch: int) -> 'AsyncGenerator[list[T], None]':
+    loop = asyncio.get_running_loop()
+    batches = _Batches(iter(iterator))
+    try:
+        while True:
+            items = await loop.run_in_executor(executor, batches.next, batch)
+            if not items:
+                return
+            yield items
+    except BaseException:
+        # Also on cancellation: the worker may still be in the middle of a
+        # batch, so closing waits for it. Closing is shielded, as it records
+        # what was applied.
+        await asyncio.shield(loop.run_in_executor(executor, batches.close))
+        raise
+
+
+async def iterate(iterator: 'Iterable[T]', executor: 'Executor | None' = None,
+                  batch: int = BATCH_SIZE) -> 'AsyncIterator[T]':
+    """Iterate over a blocking iterator, consumed in batches in `executor`."""
+    batches = _batches(iterator, executor, batch)
+    try:
+        async for items in batches:
+            for item in items:
+                yield item
+    finally:
+        # If the caller stops early, the iterator is closed right away.
+        await batches.aclose()
+
+
+async def run(execution: 'Execution', output: 'Output | None' = None,
+              executor: 'Executor | None' = None, batch: int = BATCH_SIZE):
+    """Run an execution, applying batches of actions in `executor`."""
+    async for _ in _batches(execution.steps(output), executor, batch):
+        pass
+
+
+def _confirming(emanate: 'Emanate', confirm: 'Confirm | None',
+                loop: asyncio.AbstractEventLoop) -> 'Emanate':
+    """Return a copy of `emanate`, prompting through `confirm` on `loop`."""
+    if confirm is None:
+        return emanate
+    prompt = confirm
+
+    def ask(paths: 'Sequence[Path]') -> bool:
+        if not emanate.conf.confirm:
+            return True
+        # Called from worker threads, while the loop is free.
+        return asyncio.run_coroutine_threadsafe(prompt(list(paths)), loop).result()
+
+    other = copy.copy(emanate)
+    other.confirm_replace = lambda path: ask([path])  # type: ignore
+    other.confirm_conflicts = ask  # type: ignore[method-assign]
+    return other
+
+
+async def _execute(emanate: 'Emanate', operation: str, output: 'Output | None',
+                   confirm: 'Confirm | None', executor: 'Executor | None',
+                   batch: int):
+    loop = asyncio.get_running_loop()
+    instance = _confirming(emanate, confirm, loop)
+    # Preparing an execution reads the manifest (and snapshot) already.
+    execution = await loop.run_in_executor(executor, getattr(instance, operation))
+    try:
+        await run(execution, output, executor, batch)
+    finally:
+        emanate.run_stats = instance.run_stats
+
+
+async def create(emanate: 'Emanate', output: 'Output | None' = None, *,
+                 confirm: 'Confirm | None' = None,
+                 executor: 'Executor | None' = None, batch: int = BATCH_SIZE):
+    """Create links, like `Emanate.create().run()`, without blocking the loop.
+
+    If given, `confirm` is awaited with the files in the way of links when
+    the conflict policy asks for confirmation (one file at a time for `ask`,
+    all of them for `ask-once`), instead of prompting on the standard input.
+    """
+    await _execute(emanate, 'create', output, confirm, executor, batch)
+
+
+async def clean(emanate: 'Emanate', output: 'Output | None' = None, *,
+                executor: 'Executor | None' = None, batch: int = BATCH_SIZE):
+    """Remove links, like `Emanate.clean().run()`, without blocking the loop."""
+    await _execute(emanate, 'clean', output, None, executor, batch)
+
+
+def plan(emanate: 'Emanate', clean: bool = False,  # pylint: disable=redefined-outer-name
+         executor: 'Executor | None' = None,
+         batch: int = BATCH_SIZE) -> 'AsyncIterator[FilePair]':
+    """Iterate over the actions planned by `Emanate.plan`, without blocking the loop."""
+    def planned() -> 'Iterator[FilePair]':
+        # Even preparing the plan (loading the manifest) is done in `executor`.
+        yield from emanate.plan(clean)
+
+    return iterate(planned(), executor, batch)
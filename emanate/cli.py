@@ -20,13 +20,29 @@ directory, allowing usages such as:
 See `emanate --help` for all command-line options.
 
 """
-from argparse import ArgumentParser, SUPPRESS
-from pathlib import Path
-from . import Emanate, __author__, __version__
-from .config import Config
+# Most imports are deferred until they are needed, so that trivial commands
+# (such as `emanate --version`) start quickly.
+# pylint: disable=import-outside-toplevel
+import sys
+from . import __author__, __version__
+
+# Not imported from `typing`, which is slow to import; type checkers treat
+# this the same way.
+TYPE_CHECKING = False
+if TYPE_CHECKING:
+    from .core import Emanate
+
+# Arguments answered without parsing the command line (or importing Emanate).
+_TRIVIAL = (['--version'], ['version'])
 
 
 def _arg_parser():
+    from argparse import SUPPRESS, ArgumentParser
+    from pathlib import Path
+
+    from .core import CONFLICT_POLICIES, INSTALL_MODES
+    from .output import FORMATS
+
     argparser = ArgumentParser(
         description="Link files from one directory to another",
         argument_default=SUPPRESS,
@@ -34,6 +50,12 @@ def _arg_parser():
     argparser.add_argument("--destination",
                            metavar="DESTINATION",
                            help="Directory containing the symbolic links.")
+    argparser.add_argument("--fan-out",
+                           metavar="DESTINATION",
+                           action="append",
+                           dest="destinations",
+                           help="Another directory to link into, walking the "
+                                "source only once (may be repeated).")
     argparser.add_argument("--dry-run",
                            action="store_false",
                            default=True,
@@ -44,10 +66,69 @@ def _arg_parser():
                            type=Path,
                            default=Path.cwd(),
                            help="Directory holding the files to symlink.")
+    argparser.add_argument("--packages",
+                           metavar="SOURCE",
+                           action="append",
+                           help="A source directory to link together with the "
+                                "others, checking for conflicts between them "
+                                "first (may be repeated).")
     argparser.add_argument("--no-confirm",
                            action="store_false",
                            dest="confirm",
                            help="Don't prompt before replacing a file.")
+    argparser.add_argument("--fold",
+                           action="store_true",
+                           help="Link whole directories which don't exist in "
+                                "the destination.")
+    argparser.add_argument("--atomic",
+                           action="store_true",
+                           help="Replace files atomically, and journal every "
+                                "action so an interrupted run can be resumed "
+                                "or rolled back.")
+    argparser.add_argument("--mode",
+                           choices=INSTALL_MODES,
+                           help="How files are installed: as symbolic links, "
+                                "or as copies (sharing data blocks with the "
+                                "source, for 'reflink').")
+    argparser.add_argument("--conflicts",
+                           choices=CONFLICT_POLICIES,
+                           help="How to handle files in the way of links; all "
+                                "policies but 'ask' handle them in one batch, "
+                                "before linking.")
+    argparser.add_argument("--ignore-files",
+                           metavar="NAME",
+                           action="append",
+                           help="Name of gitignore-style files to read from "
+                                "each source directory, such as .gitignore "
+                                "(may be repeated).")
+    argparser.add_argument("--incremental",
+                           action="store_true",
+                           help="Only look at directories changed since the "
+                                "last incremental run.")
+    argparser.add_argument("--jobs", "-j",
+                           metavar="N",
+                           type=int,
+                           help="Number of links to create or remove in parallel.")
+    argparser.add_argument("--scan-jobs",
+                           metavar="N",
+                           type=int,
+                           help="Number of top-level source directories to "
+                                "walk concurrently.")
+    argparser.add_argument("--scan-processes",
+                           action="store_true",
+                           help="Walk source directories in worker processes, "
+                                "rather than threads.")
+    argparser.add_argument("--verify",
+                           action="store_true",
+                           help="Check every link once they were all created.")
+    argparser.add_argument("--stats",
+                           action="store_true",
+                           help="Print statistics about the run when done.")
+    argparser.add_argument("--format",
+                           choices=("text",) + tuple(FORMATS),
+                           default="text",
+                           help="Output format: human-readable text, JSON Lines "
+                                "or NUL-separated fields.")
     argparser.add_argument("--config",
                            metavar="CONFIG_FILE",
                            default=None,
@@ -63,7 +144,24 @@ def _arg_parser():
     subcommands = argparser.add_subparsers(dest='command')
     subcommands.add_parser('clean')
     subcommands.add_parser('create')
+    subcommands.add_parser('resume',
+                           help="Finish an interrupted run, from its journal.")
+    subcommands.add_parser('rollback',
+                           help="Undo an interrupted run, from its journal.")
+    subcommands.add_parser('status',
+                           aliases=['verify'],
+                           help="Check every link without changing anything. "
+                                "Exits with 0 if all are linked (or copied), 1 "
+                                "if some are missing, dangling or outdated, and "
+                                "2 if other files or links are in the way.")
     subcommands.add_parser('version')
+    watch = subcommands.add_parser('watch')
+    watch.add_argument("--debounce",
+                       metavar="SECONDS",
+                       type=float,
+                       default=0.2,
+                       help="Wait for the source to be quiet for this long "
+                            "before applying changes.")
 
     return argparser
 
@@ -71,6 +169,67 @@ def _parse_args(args=None):
     return _arg_parser().parse_args(args)
 
 
+def _packages(args, top, sources):
+    """Prepare an execution for several packages, each with its own config.
+
+    The configuration listing the packages (`top`) applies to each of them,
+    overridden by the package's own configuration file.
+    """
+    from pathlib import Path
+
+    from . import packages
+    from .config import Config
+    from .core import Emanate
+
+    shared = None if top is None else \
+        Config({key: value for key, value in top.items() if key not in ('packages', 'source')})
+    instances = []
+    for source in sources:
+        config = source / "emanate.json"
+        instances.append(Emanate(
+            shared,
+            Config.from_json(config) if config.exists() else None,
+            Config(vars(args), source=source).resolve(Path.cwd()),
+        ))
+
+    jobs = instances[0].conf.jobs if instances else 1
+    if args.command == 'clean':
+        return packages.clean(instances, jobs)
+
+    try:
+        return packages.create(instances, jobs)
+    except packages.ConflictError as error:
+        raise SystemExit(str(error)) from error
+
+
+# Exit codes of `emanate status`, suitable for monitoring: anything which
+# `emanate create` would fix is a warning.
+STATUS_CODES = {
+    'linked': 0,
+    'missing': 1,
+    'dangling': 1,
+    'conflicting': 2,
+    'elsewhere': 2,
+    # Files installed as copies.
+    'copied': 0,
+    'outdated': 1,
+}
+
+
+def status(emanate: 'Emanate') -> int:
+    """Print the state of each link and a summary, returning the exit code."""
+    from collections import Counter
+
+    counts: Counter[str] = Counter()
+    for state, pair in emanate.status():
+        counts[state] += 1
+        print(f"{state}: {str(pair.dest)!r}")
+
+    print(", ".join(f"{state} {counts[state]}" for state in STATUS_CODES),
+          file=sys.stderr)
+    return max((STATUS_CODES[state] for state in counts), default=0)
+
+
 def version():
     print(f"Emanate v{__version__} by {__author__}.")
 
@@ -84,29 +243,71 @@ def main(args=None):
     - the configuration file overrides defaults;
     - command-line arguments override everything.
     """
+    if (sys.argv[1:] if args is None else list(args)) in _TRIVIAL:
+        version()
+        return
+
     args = _parse_args(args)
 
     if args.command == "version" or args.version:
         version()
         return
 
+    from pathlib import Path
+
+    from .config import Config
+    from .core import ConflictingFilesError, Emanate
+    from .output import FORMATS
+
     if args.config is None:
         args.config = args.source / "emanate.json"
 
-    emanate = Emanate(
-        Config.from_json(args.config) if args.config.exists() else None,
-        Config(vars(args)).resolve(Path.cwd()),
-    )
+    config = Config.from_json(args.config) if args.config.exists() else None
+    emanate = Emanate(config, Config(vars(args)).resolve(Path.cwd()))
+
+    output = FORMATS[args.format]() if args.format in FORMATS else None
+
+    if args.command in ('status', 'verify'):
+        code = status(emanate)
+        if code:
+            raise SystemExit(code)
+        return
 
-    if args.command is None or args.command == 'create':
+    if args.command == 'watch':
+        from .watch import Watcher
+        watcher = Watcher(emanate, args.debounce)
+        try:
+            watcher.run(lambda e: e.run(output) if args.exec else e.dry(output))
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+        return
+
+    if emanate.conf.get('packages') and args.command in (None, 'create', 'clean'):
+        execute = _packages(args, config, emanate.conf.packages)
+    elif emanate.conf.get('destinations') and args.command in (None, 'create', 'clean'):
+        execute = emanate.fan_out(emanate.conf.destinations,
+                                  clean=args.command == 'clean')
+    elif args.command is None or args.command == 'create':
         execute = emanate.create()
     elif args.command == 'clean':
         execute = emanate.clean()
+    elif args.command == 'resume':
+        execute = emanate.resume()
+    elif args.command == 'rollback':
+        execute = emanate.rollback()
     else:
         # Should be unreachable, as argparse already validated the command.
         raise AssertionError(f"emanate.main: Unknown command '{args.command}'")
 
-    if args.exec:
-        execute.run()
-    else:
-        execute.dry()
+    try:
+        if args.exec:
+            execute.run(output)
+        else:
+            execute.dry(output)
+    except ConflictingFilesError as error:
+        raise SystemExit(str(error)) from error
+
+    if execute.stats is not None:
+        execute.stats.report()
@@ -12,8 +12,10 @@ from collections.abc import Iterable
 
 
 PATHS = frozenset(('destination', 'source',))
-PATH_SETS = frozenset(('ignore',))
-PATH_KEYS = PATHS.union(PATH_SETS)
+PATH_SETS = frozenset(('copy', 'ignore', 'reflink',))
+# Unlike sets, lists of paths keep their order (and duplicates).
+PATH_LISTS = frozenset(('destinations', 'packages',))
+PATH_KEYS = PATHS.union(PATH_SETS, PATH_LISTS)
 
 class Config(dict):
     """Simple wrapper around dict, allowing accessing values as attributes."""
@@ -39,8 +41,18 @@ class Config(dict):
         of Path.home() at the time it was called.
         """
         return cls({
+            'atomic': False,
             'confirm': True,
             'destination': Path.home(),
+            'fold': False,
+            'incremental': False,
+            'ignore_files': (),
+            'jobs': 1,
+            'mode': 'link',
+            'scan_jobs': 1,
+            'scan_processes': False,
+            'stats': False,
+            'verify': False,
             'ignore': frozenset((
                 "*~",
                 ".*~",
@@ -74,13 +86,14 @@ class Config(dict):
             assert isinstance(result[key], (str, Path))
             result[key] = rel_to / Path(result[key]).expanduser()
 
-        for key in PATH_SETS:
+        for key in PATH_SETS.union(PATH_LISTS):
             if key not in result:
                 continue
 
             assert isinstance(result[key], Iterable)
             assert all((isinstance(p, (Path, str)) for p in result[key]))
-            result[key] = frozenset((rel_to / Path(p).expanduser() for p in result[key]))
+            paths = (rel_to / Path(p).expanduser() for p in result[key])
+            result[key] = tuple(paths) if key in PATH_LISTS else frozenset(paths)
 
         return result
 
@@ -144,7 +157,7 @@ class Config(dict):
             if not self[key].is_absolute():
                 return False
 
-        for key in PATH_SETS:
+        for key in PATH_SETS.union(PATH_LISTS):
             if key not in self:
                 continue
 
@@ -0,0 +1,1278 @@
+"""Core of the Emanate symbolic link manager.
+
+`emanate.core` defines `Emanate`, which plans and applies the links between
+a source and destination directory, and `Execution`, which applies planned
+actions. Both are available from the `emanate` package itself, which only
+imports this module when they are first used.
+"""
+
+import copy
+import os
+import sys
+import threading
+from collections import deque
+from collections.abc import (
+    AsyncIterator,
+    Generator,
+    Iterable,
+    Iterator,
+    Mapping,
+    Sequence,
+)
+from collections.abc import Set as AbstractSet
+from contextvars import ContextVar
+from dataclasses import dataclass
+from operator import methodcaller
+from pathlib import Path
+from stat import S_ISDIR, S_ISLNK, S_ISREG
+from typing import Any, Callable, Generic, TypeVar
+
+from .config import Config
+from .dirfd import Paths, applier
+from .fs import FileSystem, OSFileSystem
+from .gitignore import IgnoreFiles
+from .ignore import IgnoreMatcher
+from .journal import Journal
+from .manifest import Manifest
+from .output import Output
+from .plan import FilePair, Link, Mkdir, Overwrite, Plan, Replace, Skip, Unfold, Unlink
+from .runstats import RunStats
+from .snapshot import Snapshot, fingerprint
+from .statcache import StatCache
+from .version import __version__
+from .walk import Lister, walk, walk_sharded
+
+# How files in the way of links are handled:
+# - `ask`: prompt before replacing each file (keeping a backup);
+# - `ask-once`: list every conflict first, and prompt once for all of them;
+# - `backup`: rename them, adding the `.emanate` suffix;
+# - `skip`: leave them (and don't link them);
+# - `overwrite`: remove them (directories are backed up instead);
+# - `fail`: raise ConflictingFilesError, before anything is done.
+CONFLICT_POLICIES = ('ask', 'ask-once', 'backup', 'skip', 'overwrite', 'fail')
+
+# How files are installed in the destination:
+# - `link`: as symbolic links to the source;
+# - `copy`: as copies, made within the kernel where possible;
+# - `reflink`: as copies sharing the source's data blocks, on filesystems
+#   supporting it (such as Btrfs or XFS), and plain copies otherwise.
+INSTALL_MODES = ('link', 'copy', 'reflink')
+
+T = TypeVar('T')  # pylint: disable=invalid-name
+R = TypeVar('R')  # pylint: disable=invalid-name
+
+
+class ConflictingFilesError(Exception):
+    """Raised when files are in the way of links, with the `fail` policy."""
+
+    def __init__(self, paths: 'Sequence[Path]'):
+        self.paths = list(paths)
+        lines = [f"{len(self.paths)} file(s) in the way:"]
+        lines += [repr(str(path)) for path in self.paths]
+        super().__init__("\n".join(lines))
+
+
+def _same_copy(src_stat: 'os.stat_result | None',
+               dest_stat: 'os.stat_result | None') -> bool:
+    """Check whether the destination is a regular file as large and recent as the source."""
+    return src_stat is not None and dest_stat is not None and \
+        S_ISREG(dest_stat.st_mode) and dest_stat.st_size == src_stat.st_size and \
+        dest_stat.st_mtime_ns == src_stat.st_mtime_ns
+
+
+def _pruning(listdir: Lister, prune: 'set[str]') -> Lister:
+    """Wrap a directory lister, so directories in `prune` appear empty."""
+    def wrapper(root: str, ignored, relpath: str = ''):
+        if os.path.join(root, relpath) in prune:
+            return []
+        return listdir(root, ignored, relpath)
+    return wrapper
+
+
+def _unbound(args: 'FilePair | _Bound') -> FilePair:
+    return args.args if isinstance(args, _Bound) else args
+
+
+class _Bound:
+    """An operation, bound to the execution it belongs to."""
+
+    __slots__ = ('args', 'execution')
+
+    def __init__(self, execution: 'Execution[FilePair]', args: FilePair):
+        self.execution = execution
+        self.args = args
+
+    @property
+    def kind(self) -> str:
+        return self.args.kind
+
+    @property
+    def barrier(self) -> bool:
+        return self.args.barrier
+
+
+def _concurrently(func: 'Callable[[T], R]', items: 'Iterable[T]', jobs: int,
+                  inline: 'Callable[[T], bool]' = lambda _: False,
+                  ) -> 'Generator[tuple[T, R], None, None]':
+    """Apply `func` to `items` with `jobs` worker threads, yielding results in order.
+
+    Items for which `inline` is true are applied in the calling thread, before
+    any later item is submitted. `items` is consumed lazily.
+    """
+    if jobs <= 1:
+        for item in items:
+            yield item, func(item)
+        return
+
+    # Imported here, as it is slow to import and only needed with several jobs.
+    # pylint: disable=import-outside-toplevel
+    from concurrent.futures import Future, ThreadPoolExecutor
+
+    # Bound the number of pending items.
+    window = 4 * jobs
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending: deque[tuple[T, Future[R]]] = deque()
+        for item in items:
+            if inline(item):
+                future: Future[R] = Future()
+                future.set_result(func(item))
+            else:
+                future = executor.submit(func, item)
+
+            pending.append((item, future))
+            if len(pending) >= window:
+                item, future = pending.popleft()
+                yield item, future.result()
+
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
+
+
+# Set while `Execution.dry` goes through the operations, so that planning
+# them doesn't prompt (see `Emanate._resolved`).
+_DRY_RUN: 'ContextVar[bool]' = ContextVar('_DRY_RUN', default=False)
+
+# The operations of an execution: planned actions, or actions bound to the
+# execution they belong to (see `Execution.chain`).
+Op = TypeVar('Op', bound='FilePair | _Bound')  # pylint: disable=invalid-name
+
+
+@dataclass(frozen=True)
+class Execution(Generic[Op]):
+    """Describe an Emanate execution.
+
+    The user passes functions defining the operation that is applied, and a
+    “printer” that's called upon changes; this is useful to provide "dry-run"
+    functionality or report changes back to the user.
+
+    If `jobs` is greater than 1, the operation is applied by as many worker
+    threads; the printer is still called from the calling thread, in the
+    same order as `ops`. Operations marked as barriers (such as `Mkdir`) are
+    applied in the calling thread before any later operation is submitted.
+
+    `journals` (see `emanate.journal`) record `ops` as they are applied; they
+    are only enabled by `run`.
+
+    If the run is stopped early (see `emanate.aio`) or fails, `abort` is
+    called instead of `finalize`, to record what was applied so far.
+    """
+
+    func: 'Callable[[Op], bool]'
+    printer: 'Callable[[Op], Any]'
+    ops: 'Iterable[Op]'
+    finalize: 'Callable[[], Any] | None' = None
+    jobs: int = 1
+    stats: 'RunStats | None' = None
+    journals: 'tuple[Journal, ...]' = ()
+    abort: 'Callable[[], Any] | None' = None
+
+    def _apply(self, func: 'Callable[[Op], bool]',
+               ) -> 'Generator[tuple[Op, bool], None, None]':
+        # Skipped actions are only passed through, for printers and stats.
+        return _concurrently(lambda args: args.kind != 'skip' and func(args), self.ops,
+                             self.jobs, lambda args: args.barrier or args.kind == 'skip')
+
+    def run(self, output: 'Output | None' = None):
+        """Run a prepared execution.
+
+        If `output` is given, a record is written to it for every action
+        (including skipped ones) instead of calling the printer.
+
+        Callable only once per Execution object.
+        """
+        for _ in self.steps(output):
+            pass
+
+    def steps(self, output: 'Output | None' = None) -> 'Iterator[FilePair]':
+        """Run a prepared execution step by step, like `run`.
+
+        Each operation is yielded once applied (and reported). Closing the
+        generator before it is exhausted stops the run: pending operations
+        are waited for, and `abort` is called instead of `finalize`. The same
+        happens if applying or reporting an operation fails; the error is
+        then raised again.
+        """
+        stats, func = self.stats, self.func
+        if stats is not None:
+            stats.start()
+            func = stats.timed('apply', func)
+        for journal in self.journals:
+            journal.enabled = True
+
+        applied = self._apply(func)
+        try:
+            for args, changed in applied:
+                kind = args.kind if changed else 'skip'
+                if stats is not None:
+                    stats.actions[kind] += 1
+                if output is not None:
+                    output.write(kind, _unbound(args))
+                elif changed:
+                    self.printer(args)
+                yield _unbound(args)
+        except BaseException:
+            # Closed early, or failed: record what was applied so far.
+            applied.close()
+            if output is not None:
+                output.flush()
+            if self.abort is not None:
+                self.abort()
+            if stats is not None:
+                stats.stop()
+            raise
+
+        if output is not None:
+            output.flush()
+        if self.finalize is not None:
+            self.finalize()
+        if stats is not None:
+            stats.stop()
+
+    @staticmethod
+    def chain(executions: 'Iterable[Execution[FilePair]]', jobs: int = 1,
+              stats: 'RunStats | None' = None) -> 'Execution[_Bound]':
+        """Combine several executions into one, which runs them in order.
+
+        With several `jobs`, operations from consecutive executions may be
+        applied concurrently; the output order is preserved.
+
+        The stats of the executions (if any) are reported together, along
+        with `stats` if given (counting the work done beforehand).
+        """
+        executions = list(executions)
+        included = [e.stats for e in executions if e.stats is not None]
+        if included and stats is None:
+            stats = RunStats()
+        if stats is not None:
+            for other in included:
+                stats.include(other)
+
+        def ops() -> 'Iterator[_Bound]':
+            for execution in executions:
+                for args in execution.ops:
+                    yield _Bound(execution, args)
+
+        def finalize():
+            for execution in executions:
+                if execution.finalize is not None:
+                    execution.finalize()
+
+        def abort():
+            for execution in executions:
+                if execution.abort is not None:
+                    execution.abort()
+
+        def func(op: _Bound) -> bool:
+            return op.execution.func(op.args)
+
+        def printer(op: _Bound):
+            return op.execution.printer(op.args)
+
+        return Execution(func,
+                         printer,
+                         ops(),
+                         finalize,
+                         jobs,
+                         stats,
+                         journals=sum((e.journals for e in executions), ()),
+                         abort=abort)
+
+    def dry(self, output: 'Output | None' = None):
+        """Print a dry-run of an execution, to `output` if given."""
+        stats = self.stats
+        if stats is not None:
+            stats.start()
+
+        dry_run = _DRY_RUN.set(True)
+        try:
+            for args in self.ops:
+                if stats is not None:
+                    stats.actions[args.kind] += 1
+                if output is not None:
+                    output.write(args.kind, _unbound(args))
+                else:
+                    self.printer(args)
+        finally:
+            _DRY_RUN.reset(dry_run)
+
+        if output is not None:
+            output.flush()
+        if stats is not None:
+            stats.stop()
+
+
+class Emanate:
+    """Provides the core functionality of Emanate.
+
+    This class is configurable at initialization-time, by passing it a number
+    of configuration objects, supporting programmatic use (from a configuration
+    management tool, for instance) as well as wrapping it in a human interface
+    (see emanate.main for a simple example).
+
+    If the `stats` configuration option is True, `run_stats` holds the
+    `RunStats` of the last execution prepared by `create` or `clean`.
+
+    Files are accessed through `fs` (see `emanate.fs`): by default, the
+    operating system.
+    """
+
+    config: Config
+    run_stats: 'RunStats | None' = None
+
+    def __init__(self, *configs: Config, fs: 'FileSystem | None' = None):
+        """Construct an Emanate instance from configuration dictionaries.
+
+        The default values (as provided by Config.defaults()) are implicitly
+        the first configuration object; latter configurations override earlier
+        configurations (see Config.merge).
+
+        The configs must define a source directory. `fs` is the filesystem
+        backend used, instead of the operating system.
+        """
+        explicit_configs = Config.merge(*configs)
+        self.conf = Config.defaults(explicit_configs.get('source')).merge(
+            explicit_configs,
+        )
+        self.fs = OSFileSystem() if fs is None else fs
+        self._ignored: Callable[[str, bool], bool] = \
+            IgnoreMatcher(self.conf.ignore, self.fs.is_dir)
+        if self.conf.ignore_files:
+            self._ignored = IgnoreFiles(str(self.conf.source.absolute()),
+                                        self.conf.ignore_files, self._ignored, self.fs)
+        if self.conf.mode not in INSTALL_MODES:
+            raise ValueError(f"Unknown install mode {self.conf.mode!r}")
+        # Files installed as copies, whatever the default mode is.
+        self._modes = tuple((mode, IgnoreMatcher(self.conf[mode], self.fs.is_dir))
+                            for mode in ('reflink', 'copy') if self.conf.get(mode))
+        # Prompts are serialized when running with several jobs.
+        self._prompt_lock = threading.Lock()
+
+    @property
+    def dest(self) -> Path:
+        return self.conf.destination
+
+    def valid_file(self, path_obj: Path) -> bool:
+        """Check whether a given path is covered by an ignore glob.
+
+        As a side effect, if the path is a directory, it is created
+        in the destination directory.
+        """
+        is_dir = self.fs.is_dir(path_obj)
+        if self._ignored(str(path_obj.absolute()), is_dir):
+            return False
+
+        if is_dir:
+            dest_path = self.dest / path_obj.relative_to(self.conf.source)
+            Paths(self.fs).mkdir(dest_path)
+            return False
+
+        return True
+
+    def confirm_replace(self, dest_file: Path) -> bool:
+        """Prompt the user before replacing a file.
+
+        The prompt is skipped if the `confirm` configuration option is False.
+        It is written to the standard error, so it doesn't mix with the output
+        (see `emanate.output`).
+        """
+        prompt = f"{str(dest_file)!r} already exists. Replace it?"
+
+        if not self.conf.confirm:
+            return True
+
+        result = None
+        with self._prompt_lock:
+            while result not in ["y", "n", "\n"]:
+                print(f"{prompt} [Y/n] ", end="", file=sys.stderr, flush=True)
+                result = sys.stdin.read(1).lower()
+
+        return result != "n"
+
+    @property
+    def conflicts(self) -> str:
+        """The policy for files in the way of links (see `CONFLICT_POLICIES`).
+
+        Defaults to `ask`, or `backup` if the `confirm` option is False.
+        """
+        policy = self.conf.get('conflicts')
+        if policy is None:
+            return 'ask' if self.conf.confirm else 'backup'
+        if policy not in CONFLICT_POLICIES:
+            raise ValueError(f"Unknown conflict policy {policy!r}")
+        return policy
+
+    def install_mode(self, src: 'Path | str') -> str:
+        """How a source file is installed (see `INSTALL_MODES`).
+
+        Files matching the `reflink` or `copy` patterns (in that order) are
+        installed that way; other files use the `mode` option.
+        """
+        for mode, matcher in self._modes:
+            if matcher(str(src)):
+                return mode
+        return self.conf.mode
+
+    def _copied(self, pair: FilePair, dest_stat: 'os.stat_result | None',
+                copies: 'Mapping[str, list[int]]') -> bool:
+        """Check whether the destination is a copy we installed, unmodified since."""
+        return dest_stat is not None and S_ISREG(dest_stat.st_mode) and \
+            copies.get(self._relpath(pair)) == [dest_stat.st_size, dest_stat.st_mtime_ns]
+
+    def _record(self, manifest: Manifest, pair: FilePair, stats: StatCache):
+        """Record an installed file in the manifest."""
+        rel = self._relpath(pair)
+        manifest.discard(rel)
+        if self.install_mode(pair.src) == 'link':
+            manifest.links.add(rel)
+            return
+        dest_stat = stats.lstat(pair.dest)
+        if dest_stat is not None:
+            manifest.copies[rel] = [dest_stat.st_size, dest_stat.st_mtime_ns]
+
+    def confirm_conflicts(self, paths: 'Sequence[Path]') -> bool:
+        """Prompt the user once before replacing several files.
+
+        The prompt is skipped if the `confirm` configuration option is False;
+        as with `confirm_replace`, it is written to the standard error.
+        """
+        if not self.conf.confirm:
+            return True
+
+        result = None
+        with self._prompt_lock:
+            for path in paths:
+                print(f"{str(path)!r} already exists.", file=sys.stderr)
+            while result not in ["y", "n", "\n"]:
+                print(f"Replace these {len(paths)} file(s), keeping backups? [Y/n] ",
+                      end="", file=sys.stderr, flush=True)
+                result = sys.stdin.readline()[:1].lower() or "n"
+
+        return result != "n"
+
+    def _resolved(self, actions: 'Iterable[FilePair]') -> 'Iterator[FilePair]':
+        """Apply the conflict policy to planned actions.
+
+        Conflicts are handled as they are applied with the `ask` and `backup`
+        policies. With the others, the whole plan is collected first, so that
+        every conflict is known (and handled) before anything is applied.
+        """
+        policy = self.conflicts
+        if policy in ('ask', 'backup'):
+            yield from actions
+            return
+
+        plan = Plan(self.conf.source.absolute(), self.dest, actions)
+        found = [a.dest for a in plan if isinstance(a, Replace)]
+        if found and policy == 'fail':
+            raise ConflictingFilesError(found)
+        if found and policy == 'ask-once' and _DRY_RUN.get():
+            # Dry runs report the conflicts (as replacements) without asking.
+            policy = 'backup'
+        elif found and policy == 'ask-once':
+            confirm = self.confirm_conflicts
+            if self.run_stats is not None:
+                confirm = self.run_stats.timed('prompt', confirm)
+            policy = 'backup' if confirm(found) else 'skip'
+
+        if not found or policy == 'backup':
+            yield from plan
+            return
+
+        resolved = Skip if policy == 'skip' else Overwrite
+        for action in plan:
+            yield resolved(action.src, action.dest) if isinstance(action, Replace) else action
+
+    @staticmethod
+    def backup(dest_file: Path, paths: 'Paths | None' = None):
+        """Rename the file so we can safely write to the original path."""
+        (paths or Paths()).rename(dest_file, dest_file.name + ".emanate")
+
+    def apply(self, action: FilePair, stats: 'StatCache | None' = None,
+              paths: 'Paths | None' = None) -> bool:
+        """Apply a planned action, returning whether anything was changed.
+
+        If a `StatCache` is passed, the paths modified are invalidated in it.
+        Changes are made through `paths` (see `emanate.dirfd`), if given.
+        """
+        if isinstance(action, Skip):
+            return False
+
+        paths = paths or Paths(self.fs)
+        if isinstance(action, Mkdir):
+            paths.mkdir(action.dest)
+        elif isinstance(action, Unlink):
+            paths.unlink(action.dest)
+        elif isinstance(action, Unfold):
+            paths.unfold(action.src, action.dest)
+        else:
+            # If the file exists and _isn't_ the symbolic link we're
+            # trying to make, prompt the user to determine what to do,
+            # unless conflicts were already resolved as a batch.
+            if isinstance(action, Replace) and self.conflicts == 'ask':
+                confirm = self.confirm_replace
+                if self.run_stats is not None:
+                    confirm = self.run_stats.timed('prompt', confirm)
+                # If the user said no, skip the file.
+                if not confirm(action.dest):
+                    return False
+
+            # The link is checked afterwards, if verification is enabled.
+            mode = self.install_mode(action.src)
+            if self.conf.atomic and isinstance(action, (Replace, Overwrite)):
+                backup = action.dest.name + ".emanate" \
+                    if isinstance(action, Replace) else None
+                paths.replace(action.src, action.dest, backup, mode)
+            else:
+                if isinstance(action, Replace):
+                    Emanate.backup(action.dest, paths)
+                elif isinstance(action, Overwrite):
+                    # Directories are never removed, only backed up.
+                    if paths.is_dir(action.dest):
+                        Emanate.backup(action.dest, paths)
+                    else:
+                        paths.unlink(action.dest)
+                paths.install(action.src, action.dest, mode)
+
+        if stats is not None:
+            stats.invalidate(action.dest)
+        return True
+
+    def _relpath(self, pair: FilePair) -> str:
+        return str(pair.dest.relative_to(self.dest))
+
+    def _files(self, snapshot: 'Snapshot | None' = None, relpath: str = '',
+               prune: 'set[str] | None' = None) -> Iterable[FilePair]:
+        # Directories are yielded as Mkdir actions, always before their contents.
+        # If `relpath` is given, only the contents of that directory are walked.
+        # Directories added to `prune` (by their source path) aren't listed.
+        source = self.conf.source.absolute()
+        if not relpath:
+            self._refresh_ignored()
+        listdir: Lister = self.fs.scandir if snapshot is None else snapshot.listdir
+        if prune is not None:
+            listdir = _pruning(listdir, prune)
+        ignored = self._ignored
+        if self.run_stats is not None:
+            listdir = self.run_stats.listdir(listdir)
+            ignored = self.run_stats.ignored(ignored)
+
+        sharded = self.conf.scan_jobs > 1 and not relpath
+        if sharded:
+            # Worker processes can only walk with the plain ignore rules.
+            processes = self.conf.scan_processes and snapshot is None and \
+                self.run_stats is None and isinstance(self.fs, OSFileSystem)
+            entries = walk_sharded(str(source), ignored, listdir,
+                                   self.conf.scan_jobs, processes)
+        else:
+            entries = walk(str(source), ignored, relpath, listdir)
+
+        for entry in entries:
+            # Entries of directories unchanged since the snapshot are skipped,
+            # but copied files may have been modified in place.
+            if snapshot is not None and \
+               os.path.dirname(entry.relpath) not in snapshot.changed and \
+               (entry.is_dir or self.install_mode(entry.path) == 'link'):
+                continue
+            # Workers may have walked pruned directories before they were.
+            if sharded and prune and os.path.dirname(entry.path) in prune:
+                if entry.is_dir:
+                    prune.add(entry.path)
+                continue
+
+            cls = Mkdir if entry.is_dir else FilePair
+            yield cls(Path(entry.path), self.dest / entry.relpath)
+
+    def _manifest_files(self, manifest: Manifest) -> Iterable[FilePair]:
+        for rel in manifest:
+            yield FilePair(self.conf.source / rel, self.dest / rel)
+
+    def _refresh_ignored(self):
+        """Pick up changes made to ignore files since the last run."""
+        if isinstance(self._ignored, IgnoreFiles):
+            self._ignored.refresh()
+
+    def _snapshot(self) -> Snapshot:
+        # Listings also depend on the ignore files in effect in each directory.
+        stamp = self._ignored.stamp if isinstance(self._ignored, IgnoreFiles) else None
+        return Snapshot.load(self.conf.source, self.dest, fingerprint(
+            __version__, str(self.dest), sorted(map(str, self.conf.ignore)),
+            list(self.conf.ignore_files),
+        ), self.fs, stamp)
+
+    def _plan_dir(self, pair: Mkdir, stats: StatCache, folded: 'set[Path]',
+                  unfolded: 'dict[Path, Path]', prune: 'set[str]',
+                  nofold: 'AbstractSet[Path]',
+                  recorded: 'Callable[[Path], bool]') -> 'Iterator[FilePair]':
+        """Plan a source directory, folding and unfolding it as needed.
+
+        Links to directories are only unfolded in `fold` mode, if `recorded`
+        (their target is in a source recorded in the manifest); otherwise,
+        they are used as they are, like existing directories.
+        """
+        # `target` is the directory `dest` links to (or will, once its parent
+        # is unfolded), if it is a link.
+        if pair.dest.parent in unfolded:
+            linked = unfolded[pair.dest.parent] / pair.dest.name
+            target: Path | None = linked if stats.lexists(linked) else None
+        else:
+            dest_stat = stats.lstat(pair.dest)
+            if dest_stat is None:
+                target = None
+            elif S_ISLNK(dest_stat.st_mode):
+                target = pair.dest.parent / stats.fs.readlink(pair.dest)
+            else:
+                # Existing directories are used as they are, and anything else
+                # makes `Mkdir` fail, as it should.
+                if not S_ISDIR(dest_stat.st_mode):
+                    yield pair
+                return
+
+        if target is None:
+            # Directories holding copies can't be linked as a whole.
+            if self.conf.fold and pair.dest not in nofold and \
+               self.install_mode(pair.src) == 'link' and not self._modes:
+                folded.add(pair.dest)
+                prune.add(str(pair.src))
+                yield Link(pair.src, pair.dest)
+            else:
+                yield pair
+        elif stats.samefile(pair.src, target):
+            # Already folded.
+            folded.add(pair.dest)
+            prune.add(str(pair.src))
+            yield Skip(pair.src, pair.dest)
+        else:
+            target_stat = stats.stat(target)
+            if target_stat is None or not S_ISDIR(target_stat.st_mode):
+                yield pair
+            elif self.conf.fold and recorded(target):
+                # Folded by another source: unfold it, to make room.
+                unfolded[pair.dest] = target
+                yield Unfold(target, pair.dest)
+
+    def _plan_create(self, pairs: 'Iterable[FilePair]', stats: StatCache,
+                     prune: 'set[str] | None' = None,
+                     nofold: 'AbstractSet[Path]' = frozenset(),
+                     copies: 'Mapping[str, list[int]] | None' = None) -> 'Iterator[FilePair]':
+        # Directories linked as a whole, and those unfolded (with their target).
+        folded: set[Path] = set()
+        unfolded: dict[Path, Path] = {}
+        prune = set() if prune is None else prune
+        copies = {} if copies is None else copies
+        sources: list[str] | None = None
+
+        def recorded(target: Path) -> bool:
+            """Check whether `target` is inside a source recorded in the manifest."""
+            nonlocal sources
+            if sources is None:
+                sources = Manifest.sources(self.dest, self.fs)
+            path = os.path.normpath(target)
+            return any(path == source or path.startswith(os.path.join(source, ''))
+                       for source in sources)
+
+        for pair in pairs:
+            # The contents of folded directories are linked with them.
+            if pair.dest.parent in folded:
+                if isinstance(pair, Mkdir):
+                    folded.add(pair.dest)
+                continue
+
+            if isinstance(pair, Mkdir):
+                yield from self._plan_dir(pair, stats, folded, unfolded, prune, nofold,
+                                          recorded)
+            elif pair.dest.parent in unfolded:
+                # The parent is a link now, but won't be once applied.
+                other = unfolded[pair.dest.parent] / pair.dest.name
+                yield (Replace if stats.lexists(other) else Link)(pair.src, pair.dest)
+            elif self.install_mode(pair.src) != 'link':
+                yield self._plan_copy(pair, stats, copies)
+            elif stats.samefile(pair.src, pair.dest):
+                yield Skip(pair.src, pair.dest)
+            elif self._copied(pair, stats.lstat(pair.dest), copies):
+                # Copies we installed are replaced without a backup.
+                yield Overwrite(pair.src, pair.dest)
+            elif stats.lexists(pair.dest):
+                yield Replace(pair.src, pair.dest)
+            else:
+                yield Link(pair.src, pair.dest)
+
+    def _plan_copy(self, pair: FilePair, stats: StatCache,
+                   copies: 'Mapping[str, list[int]]') -> FilePair:
+        """Plan a file installed as a copy; unchanged copies are skipped."""
+        dest_stat = stats.lstat(pair.dest)
+        if dest_stat is None:
+            return Link(pair.src, pair.dest)
+        if _same_copy(stats.stat(pair.src), dest_stat):
+            return Skip(pair.src, pair.dest)
+        # Copies and links we installed are replaced without a backup.
+        if self._copied(pair, dest_stat, copies) or \
+           (S_ISLNK(dest_stat.st_mode) and stats.samefile(pair.src, pair.dest)):
+            return Overwrite(pair.src, pair.dest)
+        return Replace(pair.src, pair.dest)
+
+    def _plan_clean(self, pairs: 'Iterable[FilePair]', stats: StatCache,
+                    copies: 'Mapping[str, list[int]] | None' = None) -> 'Iterator[FilePair]':
+        skipped: set[Path] = set()
+        copies = {} if copies is None else copies
+        for pair in pairs:
+            if pair.dest.parent in skipped:
+                if isinstance(pair, Mkdir):
+                    skipped.add(pair.dest)
+                continue
+
+            dest_stat = stats.lstat(pair.dest)
+            if dest_stat is None:
+                continue
+
+            if isinstance(pair, Mkdir):
+                # The contents of a folded directory are removed with it, and
+                # links to other directories mustn't be followed.
+                if S_ISLNK(dest_stat.st_mode):
+                    skipped.add(pair.dest)
+                    if stats.samefile(pair.dest, pair.src):
+                        yield Unlink(pair.src, pair.dest)
+                continue
+
+            if not S_ISLNK(dest_stat.st_mode) and S_ISDIR(dest_stat.st_mode):
+                # A folded directory which was unfolded since: look inside.
+                src_stat = stats.stat(pair.src)
+                if src_stat is not None and S_ISDIR(src_stat.st_mode):
+                    yield from self._plan_clean(
+                        (FilePair(pair.src / name, pair.dest / name)
+                         for name in sorted(stats.fs.listdir(pair.dest))),
+                        stats, copies)
+                continue
+
+            if self._copied(pair, dest_stat, copies):
+                # Copies we installed are removed, unless they were modified.
+                ours = True
+            elif stats.exists(pair.src):
+                ours = stats.samefile(pair.dest, pair.src)
+            else:
+                # The source is gone: only remove a link which still points to it.
+                ours = S_ISLNK(dest_stat.st_mode) and \
+                    stats.fs.readlink(pair.dest) == str(pair.src)
+
+            yield (Unlink if ours else Skip)(pair.src, pair.dest)
+
+    def plan(self, clean: bool = False) -> 'Iterator[FilePair]':
+        """Plan the actions needed to create (or clean) the links.
+
+        Planning never modifies the destination: actions are computed lazily,
+        and can be applied with `Emanate.apply`.
+        """
+        stats = StatCache(self.fs)
+        manifest = Manifest.load(self.conf.source, self.dest, self.fs)
+        copies = None if manifest is None else manifest.copies
+        if not clean:
+            return self._plan_create(self._files(), stats, copies=copies)
+
+        pairs = self._files() if manifest is None else self._manifest_files(manifest)
+        return self._plan_clean(pairs, stats, copies)
+
+    def _stat_cache(self) -> StatCache:
+        """Prepare the StatCache (and RunStats, if enabled) for a new run."""
+        stats = StatCache(self.fs)
+        self.run_stats = RunStats() if self.conf.stats else None
+        if self.run_stats is not None:
+            self.run_stats.track(stats)
+        return stats
+
+    def create(self) -> Execution:
+        """Create symbolic links.
+
+        The links are recorded in the destination's manifest once the
+        execution has run.
+
+        If the `incremental` configuration option is True, only directories
+        which changed since the last incremental run are considered.
+
+        If the `fold` configuration option is True, directories missing from
+        the destination are linked as a whole, rather than created.
+
+        Files are copied instead of linked according to the `mode`, `copy`
+        and `reflink` options (see `install_mode`).
+        """
+        snapshot = self._snapshot() if self.conf.incremental else None
+        prune: set[str] = set()
+        return self._create(self._files(snapshot, prune=prune), snapshot, prune)
+
+    def _create(self, pairs: 'Iterable[FilePair]',
+                snapshot: 'Snapshot | None' = None,
+                prune: 'set[str] | None' = None,
+                nofold: 'AbstractSet[Path]' = frozenset()) -> Execution:
+        manifest = self._manifest()
+        stats = self._stat_cache()
+        run_stats = self.run_stats
+        paths = applier(self.fs)
+        journal = self._journal('create')
+        created = []
+
+        def actions() -> 'Iterator[FilePair]':
+            for action in self._plan_create(pairs, stats, prune, nofold, manifest.copies):
+                # Files that are already linked are only recorded; up-to-date
+                # copies only if we installed them.
+                if isinstance(action, Skip) and self.install_mode(action.src) == 'link':
+                    manifest.links.add(self._relpath(action))
+                yield action
+
+        def apply(action: FilePair) -> bool:
+            if not self.apply(action, stats, paths):
+                return False
+
+            # Unfolded directories belong to another source.
+            if isinstance(action, (Link, Replace, Overwrite)):
+                self._record(manifest, action, stats)
+                if self.conf.verify:
+                    created.append(action)
+            return True
+
+        def finalize(complete: bool = True):
+            for pair in created:
+                if self.install_mode(pair.src) == 'link':
+                    installed = stats.samefile(pair.src, pair.dest)
+                else:
+                    installed = _same_copy(stats.stat(pair.src), stats.lstat(pair.dest))
+                if not installed:
+                    print(f"Failed to install {str(pair.src)!r} to {str(pair.dest)!r}",
+                          file=sys.stderr)
+                    manifest.discard(self._relpath(pair))
+
+            paths.close()
+            manifest.save()
+            # Directories may not all have been looked at, if interrupted.
+            if snapshot is not None and complete:
+                snapshot.save()
+            # Interrupted runs can be resumed (or rolled back) from the journal.
+            if journal is not None:
+                if complete:
+                    journal.remove()
+                else:
+                    journal.close()
+
+        ops = self._resolved(actions())
+        return Execution(apply,
+                         methodcaller('print_add'),
+                         ops if journal is None else journal.record(ops),
+                         finalize,
+                         self.conf.jobs,
+                         run_stats,
+                         () if journal is None else (journal,),
+                         lambda: finalize(complete=False))
+
+    def clean(self) -> Execution:
+        """Remove symbolic links.
+
+        If the destination has a manifest for this source, only the links it
+        records are considered; otherwise, the source directory is walked.
+        """
+        manifest = Manifest.load(self.conf.source, self.dest, self.fs)
+        # Removed links must be recreated by the next incremental run.
+        snapshot = Snapshot(self.conf.source, self.dest, '', self.fs)
+        stats = self._stat_cache()
+        run_stats = self.run_stats
+        kept = set()
+
+        def actions() -> 'Iterator[FilePair]':
+            pairs = self._files() if manifest is None else self._manifest_files(manifest)
+            copies = None if manifest is None else manifest.copies
+            for action in self._plan_clean(pairs, stats, copies):
+                if not isinstance(action, Unlink):
+                    kept.add(self._relpath(action))
+                yield action
+
+        paths = applier(self.fs)
+        journal = self._journal('clean')
+        removed = []
+
+        def apply(action: FilePair) -> bool:
+            if not self.apply(action, stats, paths):
+                return False
+            removed.append(self._relpath(action))
+            return True
+
+        def finalize(complete: bool = True):
+            paths.close()
+            if manifest is not None:
+                if complete:
+                    # Links which were removed, or are already gone, are forgotten.
+                    manifest.retain(kept)
+                else:
+                    for rel in removed:
+                        manifest.discard(rel)
+                manifest.save()
+            snapshot.remove()
+            if journal is not None:
+                if complete:
+                    journal.remove()
+                else:
+                    journal.close()
+
+        return Execution(apply,
+                         methodcaller('print_del'),
+                         actions() if journal is None else journal.record(actions()),
+                         finalize,
+                         self.conf.jobs,
+                         run_stats,
+                         () if journal is None else (journal,),
+                         lambda: finalize(complete=False))
+
+    async def acreate(self, output: 'Output | None' = None, **options):
+        """Create symbolic links, without blocking the event loop.
+
+        This is `emanate.aio.create`: `options` are `confirm`, an async
+        callback confirming conflicts, and `executor` and `batch`.
+        """
+        from . import aio  # pylint: disable=import-outside-toplevel
+        await aio.create(self, output, **options)
+
+    async def aclean(self, output: 'Output | None' = None, **options):
+        """Remove symbolic links, without blocking the event loop (see `acreate`)."""
+        from . import aio  # pylint: disable=import-outside-toplevel
+        await aio.clean(self, output, **options)
+
+    def aplan(self, clean: bool = False, **options) -> 'AsyncIterator[FilePair]':
+        """Iterate asynchronously over the planned actions (see `plan`)."""
+        from . import aio  # pylint: disable=import-outside-toplevel
+        return aio.plan(self, clean, **options)
+
+    def _journal(self, operation: str) -> 'Journal | None':
+        """Start a journal for a new run, in atomic mode."""
+        if not self.conf.atomic:
+            return None
+        return Journal(self.conf.source, self.dest, operation, self.fs)
+
+    def _manifest(self) -> Manifest:
+        """Load the manifest for this source, or start a new one."""
+        return (Manifest.load(self.conf.source, self.dest, self.fs)
+                or Manifest(self.conf.source, self.dest, fs=self.fs))
+
+    def _recover(self, undo: bool) -> Execution:
+        journal = Journal.load(self.conf.source, self.dest, self.fs)
+        if journal is None:
+            return Execution(self.apply, print, ())
+
+        manifest = self._manifest()
+        paths = applier(self.fs)
+        fs = self.fs
+        # Whether the actions create links, rather than remove them.
+        creating = (journal.operation == 'create') != undo
+
+        def ours(action: FilePair) -> bool:
+            if self.install_mode(action.src) == 'link':
+                return fs.islink(action.dest) and fs.readlink(action.dest) == str(action.src)
+            try:
+                return _same_copy(fs.stat(action.src), fs.lstat(action.dest))
+            except OSError:
+                return False
+
+        def redo(action: FilePair) -> bool:
+            # Actions may already have been applied before the interruption.
+            if isinstance(action, Unlink):
+                return ours(action) and self.apply(action, None, paths)
+            if isinstance(action, Unfold):
+                return fs.islink(action.dest) and self.apply(action, None, paths)
+            if isinstance(action, Mkdir):
+                return self.apply(action, None, paths)
+            if ours(action):
+                return False
+            if not fs.lexists(action.dest):
+                return self.apply(Link(action.src, action.dest), None, paths)
+            # Files which appeared since are only replaced if planned so.
+            return not isinstance(action, Link) and self.apply(action, None, paths)
+
+        def rollback(action: FilePair) -> bool:
+            if isinstance(action, Unlink):
+                if fs.lexists(action.dest):
+                    return False
+                paths.install(action.src, action.dest, self.install_mode(action.src))
+            elif isinstance(action, Mkdir):
+                try:
+                    fs.rmdir(action.dest)
+                except OSError:
+                    return False
+            elif isinstance(action, Unfold) or not ours(action):
+                return False
+            else:
+                paths.unlink(action.dest)
+                backup = action.dest.with_name(action.dest.name + ".emanate")
+                if isinstance(action, (Replace, Overwrite)) and fs.lexists(backup):
+                    paths.rename(backup, action.dest.name)
+            return True
+
+        def apply(action: FilePair) -> bool:
+            changed = (rollback if undo else redo)(action)
+            # Actions applied before the interruption weren't recorded yet.
+            if not isinstance(action, (Mkdir, Unfold)):
+                if ours(action):
+                    self._record(manifest, action, StatCache(fs))
+                else:
+                    manifest.discard(self._relpath(action))
+            return changed
+
+        def finalize(complete: bool = True):
+            paths.close()
+            manifest.save()
+            # The rest can still be resumed (or rolled back), if interrupted.
+            if complete:
+                journal.remove()
+
+        # Rolling back undoes actions in the reverse order.
+        ops = reversed(journal.actions) if undo else journal.actions
+        return Execution(apply,
+                         methodcaller('print_add' if creating else 'print_del'),
+                         list(ops),
+                         finalize,
+                         abort=lambda: finalize(complete=False))
+
+    def resume(self) -> Execution:
+        """Finish applying the journal of an interrupted (atomic) run.
+
+        Actions which were already applied are skipped; the source isn't
+        walked again.
+        """
+        return self._recover(undo=False)
+
+    def rollback(self) -> Execution:
+        """Undo the journal of an interrupted (atomic) run.
+
+        Links which were created are removed (restoring backups), and links
+        which were removed are created again. Files removed by the
+        `overwrite` conflict policy can't be restored.
+        """
+        return self._recover(undo=True)
+
+    def for_destination(self, destination: Path) -> 'Emanate':
+        """Return a copy of this instance, linking into another destination.
+
+        The copy shares the compiled ignore rules of this instance.
+        """
+        other = copy.copy(self)
+        other.conf = Config(self.conf, destination=destination)
+        other.run_stats = None
+        return other
+
+    def fan_out(self, destinations: 'Iterable[Path]', clean: bool = False) -> Execution:
+        """Create (or clean) links from the source into several destinations.
+
+        When creating links, the source is walked and filtered only once, into
+        a list of relative paths which is then applied to each destination in
+        turn; with several `jobs`, the destinations are applied concurrently.
+        Incremental mode isn't used when fanning out.
+        """
+        instances = [self.for_destination(dest) for dest in destinations]
+        if clean:
+            execution = Execution.chain([e.clean() for e in instances], self.conf.jobs)
+            self.run_stats = execution.stats
+            return execution
+
+        # The source is walked right away, counted by this instance's stats.
+        self.run_stats = RunStats() if self.conf.stats else None
+        if self.run_stats is not None:
+            self.run_stats.start()
+        # Relative paths are only joined to each destination when needed.
+        scanned = Plan(self.conf.source.absolute(), self.dest, self._files())
+        return Execution.chain([e._create(scanned.actions(e.dest)) for e in instances],
+                               self.conf.jobs, self.run_stats)
+
+    def _ignored_relpath(self, relpath: str, is_dir: bool) -> bool:
+        """Check whether a source path, or any of its parents, is ignored."""
+        parts = Path(relpath).parts
+        for i in range(1, len(parts) + 1):
+            path = os.path.join(self.conf.source, *parts[:i])
+            if self._ignored(path, is_dir or i < len(parts)):
+                return True
+        return False
+
+    def sync(self, relpaths: 'Iterable[str]') -> Execution:
+        """Re-apply the given paths, relative to the source directory.
+
+        Paths which exist and aren't ignored are linked (along with their
+        contents, for directories), while links to paths which no longer exist
+        are removed. This is used to apply changes to the source incrementally.
+        """
+        manifest = self._manifest()
+        stats = self._stat_cache()
+        run_stats = self.run_stats
+        self._refresh_ignored()
+
+        def topmost(paths: 'Iterable[str]') -> 'Iterator[str]':
+            # Paths inside another one are covered by it.
+            last = None
+            for rel in sorted(set(paths)):
+                if last is None or not rel.startswith(last + os.sep):
+                    last = rel
+                    yield rel
+
+        def pairs(rel: str, is_dir: bool) -> 'Iterator[FilePair]':
+            src, dest = self.conf.source / rel, self.dest / rel
+            if not is_dir:
+                yield FilePair(src, dest)
+                return
+
+            yield Mkdir(src, dest)
+            # Symbolic links to directories aren't descended into.
+            src_stat = stats.lstat(src)
+            if src_stat is not None and not S_ISLNK(src_stat.st_mode):
+                yield from self._files(relpath=rel)
+
+        def actions() -> 'Iterator[FilePair]':
+            for rel in topmost(relpaths):
+                src = self.conf.source / rel
+                if stats.lexists(src):
+                    src_stat = stats.stat(src)
+                    is_dir = src_stat is not None and S_ISDIR(src_stat.st_mode)
+                    if self._ignored_relpath(rel, is_dir):
+                        continue
+                    planned = self._plan_create(pairs(rel, is_dir), stats,
+                                                copies=manifest.copies)
+                else:
+                    prefix = rel + os.sep
+                    gone = [r for r in manifest if r == rel or r.startswith(prefix)]
+                    planned = self._plan_clean(
+                        (FilePair(self.conf.source / r, self.dest / r) for r in gone),
+                        stats, manifest.copies)
+
+                yield from planned
+
+        def apply(action: FilePair) -> bool:
+            if not self.apply(action, stats):
+                return False
+
+            if isinstance(action, Unlink):
+                manifest.discard(self._relpath(action))
+            elif isinstance(action, (Link, Replace, Overwrite)):
+                self._record(manifest, action, stats)
+            return True
+
+        def printer(action: FilePair):
+            if isinstance(action, Unlink):
+                action.print_del()
+            else:
+                action.print_add()
+
+        return Execution(apply,
+                         printer,
+                         self._resolved(actions()),
+                         manifest.save,
+                         self.conf.jobs,
+                         run_stats,
+                         abort=manifest.save)
+
+    @staticmethod
+    def check(pair: FilePair, fs: 'FileSystem | None' = None) -> str:
+        """Classify the destination of `pair`, without changing anything.
+
+        Returns `linked`, `missing` (nothing is there), `conflicting` (a file
+        which isn't a link is in the way, or in place of a parent directory),
+        `dangling` (a link to a path which
+        doesn't exist) or `elsewhere` (a link to another existing file).
+        """
+        fs = fs or OSFileSystem()
+        try:
+            dest_stat = fs.lstat(pair.dest)
+        except FileNotFoundError:
+            return "missing"
+        except NotADirectoryError:
+            # A parent of the destination is a file.
+            return "conflicting"
+
+        if not S_ISLNK(dest_stat.st_mode):
+            return "conflicting"
+        try:
+            target_stat = fs.stat(pair.dest)
+        except OSError:
+            return "dangling"
+        try:
+            linked = os.path.samestat(target_stat, fs.stat(pair.src))
+        except OSError:
+            linked = False
+        return "linked" if linked else "elsewhere"
+
+    def _check_copy(self, pair: FilePair, state: str,
+                    copies: 'Mapping[str, list[int]]') -> str:
+        """Classify the destination of a file installed as a copy.
+
+        Returns `copied` if it is up to date, `outdated` if `create` would
+        replace it without a backup (a copy we installed, or a link to the
+        source), or the state given by `check`.
+        """
+        if state == "linked":
+            return "outdated"
+        try:
+            dest_stat = self.fs.lstat(pair.dest)
+            if _same_copy(self.fs.stat(pair.src), dest_stat):
+                return "copied"
+        except OSError:
+            return state
+        return "outdated" if self._copied(pair, dest_stat, copies) else state
+
+    def status(self) -> 'Iterator[tuple[str, FilePair]]':
+        """Report the state of each link, without changing anything.
+
+        The source is walked, along with the links recorded in the manifest
+        (whose source might be gone), and each destination is classified by
+        `check` (or, for files installed as copies, `_check_copy`);
+        destination directories are only reported if they aren't
+        directories. With several `jobs`, checks are made concurrently, and
+        still reported in order.
+        """
+        manifest = Manifest.load(self.conf.source, self.dest, self.fs)
+        copies = {} if manifest is None else manifest.copies
+        # Folded directories are reported as a whole.
+        prune: set[str] = set()
+        seen: set[str] = set()
+
+        def check(pair: FilePair) -> 'str | None':
+            if not isinstance(pair, Mkdir):
+                state = self.check(pair, self.fs)
+                if self.install_mode(pair.src) == 'link' or state == "missing":
+                    return state
+                return self._check_copy(pair, state, copies)
+
+            state = self.check(pair, self.fs)
+            if state == "linked":
+                prune.add(str(pair.src))
+                return state
+            if state == "conflicting":
+                if self.fs.is_dir(pair.dest):
+                    return None
+                # The entries below are in the way of a file.
+                prune.add(str(pair.src))
+            return state if state != "missing" else None
+
+        def pairs() -> 'Iterator[FilePair]':
+            for pair in self._files(prune=prune):
+                seen.add(self._relpath(pair))
+                yield pair
+
+            if manifest is not None:
+                for pair in self._manifest_files(manifest):
+                    if self._relpath(pair) not in seen:
+                        yield pair
+
+        for pair, state in _concurrently(check, pairs(), self.conf.jobs,
+                                         lambda pair: pair.barrier):
+            if state is not None:
+                yield state, _unbound(pair)
@@ -0,0 +1,233 @@
+"""Apply changes to the destination relative to open directories.
+
+Going through absolute paths, the kernel resolves every component of the
+destination path again for each `symlink`, `unlink` or `rename` call.
+`emanate.dirfd` keeps file descriptors open for the destination directories
+recently touched during a run, and issues system calls relative to them
+(with `dir_fd=`), using bare file names.
+
+`applier()` returns a `DirFDs` where the platform supports it, and a plain
+`Paths` (with the same interface) otherwise, or when changes are made to
+another filesystem backend (see `emanate.fs`).
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from collections.abc import Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from stat import S_ISDIR
+
+from .fs import FileSystem, OSFileSystem
+
+SUPPORTED = all(func in os.supports_dir_fd
+                for func in (os.link, os.open, os.mkdir, os.rename, os.stat, os.symlink,
+                             os.unlink))
+
+_FLAGS = os.O_RDONLY | getattr(os, 'O_DIRECTORY', 0) | getattr(os, 'O_CLOEXEC', 0)
+
+
+class Paths:
+    """Apply changes through absolute paths, to `fs` (by default, the OS)."""
+
+    __slots__ = ('fs',)
+
+    def __init__(self, fs: 'FileSystem | None' = None):
+        self.fs = OSFileSystem() if fs is None else fs
+
+    def mkdir(self, path: Path):
+        try:
+            self.fs.mkdir(path)
+        except FileExistsError:
+            if not self.fs.is_dir(path):
+                raise
+
+    def symlink(self, src: Path, dest: Path):
+        self.fs.symlink(src, dest)
+
+    def unlink(self, path: Path):
+        self.fs.unlink(path)
+
+    def rename(self, path: Path, new_name: str):
+        """Rename `path` to `new_name`, in the same directory."""
+        self.fs.rename(path, path.with_name(new_name))
+
+    def hardlink(self, path: Path, new_name: str):
+        """Add a hard link to `path` (not following links), named `new_name`."""
+        self.fs.link(path, path.with_name(new_name))
+
+    def is_dir(self, path: Path) -> bool:
+        """Check whether `path` is a directory (not following links)."""
+        return S_ISDIR(self.fs.lstat(path).st_mode)
+
+    def install(self, src: Path, dest: Path, mode: str = 'link'):
+        """Create `dest` as a link to `src`, or a copy of it (see `emanate.core`).
+
+        Copies are made under a temporary name, then renamed to `dest`, so
+        `dest` is never left half-written.
+        """
+        if mode == 'link':
+            self.symlink(src, dest)
+            return
+        tmp = self._tmp(dest)
+        self._create(src, tmp, mode)
+        self.rename(tmp, dest.name)
+
+    def _tmp(self, dest: Path) -> Path:
+        """Return a temporary path next to `dest`, removing leftovers of a crash."""
+        tmp = dest.with_name(f".{dest.name}.emanate-tmp")
+        try:
+            self.unlink(tmp)
+        except FileNotFoundError:
+            pass
+        return tmp
+
+    def _create(self, src: Path, dest: Path, mode: str):
+        if mode == 'link':
+            self.symlink(src, dest)
+        else:
+            self.fs.copy(src, dest, reflink=mode == 'reflink')
+
+    def replace(self, src: Path, dest: Path, backup: 'str | None' = None,
+                mode: str = 'link'):
+        """Atomically replace `dest` with a link to `src` (or a copy, see `install`).
+
+        The link is created under a temporary name, then renamed over `dest`,
+        so `dest` never goes missing. If `backup` is given, the replaced file
+        is kept under that name (as a hard link, made beforehand). Directories
+        can't be renamed over, so they are always moved to `backup` (by
+        default, with the `.emanate` suffix) first.
+        """
+        tmp = self._tmp(dest)
+        self._create(src, tmp, mode)
+
+        if self.is_dir(dest):
+            self.rename(dest, backup or dest.name + ".emanate")
+        elif backup is not None:
+            # The backup is linked under a temporary name too, as the link
+            # fails if a previous backup exists.
+            self.hardlink(dest, tmp.name + "-backup")
+            self.rename(dest.with_name(tmp.name + "-backup"), backup)
+        self.rename(tmp, dest.name)
+
+    def unfold(self, src: Path, dest: Path):
+        """Replace the link `dest` with a directory of links to `src`'s entries."""
+        names = sorted(self.fs.listdir(src))
+        self.unlink(dest)
+        self.mkdir(dest)
+        for name in names:
+            self.symlink(src / name, dest / name)
+
+    def close(self):
+        pass
+
+
+class DirFDs(Paths):
+    """Apply changes relative to cached directory file descriptors.
+
+    Descriptors are opened on first use, and at most `MAX_FDS` of them (the
+    most recently used) are kept open, until `close` is called. It is safe to
+    use from several threads: a descriptor is only closed once every call
+    using it returned.
+    """
+
+    __slots__ = ('_evicted', '_fds', '_lock', '_users')
+
+    MAX_FDS = 64
+
+    def __init__(self):
+        super().__init__(OSFileSystem())
+        self._fds: OrderedDict[str, int] = OrderedDict()
+        # The number of calls using each descriptor, and those to close
+        # once they are done.
+        self._users: dict[int, int] = {}
+        self._evicted: set[int] = set()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _dir(self, path: Path) -> 'Iterator[tuple[int, str]]':
+        """Provide the descriptor of `path`'s parent, and `path`'s name."""
+        parent, name = os.path.split(path)
+        with self._lock:
+            fd = self._fds.get(parent)
+            if fd is None:
+                fd = self._fds[parent] = os.open(parent, _FLAGS)
+                while len(self._fds) > self.MAX_FDS:
+                    self._evict(self._fds.popitem(last=False)[1])
+            else:
+                self._fds.move_to_end(parent)
+            self._users[fd] = self._users.get(fd, 0) + 1
+
+        try:
+            yield fd, name
+        finally:
+            with self._lock:
+                self._users[fd] -= 1
+                if not self._users[fd]:
+                    del self._users[fd]
+                    if fd in self._evicted:
+                        self._evicted.discard(fd)
+                        os.close(fd)
+
+    def _evict(self, fd: int):
+        """Close a descriptor removed from the cache, once it is unused."""
+        if fd in self._users:
+            self._evicted.add(fd)
+        else:
+            os.close(fd)
+
+    def forget(self, path: Path):
+        """Close the descriptor of a directory which was replaced."""
+        if os.fspath(path) not in self._fds:
+            return
+        with self._lock:
+            fd = self._fds.pop(os.fspath(path), None)
+            if fd is not None:
+                self._evict(fd)
+
+    def mkdir(self, path: Path):
+        with self._dir(path) as (fd, name):
+            try:
+                os.mkdir(name, dir_fd=fd)
+            except FileExistsError:
+                if not S_ISDIR(os.stat(name, dir_fd=fd).st_mode):
+                    raise
+
+    def symlink(self, src: Path, dest: Path):
+        with self._dir(dest) as (fd, name):
+            os.symlink(src, name, dir_fd=fd)
+
+    def unlink(self, path: Path):
+        with self._dir(path) as (fd, name):
+            os.unlink(name, dir_fd=fd)
+        # If `path` was a link to a directory, its descriptor is stale.
+        self.forget(path)
+
+    def hardlink(self, path: Path, new_name: str):
+        with self._dir(path) as (fd, name):
+            os.link(name, new_name, src_dir_fd=fd, dst_dir_fd=fd, follow_symlinks=False)
+
+    def is_dir(self, path: Path) -> bool:
+        with self._dir(path) as (fd, name):
+            return S_ISDIR(os.stat(name, dir_fd=fd, follow_symlinks=False).st_mode)
+
+    def rename(self, path: Path, new_name: str):
+        with self._dir(path) as (fd, name):
+            os.rename(name, new_name, src_dir_fd=fd, dst_dir_fd=fd)
+        self.forget(path)
+
+    def close(self):
+        with self._lock:
+            fds: list[int] = list(self._fds.values())
+            self._fds.clear()
+            for fd in fds:
+                self._evict(fd)
+
+
+def applier(fs: 'FileSystem | None' = None) -> Paths:
+    """Return the best way of applying changes to `fs`, on this platform."""
+    # Subclasses of OSFileSystem (wrapping its calls) must see every change.
+    if SUPPORTED and (fs is None or type(fs) is OSFileSystem):  # pylint: disable=unidiomatic-typecheck
+        return DirFDs()
+    return Paths(fs)
@@ -0,0 +1,601 @@
+"""Filesystem backends for Emanate.
+
+Every access Emanate makes to the source and destination trees goes through
+a `FileSystem`: walking and listing directories, `stat`, reading links, and
+the changes made to the destination (`mkdir`, `symlink`, `copy`, `rename`,
+`unlink`), along with the state files it keeps there.
+
+- `OSFileSystem` uses the operating system, and is the default;
+- `MemoryFileSystem` keeps a whole tree in memory, so large plans can be
+  simulated (and checked exactly) without touching the disk.
+
+Backends raise `OSError` (with the same `errno` as the operating system) for
+missing paths, existing paths and the like, so callers handle both the same
+way.
+"""
+
+import errno
+import io
+import itertools
+import os
+import re
+import sys
+import threading
+from stat import S_IFDIR, S_IFLNK, S_IFREG, S_ISDIR, S_ISLNK
+from typing import IO, Any, Callable, Union
+
+from .walk import WalkEntry, scandir
+
+StrPath = Union[str, 'os.PathLike[str]']
+# A file's contents, or a directory or link (see `MemoryFileSystem.populate`).
+Tree = Union[str, dict[str, Any]]
+
+
+class FileSystem:
+    """Base class of filesystem backends.
+
+    Subclasses provide the primitive operations; the others (such as `exists`)
+    are derived from them.
+    """
+
+    __slots__ = ()
+
+    def stat(self, path: StrPath) -> os.stat_result:
+        """Stat `path`, following symbolic links."""
+        raise NotImplementedError
+
+    def lstat(self, path: StrPath) -> os.stat_result:
+        """Stat `path`, without following symbolic links."""
+        raise NotImplementedError
+
+    def readlink(self, path: StrPath) -> str:
+        raise NotImplementedError
+
+    def listdir(self, path: StrPath) -> 'list[str]':
+        """List the names in a directory, in no particular order."""
+        raise NotImplementedError
+
+    def scandir(self, root: str, ignored: 'Callable[[str, bool], bool]',
+                relpath: str = '') -> 'list[WalkEntry]':
+        """List a single directory while walking `root` (see `emanate.walk`)."""
+        raise NotImplementedError
+
+    def mkdir(self, path: StrPath):
+        raise NotImplementedError
+
+    def rmdir(self, path: StrPath):
+        raise NotImplementedError
+
+    def symlink(self, src: StrPath, dest: StrPath):
+        """Create a symbolic link at `dest`, pointing to `src`."""
+        raise NotImplementedError
+
+    def link(self, src: StrPath, dest: StrPath):
+        """Create a hard link to `src` (not following links) at `dest`."""
+        raise NotImplementedError
+
+    def copy(self, src: StrPath, dest: StrPath, reflink: bool = False):
+        """Copy the file `src` to a new file `dest`, with its permissions and mtime.
+
+        With `reflink`, `dest` shares `src`'s data blocks where the filesystem
+        supports it (it is copied otherwise).
+        """
+        raise NotImplementedError
+
+    def unlink(self, path: StrPath):
+        raise NotImplementedError
+
+    def rename(self, src: StrPath, dest: StrPath):
+        """Rename `src` to `dest`, replacing `dest` if it is a file."""
+        raise NotImplementedError
+
+    def open(self, path: StrPath, mode: str = 'r') -> 'IO[str]':
+        """Open a text file, for reading (`r`) or writing (`w`)."""
+        raise NotImplementedError
+
+    def sync(self, file: 'IO[str]'):
+        """Flush a file opened for writing to permanent storage."""
+        file.flush()
+
+    def sync_dir(self, path: StrPath):
+        """Flush a directory's entries to permanent storage."""
+
+    def exists(self, path: StrPath) -> bool:
+        try:
+            self.stat(path)
+        except OSError:
+            return False
+        return True
+
+    def lexists(self, path: StrPath) -> bool:
+        try:
+            self.lstat(path)
+        except OSError:
+            return False
+        return True
+
+    def is_dir(self, path: StrPath) -> bool:
+        """Check whether `path` is a directory, following links; never raises."""
+        try:
+            return S_ISDIR(self.stat(path).st_mode)
+        except OSError:
+            return False
+
+    def islink(self, path: StrPath) -> bool:
+        try:
+            return S_ISLNK(self.lstat(path).st_mode)
+        except OSError:
+            return False
+
+
+class OSFileSystem(FileSystem):
+    """Access files through the operating system."""
+
+    __slots__ = ()
+
+    # Functions are looked up in `os` on each call, so they can be wrapped
+    # (to count calls, for instance).
+    def stat(self, path: StrPath) -> os.stat_result:
+        return os.stat(path)
+
+    def lstat(self, path: StrPath) -> os.stat_result:
+        return os.lstat(path)
+
+    def readlink(self, path: StrPath) -> str:
+        return os.readlink(path)
+
+    def listdir(self, path: StrPath) -> 'list[str]':
+        return os.listdir(path)
+
+    def scandir(self, root: str, ignored: 'Callable[[str, bool], bool]',
+                relpath: str = '') -> 'list[WalkEntry]':
+        return scandir(root, ignored, relpath)
+
+    def mkdir(self, path: StrPath):
+        os.mkdir(path)
+
+    def rmdir(self, path: StrPath):
+        os.rmdir(path)
+
+    def symlink(self, src: StrPath, dest: StrPath):
+        os.symlink(src, dest)
+
+    def unlink(self, path: StrPath):
+        os.unlink(path)
+
+    def rename(self, src: StrPath, dest: StrPath):
+        os.replace(src, dest)
+
+    def link(self, src: StrPath, dest: StrPath):
+        os.link(src, dest, follow_symlinks=False)
+
+    def copy(self, src: StrPath, dest: StrPath, reflink: bool = False):
+        src_fd = os.open(src, os.O_RDONLY | _CLOEXEC)
+        try:
+            stat = os.fstat(src_fd)
+            dest_fd = os.open(dest, os.O_WRONLY | os.O_CREAT | os.O_EXCL | _CLOEXEC, 0o600)
+            try:
+                _copy_data(src_fd, dest_fd, stat.st_size, reflink)
+                if _FD_METADATA:
+                    os.fchmod(dest_fd, stat.st_mode & 0o7777)
+                    os.utime(dest_fd, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+                else:
+                    os.chmod(dest, stat.st_mode & 0o7777)
+                    os.utime(dest, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+            except BaseException:
+                os.close(dest_fd)
+                os.unlink(dest)
+                raise
+            os.close(dest_fd)
+        finally:
+            os.close(src_fd)
+
+    def open(self, path: StrPath, mode: str = 'r') -> 'IO[str]':
+        # pylint: disable=consider-using-with,unspecified-encoding
+        return open(path, mode)
+
+    def sync(self, file: 'IO[str]'):
+        file.flush()
+        os.fsync(file.fileno())
+
+    def sync_dir(self, path: StrPath):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+_CLOEXEC = getattr(os, 'O_CLOEXEC', 0)
+# Whether metadata can be set through a descriptor (not on Windows, before
+# Python 3.13); otherwise, it is set through the path.
+_FD_METADATA = hasattr(os, 'fchmod') and os.utime in os.supports_fd
+# The FICLONE ioctl, sharing a whole file's blocks (on Btrfs, XFS, ...).
+_FICLONE = 0x40049409 if sys.platform.startswith('linux') else None
+# Errors meaning a copy method isn't supported for these files; the next one
+# is tried.
+_UNSUPPORTED = frozenset((errno.EBADF, errno.EINVAL, errno.ENOSYS, errno.ENOTSUP,
+                          errno.EOPNOTSUPP, errno.ENOTSOCK, errno.ENOTTY, errno.EXDEV))
+# Bytes requested by each `copy_file_range` or `sendfile` call.
+_CHUNK = 1 << 30
+
+
+def _copy_data(src_fd: int, dest_fd: int, size: int, reflink: bool):
+    """Copy a file's data between descriptors, without going through Python.
+
+    Tries, in order, cloning the file (if `reflink`), `copy_file_range` (which
+    may share blocks too, or copy them within the kernel), `sendfile`, and
+    finally reading and writing chunks.
+    """
+    if reflink and _FICLONE is not None:
+        import fcntl  # pylint: disable=import-outside-toplevel
+        try:
+            fcntl.ioctl(dest_fd, _FICLONE, src_fd)
+            return
+        except OSError as error:
+            if error.errno not in _UNSUPPORTED:
+                raise
+
+    for method in (_copy_file_range, _sendfile):
+        try:
+            if method(src_fd, dest_fd):
+                return
+        except OSError as error:
+            # Failing after copying anything is a genuine error.
+            if error.errno not in _UNSUPPORTED or os.lseek(dest_fd, 0, os.SEEK_CUR):
+                raise
+
+    os.lseek(src_fd, 0, os.SEEK_SET)
+    while True:
+        chunk = os.read(src_fd, min(max(size, 1 << 16), 1 << 23))
+        if not chunk:
+            return
+        view = memoryview(chunk)
+        while view:
+            view = view[os.write(dest_fd, view):]
+
+
+def _copy_file_range(src_fd: int, dest_fd: int) -> bool:
+    if not hasattr(os, 'copy_file_range'):
+        return False
+    while os.copy_file_range(src_fd, dest_fd, _CHUNK):
+        pass
+    return True
+
+
+def _sendfile(src_fd: int, dest_fd: int) -> bool:
+    if not hasattr(os, 'sendfile'):
+        return False
+    offset = os.lseek(src_fd, 0, os.SEEK_CUR)
+    while True:
+        sent = os.sendfile(dest_fd, src_fd, offset, _CHUNK)
+        if not sent:
+            return True
+        offset += sent
+
+
+# Mask of the file type bits in `st_mode` (`stat.S_IFMT`).
+_FORMAT = 0o170000
+# Paths with `.` or `..` components, or repeated separators.
+_UNNORMALIZED = re.compile(r'/\.\.?(?:/|$)|//')
+
+
+def _error(code: int, path: StrPath) -> OSError:
+    # OSError picks the matching subclass, such as FileNotFoundError.
+    return OSError(code, os.strerror(code), os.fspath(path))
+
+
+class _Node:
+    """A file, directory or symbolic link in a `MemoryFileSystem`."""
+
+    __slots__ = ('data', 'ino', 'mode', 'mtime', 'nlink', 'size')
+
+    def __init__(self, mode: int, ino: int, mtime: int, data):
+        self.mode = mode
+        self.ino = ino
+        self.nlink = 1
+        self.mtime = mtime
+        # The entries of a directory, the target of a link, or a file's text.
+        self.data = data
+        # The encoded size of a link or file, kept up to date by `_write`.
+        self.size = len(data.encode()) if isinstance(data, str) else 0
+
+
+class _Writer(io.StringIO):
+    """A file opened for writing in a `MemoryFileSystem`."""
+
+    def __init__(self, fs: 'MemoryFileSystem', node: _Node):
+        super().__init__()
+        self._fs = fs
+        self._node = node
+
+    def flush(self):
+        super().flush()
+        self._fs._write(self._node, self.getvalue())  # pylint: disable=protected-access
+
+    def close(self):
+        if not self.closed:
+            self.flush()
+        super().close()
+
+
+class MemoryFileSystem(FileSystem):
+    """A filesystem kept entirely in memory.
+
+    Paths are absolute POSIX paths, normalized lexically (`..` is resolved
+    before following links); links are resolved as the operating system does
+    otherwise, relative to the directory holding them. Timestamps come from a
+    counter, incremented by each change, so they are deterministic. It is
+    safe to use from several threads.
+    """
+
+    __slots__ = ('_clock', '_index', '_inodes', '_lock', '_root', 'dev')
+
+    # Links followed when resolving a path, before failing with ELOOP.
+    MAX_LINKS = 40
+
+    def __init__(self):
+        self._inodes = itertools.count(1)
+        self._clock = itertools.count(1)
+        self._lock = threading.RLock()
+        self._root = self._node(S_IFDIR | 0o755, {})
+        # Entries found by path, as (directory, name, node), checked on use.
+        self._index: dict[str, tuple[_Node, str, _Node]] = {}
+        self.dev = id(self)
+
+    def _node(self, mode: int, data) -> _Node:
+        return _Node(mode, next(self._inodes), next(self._clock), data)
+
+    @staticmethod
+    def _parts(path: StrPath) -> 'list[str]':
+        path = os.fspath(path)
+        if not path.startswith(os.sep):
+            raise ValueError(f"Relative path {path!r} in a MemoryFileSystem")
+        # Most paths (built by pathlib) are already normalized.
+        if _UNNORMALIZED.search(path):
+            path = os.path.normpath(path)
+        return [part for part in path.split(os.sep) if part]
+
+    def _lookup(self, parts: 'list[str]', follow: bool, path: StrPath,
+                depth: int = 0) -> _Node:
+        node = self._root
+        last = len(parts) - 1
+        for i, name in enumerate(parts):
+            if node.mode & _FORMAT != S_IFDIR:
+                raise _error(errno.ENOTDIR, path)
+            node = node.data.get(name)
+            if node is None:
+                raise _error(errno.ENOENT, path)
+            if node.mode & _FORMAT == S_IFLNK and (follow or i < last):
+                if depth >= self.MAX_LINKS:
+                    raise _error(errno.ELOOP, path)
+                # Relative targets are relative to the directory holding the link.
+                target = os.path.join(os.sep, *parts[:i], node.data)
+                node = self._lookup(self._parts(target), True, path, depth + 1)
+        return node
+
+    def _direct(self, path: str) -> 'tuple[_Node, str, _Node] | None':
+        """Find the entry at a normalized path which crosses no links."""
+        if not path.startswith(os.sep) or _UNNORMALIZED.search(path):
+            return None
+        *dirs, name = path[1:].split(os.sep)
+        node = self._root
+        for part in dirs:
+            node = node.data.get(part)
+            if node is None or node.mode & _FORMAT != S_IFDIR:
+                return None
+        child = node.data.get(name)
+        return None if child is None else (node, name, child)
+
+    def _resolve(self, path: StrPath, follow: bool = True) -> _Node:
+        key = os.fspath(path)
+        # Such paths only go through directories, so the entry is still there
+        # unless it was removed (or a directory above it was renamed).
+        entry = self._index.get(key)
+        if entry is None or entry[0].data.get(entry[1]) is not entry[2]:
+            entry = self._direct(key)
+            if entry is None:
+                return self._lookup(self._parts(key), follow, path)
+            self._index[key] = entry
+        node = entry[2]
+        if follow and node.mode & _FORMAT == S_IFLNK:
+            return self._lookup(self._parts(key), True, path)
+        return node
+
+    def _parent(self, path: StrPath) -> 'tuple[_Node, str]':
+        """Return the directory holding `path`, and `path`'s name."""
+        parts = self._parts(path)
+        if not parts:
+            raise _error(errno.EBUSY, path)
+        parent = self._lookup(parts[:-1], True, path)
+        if parent.mode & _FORMAT != S_IFDIR:
+            raise _error(errno.ENOTDIR, path)
+        return parent, parts[-1]
+
+    def _entry(self, path: StrPath) -> 'tuple[_Node, str, _Node]':
+        parent, name = self._parent(path)
+        node = parent.data.get(name)
+        if node is None:
+            raise _error(errno.ENOENT, path)
+        return parent, name, node
+
+    def _add(self, path: StrPath, node: _Node):
+        with self._lock:
+            parent, name = self._parent(path)
+            if name in parent.data:
+                raise _error(errno.EEXIST, path)
+            parent.data[name] = node
+            parent.mtime = next(self._clock)
+
+    def _write(self, node: _Node, text: str):
+        with self._lock:
+            node.data, node.mtime = text, next(self._clock)
+            node.size = len(text.encode())
+
+    def _stat(self, node: _Node) -> os.stat_result:
+        size = len(node.data) if S_ISDIR(node.mode) else node.size
+        mtime = node.mtime
+        return os.stat_result(
+            (node.mode, node.ino, self.dev, node.nlink, 0, 0, size, mtime, mtime, mtime),
+            {'st_atime_ns': mtime, 'st_mtime_ns': mtime, 'st_ctime_ns': mtime},
+        )
+
+    def stat(self, path: StrPath) -> os.stat_result:
+        return self._stat(self._resolve(path))
+
+    def lstat(self, path: StrPath) -> os.stat_result:
+        return self._stat(self._resolve(path, follow=False))
+
+    def readlink(self, path: StrPath) -> str:
+        node = self._resolve(path, follow=False)
+        if not S_ISLNK(node.mode):
+            raise _error(errno.EINVAL, path)
+        return node.data
+
+    def listdir(self, path: StrPath) -> 'list[str]':
+        node = self._resolve(path)
+        if not S_ISDIR(node.mode):
+            raise _error(errno.ENOTDIR, path)
+        return list(node.data)
+
+    def scandir(self, root: str, ignored: 'Callable[[str, bool], bool]',
+                relpath: str = '') -> 'list[WalkEntry]':
+        top = os.path.join(root, relpath) if relpath else root
+        try:
+            node = self._resolve(top)
+        except OSError:
+            return []
+        if not S_ISDIR(node.mode):
+            return []
+
+        result = []
+        for name, child in sorted(node.data.items()):
+            path = os.path.join(top, name)
+            is_link = child.mode & _FORMAT == S_IFLNK
+            is_dir = self.is_dir(path) if is_link else child.mode & _FORMAT == S_IFDIR
+            if ignored(path, is_dir):
+                continue
+            rel = os.path.join(relpath, name) if relpath else name
+            result.append(WalkEntry(rel, path, is_dir, is_dir and is_link))
+        return result
+
+    def mkdir(self, path: StrPath):
+        self._add(path, self._node(S_IFDIR | 0o755, {}))
+
+    def rmdir(self, path: StrPath):
+        with self._lock:
+            parent, name, node = self._entry(path)
+            if not S_ISDIR(node.mode):
+                raise _error(errno.ENOTDIR, path)
+            if node.data:
+                raise _error(errno.ENOTEMPTY, path)
+            del parent.data[name]
+            parent.mtime = next(self._clock)
+
+    def symlink(self, src: StrPath, dest: StrPath):
+        self._add(dest, self._node(S_IFLNK | 0o777, os.fspath(src)))
+
+    def link(self, src: StrPath, dest: StrPath):
+        with self._lock:
+            node = self._entry(src)[2]
+            if S_ISDIR(node.mode):
+                raise _error(errno.EPERM, src)
+            self._add(dest, node)
+            node.nlink += 1
+
+    def copy(self, src: StrPath, dest: StrPath, reflink: bool = False):
+        with self._lock:
+            node = self._resolve(src)
+            if S_ISDIR(node.mode):
+                raise _error(errno.EISDIR, src)
+            copy = self._node(S_IFREG | node.mode & 0o7777, node.data)
+            copy.mtime = node.mtime
+            self._add(dest, copy)
+
+    def unlink(self, path: StrPath):
+        with self._lock:
+            parent, name, node = self._entry(path)
+            if S_ISDIR(node.mode):
+                raise _error(errno.EISDIR, path)
+            del parent.data[name]
+            node.nlink -= 1
+            parent.mtime = next(self._clock)
+
+    def rename(self, src: StrPath, dest: StrPath):
+        with self._lock:
+            src_parent, src_name, node = self._entry(src)
+            dest_parent, dest_name = self._parent(dest)
+            replaced = dest_parent.data.get(dest_name)
+            if replaced is node:
+                return
+            if replaced is not None:
+                if S_ISDIR(replaced.mode) and not S_ISDIR(node.mode):
+                    raise _error(errno.EISDIR, dest)
+                if S_ISDIR(node.mode) and not S_ISDIR(replaced.mode):
+                    raise _error(errno.ENOTDIR, dest)
+                if S_ISDIR(replaced.mode) and replaced.data:
+                    raise _error(errno.ENOTEMPTY, dest)
+                replaced.nlink -= 1
+
+            del src_parent.data[src_name]
+            dest_parent.data[dest_name] = node
+            if S_ISDIR(node.mode):
+                self._index.clear()
+            src_parent.mtime = dest_parent.mtime = next(self._clock)
+
+    def open(self, path: StrPath, mode: str = 'r') -> 'IO[str]':
+        if mode == 'r':
+            node = self._resolve(path)
+            if S_ISDIR(node.mode):
+                raise _error(errno.EISDIR, path)
+            return io.StringIO(node.data)
+        if mode != 'w':
+            raise ValueError(f"Unsupported mode {mode!r}")
+
+        with self._lock:
+            try:
+                node = self._resolve(path)
+            except FileNotFoundError:
+                node = self._node(S_IFREG | 0o644, '')
+                self._add(path, node)
+            if S_ISDIR(node.mode):
+                raise _error(errno.EISDIR, path)
+            self._write(node, '')
+        return _Writer(self, node)
+
+    def makedirs(self, path: StrPath):
+        """Create a directory, and its missing parents."""
+        if self.is_dir(path):
+            return
+        self.makedirs(os.path.dirname(os.fspath(path)))
+        self.mkdir(path)
+
+    def populate(self, path: StrPath, tree: 'Tree'):
+        """Create `tree` at `path`, creating missing parent directories.
+
+        Trees are described as in the testsuite: directories are dicts of
+        their entries, files are strings (their contents), and links are
+        `{'type': 'link', 'target': ...}`.
+        """
+        self.makedirs(os.path.dirname(os.fspath(path)))
+        self._populate(os.fspath(path), tree)
+
+    def _populate(self, path: str, tree: 'Tree'):
+        if isinstance(tree, str):
+            with self.open(path, 'w') as file:
+                file.write(tree)
+        elif tree.get('type') == 'link':
+            self.symlink(tree['target'], path)
+        else:
+            self.makedirs(path)
+            for name, child in tree.items():
+                self._populate(os.path.join(path, name), child)
+
+    def tree(self, path: StrPath = os.sep) -> 'Tree':
+        """Describe the contents of `path`, in the format `populate` takes."""
+        node = self._resolve(path, follow=False)
+        if S_ISLNK(node.mode):
+            return {'type': 'link', 'target': node.data}
+        if not S_ISDIR(node.mode):
+            return node.data
+        return {name: self.tree(os.path.join(path, name)) for name in sorted(node.data)}
@@ -0,0 +1,287 @@
+"""Gitignore-style ignore files, read from the source tree.
+
+If the `ignore_files` configuration option names files (such as
+`.gitignore`), `emanate.gitignore` reads them from each directory of the
+source as it is walked. They use Git's syntax: one pattern per line, with
+`#` comments, `!` negations, a trailing `/` for patterns only matching
+directories, a leading or inner `/` anchoring patterns to the directory of
+the file, and `**` matching any number of directories. Rules of deeper files
+take precedence, and the last matching rule wins.
+
+Each file is compiled once into buckets, the same way `emanate.ignore` does:
+literal names and paths are looked up in sets, `*.ext`-like patterns by their
+suffix, and only the remaining globs are matched with a (single) regular
+expression. The compiled rules of a directory are chained to its parent's,
+so checking a path costs a few lookups per ignore file above it, whatever
+the number of rules. Compiled files are cached for the lifetime of the
+process (across runs, in `emanate watch`), keyed by their modification time.
+"""
+
+import os
+import re
+from collections.abc import Sequence
+from typing import ClassVar, NamedTuple
+
+from .fs import FileSystem, OSFileSystem
+
+_SPECIAL = re.compile(r'[*?[\\]')
+# Characters which must be escaped within a regular expression's set.
+_SET_SPECIAL = frozenset('\\[]^&~|')
+
+
+def _translate(pattern: str) -> str:
+    """Translate a gitignore glob into a regular expression.
+
+    `*`, `?` and sets never match `/`; `**` matches anything when it is a
+    whole path component (as in `**/foo`, `foo/**` and `a/**/b`).
+    """
+    i, n = 0, len(pattern)
+    result = []
+    while i < n:
+        char = pattern[i]
+        i += 1
+        if char == '*':
+            if pattern[i:i + 1] == '*' and (i == 1 or pattern[i - 2] == '/') \
+               and pattern[i + 1:i + 2] in ('', '/'):
+                i += 2
+                result.append('.*' if i > n else '(?:.*/)?')
+            else:
+                result.append('[^/]*')
+        elif char == '?':
+            result.append('[^/]')
+        elif char == '[':
+            j = i + (pattern[i:i + 1] in ('!', '^'))
+            j += pattern[j:j + 1] == ']'
+            j = pattern.find(']', j)
+            if j < 0:
+                result.append(re.escape(char))
+                continue
+            body, i = pattern[i:j], j + 1
+            negate = body[:1] in ('!', '^')
+            body = ''.join('\\' + c if c in _SET_SPECIAL else c for c in body[negate:])
+            result.append(f"(?!/)[{'^' if negate else ''}{body}]")
+        elif char == '\\' and i < n:
+            result.append(re.escape(pattern[i]))
+            i += 1
+        else:
+            result.append(re.escape(char))
+    return ''.join(result)
+
+
+class Rule(NamedTuple):
+    """A single line of an ignore file."""
+
+    pattern: str
+    negate: bool
+    dir_only: bool
+    anchored: bool
+
+    @classmethod
+    def parse(cls, line: str) -> 'Rule | None':
+        """Parse a line of an ignore file; None for blank lines and comments."""
+        line = line.rstrip('\r\n')
+        if not line or line.startswith('#'):
+            return None
+        # Trailing spaces are ignored, unless escaped with a backslash.
+        stripped = line.rstrip(' ')
+        if stripped.endswith('\\') and len(stripped) < len(line):
+            stripped += ' '
+
+        negate = stripped.startswith('!')
+        pattern = stripped[negate:]
+        dir_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+        # Patterns with a separator (besides a trailing one) are anchored.
+        anchored = '/' in pattern
+        pattern = pattern.lstrip('/')
+        if not pattern:
+            return None
+        return cls(pattern, negate, dir_only, anchored)
+
+
+class _Patterns:
+    """Compiled patterns of the same polarity: any of them matching is enough."""
+
+    __slots__ = ('name_regex', 'names', 'path_regex', 'paths', 'suffixes')
+
+    def __init__(self, rules: 'Sequence[Rule]'):
+        self.names: set[str] = set()
+        self.paths: set[str] = set()
+        self.suffixes: dict[int, set[str]] = {}
+        name_globs, path_globs = [], []
+
+        for rule in rules:
+            pattern = rule.pattern
+            if rule.anchored:
+                if _SPECIAL.search(pattern):
+                    path_globs.append(_translate(pattern))
+                else:
+                    self.paths.add(pattern)
+            elif not _SPECIAL.search(pattern):
+                self.names.add(pattern)
+            elif len(pattern) > 1 and pattern.startswith('*') and \
+                    not _SPECIAL.search(pattern, 1):
+                # A bare `*` would be an empty suffix, which matches nothing.
+                self.suffixes.setdefault(len(pattern) - 1, set()).add(pattern[1:])
+            else:
+                name_globs.append(_translate(pattern))
+
+        self.name_regex = re.compile('|'.join(name_globs)).fullmatch if name_globs else None
+        self.path_regex = re.compile('|'.join(path_globs)).fullmatch if path_globs else None
+
+    def __call__(self, rel: str, name: str) -> bool:
+        if name in self.names or rel in self.paths:
+            return True
+        for length, suffixes in self.suffixes.items():
+            if name[-length:] in suffixes:
+                return True
+        return (self.name_regex is not None and self.name_regex(name) is not None) or \
+            (self.path_regex is not None and self.path_regex(rel) is not None)
+
+
+class _Run(NamedTuple):
+    """Consecutive rules with the same polarity, compiled together."""
+
+    negate: bool
+    # Patterns matching any path, and those only matching directories.
+    every: _Patterns
+    dirs: _Patterns
+
+    @classmethod
+    def compile(cls, rules: 'Sequence[Rule]') -> 'list[_Run]':
+        """Compile rules, returning the runs in the order they are checked."""
+        runs: list[_Run] = []
+        start = 0
+        for i in range(1, len(rules) + 1):
+            if i == len(rules) or rules[i].negate != rules[start].negate:
+                chunk = rules[start:i]
+                runs.append(cls(chunk[0].negate,
+                                _Patterns([r for r in chunk if not r.dir_only]),
+                                _Patterns([r for r in chunk if r.dir_only])))
+                start = i
+        # The last matching rule wins.
+        return runs[::-1]
+
+
+class _Rules:
+    """The rules of a directory's ignore files, chained to its parent's."""
+
+    __slots__ = ('parent', 'prefix', 'runs', 'stamp')
+
+    def __init__(self, directory: str, runs: 'Sequence[_Run]', parent: '_Rules | None',
+                 stamp: str):
+        self.prefix = os.path.join(directory, '')
+        self.runs = runs
+        self.parent = parent
+        # Identifies the ignore files in effect, and their versions.
+        self.stamp = stamp
+
+    def match(self, path: str, is_dir: bool) -> bool:
+        rules: _Rules | None = self
+        while rules is not None:
+            rel = path[len(rules.prefix):]
+            if os.sep != '/':
+                rel = rel.replace(os.sep, '/')
+            name = rel.rpartition('/')[2]
+            for run in rules.runs:
+                if run.every(rel, name) or (is_dir and run.dirs(rel, name)):
+                    return not run.negate
+            rules = rules.parent
+        return False
+
+
+class IgnoreFiles:
+    """Match paths against ignore files in the source tree, and `patterns`.
+
+    `patterns` (such as an `IgnoreMatcher`) is checked first, and paths it
+    ignores can't be included again by ignore files. The ignore files
+    themselves are ignored. Files are read through `fs` (by default, the OS),
+    the first time a path in their directory (or below) is checked;
+    `refresh` forgets them, so changes are picked up.
+    """
+
+    __slots__ = ('_dirs', '_prefix', 'fs', 'names', 'patterns', 'root')
+
+    # Compiled ignore files by path, with their mtime and size, shared by
+    # every instance.
+    _cache: ClassVar[dict[str, tuple[tuple[int, int], list[_Run]]]] = {}
+
+    def __init__(self, root: str, names: 'Sequence[str]', patterns,
+                 fs: 'FileSystem | None' = None):
+        self.root = os.path.normpath(root)
+        self.names = tuple(names)
+        self.patterns = patterns
+        self.fs = OSFileSystem() if fs is None else fs
+        self._prefix = os.path.join(self.root, '')
+        self._dirs: dict[str, _Rules | None] = {}
+
+    def __call__(self, path: str, is_dir: bool = False) -> bool:
+        """Check whether an absolute path is ignored."""
+        if self.patterns(path, is_dir):
+            return True
+        directory, name = os.path.split(path)
+        if name in self.names and not is_dir:
+            return True
+        rules = self.rules(directory)
+        return rules is not None and rules.match(path, is_dir)
+
+    def refresh(self):
+        """Forget the ignore files read so far (compiled files stay cached)."""
+        self._dirs.clear()
+
+    def stamp(self, directory: str) -> str:
+        """Identify the ignore files in effect in `directory`, and their versions."""
+        rules = self.rules(directory)
+        return '' if rules is None else rules.stamp
+
+    def rules(self, directory: str) -> '_Rules | None':
+        """The rules in effect for the entries of `directory`."""
+        try:
+            return self._dirs[directory]
+        except KeyError:
+            pass
+
+        if directory == self.root:
+            parent = None
+        elif directory.startswith(self._prefix):
+            parent = self.rules(os.path.dirname(directory))
+        else:
+            return None
+
+        runs: list[_Run] = []
+        stamps = []
+        for name in self.names:
+            path = os.path.join(directory, name)
+            try:
+                stat = self.fs.stat(path)
+            except OSError:
+                continue
+            runs = self._compile(path, (stat.st_mtime_ns, stat.st_size)) + runs
+            stamps.append(f"{name}:{stat.st_mtime_ns}:{stat.st_size}")
+
+        rules = parent
+        if stamps:
+            stamp = f"{parent.stamp if parent else ''}/{os.path.basename(directory)}:" \
+                + ','.join(stamps)
+            rules = _Rules(directory, runs, parent, _digest(stamp))
+        self._dirs[directory] = rules
+        return rules
+
+    def _compile(self, path: str, version: 'tuple[int, int]') -> 'list[_Run]':
+        cached = self._cache.get(path)
+        if cached is not None and cached[0] == version:
+            return cached[1]
+
+        try:
+            with self.fs.open(path) as file:
+                rules = [rule for rule in map(Rule.parse, file) if rule is not None]
+        except (OSError, UnicodeDecodeError):
+            rules = []
+        runs = _Run.compile(rules)
+        self._cache[path] = (version, runs)
+        return runs
+
+
+def _digest(text: str) -> str:
+    import hashlib  # pylint: disable=import-outside-toplevel
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
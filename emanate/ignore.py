@@ -0,0 +1,83 @@
+"""Ignore-pattern matching for Emanate.
+
+`emanate.ignore` compiles the `ignore` configuration option once per run,
+into a matcher whose cost per path depends on the depth of the path rather
+than on the number of patterns.
+"""
+
+import os
+import re
+from collections.abc import Iterable
+from fnmatch import translate
+from pathlib import Path
+from typing import Callable
+
+_MAGIC = re.compile(r'[*?[]')
+
+
+def _is_dir(path_obj: Path) -> bool:
+    """Check whether a given path is a directory, but never raise an
+    exception (such as Path(x).is_dir() may do).
+    """
+    try:
+        return path_obj.is_dir()
+    except OSError:
+        return False
+
+
+class IgnoreMatcher:
+    """Match absolute paths against a set of ignore patterns.
+
+    Patterns are sorted into three buckets when the matcher is built:
+
+    - literal paths, which are looked up in a set;
+    - existing directories, which also ignore everything they contain, and are
+      looked up for each ancestor of a path;
+    - globs, which are combined into a single compiled regular expression.
+
+    Matching follows `fnmatch.fnmatch`: a `*` may match across path separators,
+    and paths are normalized with `os.path.normcase`. Which patterns are
+    directories is checked with `is_dir` (by default, on the OS).
+    """
+
+    __slots__ = ('directories', 'literals', 'regex')
+
+    def __init__(self, patterns: 'Iterable[Path | str]',
+                 is_dir: 'Callable[[Path], bool]' = _is_dir):
+        self.literals: set[str] = set()
+        self.directories: set[str] = set()
+        globs = []
+
+        for pattern in patterns:
+            pattern = Path(pattern)
+            text = os.path.normcase(str(pattern))
+            pattern_is_dir = is_dir(pattern)
+            if _MAGIC.search(text):
+                globs.append(translate(text))
+                # If it's a directory, also ignore its contents.
+                if pattern_is_dir:
+                    globs.append(translate(os.path.join(text, '*')))
+            elif pattern_is_dir:
+                self.directories.add(text)
+            else:
+                self.literals.add(text)
+
+        self.regex = re.compile('|'.join(globs)).match if globs else None
+
+    def __call__(self, path: str, is_dir: bool = False) -> bool:
+        """Check whether an absolute path is ignored."""
+        # pylint: disable=unused-argument
+        path = os.path.normcase(path)
+        if path in self.literals:
+            return True
+
+        if self.directories:
+            parent = path
+            while True:
+                if parent in self.directories:
+                    return True
+                parent, tail = os.path.split(parent)
+                if not tail:
+                    break
+
+        return self.regex is not None and self.regex(path) is not None
@@ -0,0 +1,136 @@
+"""Crash-safe journal of the actions applied to a destination.
+
+In atomic mode, `emanate.journal` records the actions of a run before they
+are applied: actions are appended to the journal in batches, and each batch
+is flushed to disk (with `fsync`) before any of its actions is applied. If a
+run is interrupted, the journal lists every action which might have been
+applied, so the run can be resumed or rolled back without walking the source
+again. The journal is removed once the run completed.
+
+The journal is a JSON Lines file in the destination directory, one per
+source directory: a header (with the format version, the source and the
+operation), followed by one serialized action per line.
+"""
+
+import json
+import os
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+from typing import IO
+
+from .fs import FileSystem, OSFileSystem
+from .plan import FilePair
+
+JOURNAL_NAME = ".emanate-journal"
+JOURNAL_VERSION = 1
+
+# Number of actions written (and synced) at once.
+BATCH_SIZE = 256
+
+
+class Journal:
+    """The journal of one run, for one source directory and destination.
+
+    Actions are only recorded once `enabled` is set (`Execution.run` does so),
+    so that dry-runs don't leave a journal behind. The journal is written
+    through `fs` (by default, the OS).
+    """
+
+    def __init__(self, source: Path, destination: Path, operation: str,
+                 fs: 'FileSystem | None' = None):
+        self.source = source
+        self.destination = destination
+        self.operation = operation
+        self.fs = OSFileSystem() if fs is None else fs
+        self.enabled = False
+        # The actions of an interrupted run, once loaded.
+        self.actions: list[FilePair] = []
+        self._file: IO[str] | None = None
+
+    @property
+    def key(self) -> str:
+        """The source directory, normalized."""
+        return os.path.normpath(self.source)
+
+    @property
+    def path(self) -> Path:
+        # Each source has its own journal, as several can share a destination.
+        import hashlib  # pylint: disable=import-outside-toplevel
+        digest = hashlib.sha1(os.fsencode(self.key)).hexdigest()[:12]
+        return self.destination / f"{JOURNAL_NAME}.{digest}"
+
+    def _sync(self, lines: 'list[str]'):
+        if self._file is None:
+            self._file = self.fs.open(self.path, 'w')
+            # Make sure the journal itself survives a crash.
+            self.fs.sync_dir(self.destination)
+            header = {'version': JOURNAL_VERSION, 'source': self.key,
+                      'operation': self.operation}
+            lines.insert(0, json.dumps(header) + "\n")
+
+        self._file.writelines(lines)
+        self.fs.sync(self._file)
+
+    def record(self, actions: 'Iterable[FilePair]',
+               batch: int = BATCH_SIZE) -> 'Iterator[FilePair]':
+        """Yield `actions`, recording each batch before it is yielded.
+
+        Skipped actions are passed through without being recorded.
+        """
+        pending: list[FilePair] = []
+        for action in actions:
+            pending.append(action)
+            if len(pending) >= batch:
+                yield from self._flush(pending)
+        yield from self._flush(pending)
+
+    def _flush(self, pending: 'list[FilePair]') -> 'Iterator[FilePair]':
+        if self.enabled:
+            lines = [json.dumps(a.to_dict()) + "\n" for a in pending if a.kind != 'skip']
+            if lines:
+                self._sync(lines)
+        yield from pending
+        pending.clear()
+
+    def close(self):
+        """Close the journal, keeping it for `resume` or `rollback`."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        """Close the journal, and remove it once the run completed."""
+        self.close()
+        try:
+            self.fs.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    @classmethod
+    def load(cls, source: Path, destination: Path,
+             fs: 'FileSystem | None' = None) -> 'Journal | None':
+        """Load the journal left by an interrupted run, if any.
+
+        The loaded actions are in `actions`; a truncated last line is ignored.
+        """
+        journal = cls(source, destination, '', fs)
+        try:
+            with journal.fs.open(journal.path) as file:
+                lines = file.readlines()
+        except FileNotFoundError:
+            return None
+
+        if not lines:
+            return None
+        header = json.loads(lines[0])
+        if header.get('version') != JOURNAL_VERSION:
+            raise ValueError(f"Unsupported file version in {str(journal.path)!r}")
+
+        journal.operation = header['operation']
+        for line in lines[1:]:
+            try:
+                journal.actions.append(FilePair.from_dict(json.loads(line)))
+            except ValueError:
+                # Interrupted while writing this line: nothing was applied.
+                break
+        return journal
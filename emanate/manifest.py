@@ -0,0 +1,149 @@
+"""Persistent record of the links Emanate created.
+
+`emanate.manifest` stores, in the destination directory, the list of links
+created from each source directory. This lets `clean` and `status` look at
+the known links directly, instead of walking the whole source tree, and
+find links whose source file was since deleted or renamed.
+
+The manifest is a JSON file, mapping each source directory to the sorted list
+of link paths, relative to the destination (and, equivalently, to the source),
+and to the files installed as copies (see the `copy` and `reflink` options),
+with the size and mtime they had once installed: `clean` only removes copies
+which weren't modified since.
+"""
+
+import json
+import os
+from collections.abc import Iterable, Iterator
+from pathlib import Path
+
+from .fs import FileSystem, OSFileSystem
+
+MANIFEST_NAME = ".emanate-manifest"
+MANIFEST_VERSION = 1
+
+
+class StateFile:
+    """Per-source state, stored in a JSON file in the destination directory.
+
+    Subclasses define the file's `NAME` and format `VERSION`; the entries of
+    other source directories sharing the same destination are preserved.
+    The file is read and written through `fs` (by default, the OS).
+    """
+
+    NAME: str
+    VERSION: int
+
+    def __init__(self, source: Path, destination: Path,
+                 fs: 'FileSystem | None' = None):
+        self.source = source
+        self.destination = destination
+        self.fs = OSFileSystem() if fs is None else fs
+
+    @property
+    def key(self) -> str:
+        """The source directory, normalized, as used in the state file."""
+        return os.path.normpath(self.source)
+
+    @property
+    def path(self) -> Path:
+        return self.destination / self.NAME
+
+    def _read(self) -> dict:
+        try:
+            with self.fs.open(self.path) as file:
+                data = json.load(file)
+        except FileNotFoundError:
+            return {}
+
+        if data.get('version') != self.VERSION:
+            raise ValueError(f"Unsupported file version in {str(self.path)!r}")
+
+        return data.get('sources', {})
+
+    def _write(self, value):
+        """Store `value` for this source, or remove its entry if None."""
+        sources = self._read()
+        if value is not None:
+            sources[self.key] = value
+        else:
+            sources.pop(self.key, None)
+
+        if not sources:
+            if self.fs.lexists(self.path):
+                self.fs.unlink(self.path)
+            return
+
+        # Write to a temporary file and rename it over the state file,
+        # so an interrupted run never leaves a truncated file behind.
+        tmp = self.path.with_name(self.NAME + ".tmp")
+        with self.fs.open(tmp, 'w') as file:
+            json.dump({'version': self.VERSION, 'sources': sources},
+                      file, separators=(',', ':'))
+        self.fs.rename(tmp, self.path)
+
+    def remove(self):
+        """Remove this source's entry from the state file."""
+        if self.fs.lexists(self.path):
+            self._write(None)
+
+
+class Manifest(StateFile):
+    """The links (and copies) recorded for one source directory in one destination."""
+
+    NAME = MANIFEST_NAME
+    VERSION = MANIFEST_VERSION
+
+    def __init__(self, source: Path, destination: Path, links=(),
+                 fs: 'FileSystem | None' = None):
+        super().__init__(source, destination, fs)
+        self.links: set[str] = set(links)
+        # The size and mtime (in ns) of each copy, once installed.
+        self.copies: dict[str, list[int]] = {}
+
+    @classmethod
+    def load(cls, source: Path, destination: Path,
+             fs: 'FileSystem | None' = None) -> 'Manifest | None':
+        """Load the manifest for `source`, or None if there isn't any."""
+        manifest = cls(source, destination, fs=fs)
+        sources = manifest._read()
+        if manifest.key not in sources:
+            return None
+
+        entry = sources[manifest.key]
+        manifest.links.update(entry.get('links', ()))
+        manifest.copies.update(entry.get('copies', {}))
+        return manifest
+
+    @classmethod
+    def sources(cls, destination: Path,
+                fs: 'FileSystem | None' = None) -> 'list[str]':
+        """List the source directories recorded in `destination`'s manifest."""
+        return list(cls(destination, destination, fs=fs)._read())
+
+    def save(self):
+        """Write the manifest, preserving entries for other sources."""
+        entry: dict[str, object] = {}
+        if self.links:
+            entry['links'] = sorted(self.links)
+        if self.copies:
+            entry['copies'] = dict(sorted(self.copies.items()))
+        self._write(entry or None)
+
+    def discard(self, rel: str):
+        """Forget a link or copy."""
+        self.links.discard(rel)
+        self.copies.pop(rel, None)
+
+    def retain(self, rels: 'Iterable[str]'):
+        """Forget the links and copies which aren't in `rels`."""
+        rels = set(rels)
+        self.links.intersection_update(rels)
+        for rel in self.copies.keys() - rels:
+            del self.copies[rel]
+
+    def __iter__(self) -> 'Iterator[str]':
+        return iter(sorted(self.links.union(self.copies)))
+
+    def __len__(self) -> int:
+        return len(self.links.union(self.copies))
@@ -0,0 +1,87 @@
+"""Machine-readable output for Emanate executions.
+
+`emanate.output` defines printers which write one record per action, through
+a single buffered binary stream, rather than calling `print` for each file:
+
+- `JSONLines` writes one JSON object per line, with the `action`, `src` and
+  `dest` keys;
+- `NulSeparated` writes the action, source and destination of each record,
+  each followed by a NUL byte (like `find -print0`).
+
+Actions are `mkdir`, `link`, `skip`, `replace`, `overwrite`, `unfold` and
+`unlink`; a `replace` record is preceded by a `backup` record, from the
+replaced file to its backup. Prompts (with the `ask` and `ask-once` conflict
+policies) are written to the standard error, so they don't mix with records.
+"""
+
+import json
+import os
+import sys
+from collections.abc import Iterator
+from typing import BinaryIO
+
+from .plan import FilePair, Replace
+
+# Bytes buffered before writing to the stream.
+BUFFER_SIZE = 64 * 1024
+
+
+class Output:
+    """Base class of machine-readable printers."""
+
+    __slots__ = ('_chunks', '_size', 'stream')
+
+    def __init__(self, stream: 'BinaryIO | None' = None):
+        self.stream = sys.stdout.buffer if stream is None else stream
+        self._chunks: list[bytes] = []
+        self._size = 0
+
+    def _encode(self, kind: str, src: str, dest: str) -> bytes:
+        raise NotImplementedError
+
+    @staticmethod
+    def records(kind: str, action: FilePair) -> 'Iterator[tuple[str, str, str]]':
+        """Yield the (kind, src, dest) records describing an action."""
+        if isinstance(action, Replace) and kind == 'replace':
+            dest = str(action.dest)
+            yield 'backup', dest, dest + '.emanate'
+        yield kind, str(action.src), str(action.dest)
+
+    def write(self, kind: str, action: FilePair):
+        """Record that `action` was applied as `kind` (such as 'skip')."""
+        for record in self.records(kind, action):
+            chunk = self._encode(*record)
+            self._chunks.append(chunk)
+            self._size += len(chunk)
+        if self._size >= BUFFER_SIZE:
+            self.flush()
+
+    def flush(self):
+        self.stream.write(b''.join(self._chunks))
+        self.stream.flush()
+        self._chunks.clear()
+        self._size = 0
+
+
+class JSONLines(Output):
+    """Write one JSON object per record and line."""
+
+    __slots__ = ()
+
+    def _encode(self, kind: str, src: str, dest: str) -> bytes:
+        return json.dumps({'action': kind, 'src': src, 'dest': dest}).encode() + b'\n'
+
+
+class NulSeparated(Output):
+    """Write the fields of each record, each followed by a NUL byte."""
+
+    __slots__ = ()
+
+    def _encode(self, kind: str, src: str, dest: str) -> bytes:
+        return b'%s\0%s\0%s\0' % (kind.encode(), os.fsencode(src), os.fsencode(dest))
+
+
+FORMATS: 'dict[str, type[Output]]' = {
+    'json': JSONLines,
+    'nul': NulSeparated,
+}
@@ -0,0 +1,96 @@
+"""Link several packages (source directories) at once, like Stow.
+
+`emanate.packages` walks every package first, merging them into a single
+index of destination paths, so that conflicts between packages are all
+reported before anything is written. Directories shared by several packages
+are only created once, and never folded.
+"""
+
+from collections.abc import Iterable, Sequence
+from pathlib import Path
+from typing import NamedTuple
+
+from .core import Emanate, Execution
+from .plan import FilePair, Mkdir
+from .runstats import RunStats
+
+
+class Conflict(NamedTuple):
+    """A destination path provided by more than one package."""
+
+    dest: Path
+    sources: tuple[Path, ...]
+
+
+class ConflictError(Exception):
+    """Raised when packages can't be linked together."""
+
+    def __init__(self, conflicts: 'Sequence[Conflict]'):
+        self.conflicts = list(conflicts)
+        lines = [f"{len(self.conflicts)} conflicting path(s):"]
+        lines += [f"{str(c.dest)!r}: " + ", ".join(repr(str(s)) for s in c.sources)
+                  for c in self.conflicts]
+        super().__init__("\n".join(lines))
+
+
+def _index(instances: 'Sequence[Emanate]') \
+        -> 'tuple[list[list[FilePair]], list[Conflict], set[Path]]':
+    """Walk every package, and merge their destination paths.
+
+    Returns the pairs to apply for each package (with directories shared by
+    several packages only kept for the first one), the conflicts found, and
+    the shared directories.
+    """
+    owners: dict[Path, list[FilePair]] = {}
+    plans: list[list[FilePair]] = []
+    for instance in instances:
+        plan = []
+        for pair in instance._files():  # pylint: disable=protected-access
+            seen = owners.setdefault(pair.dest, [])
+            seen.append(pair)
+            # Directories shared by several packages are only created once.
+            if len(seen) == 1 or not isinstance(pair, Mkdir):
+                plan.append(pair)
+        plans.append(plan)
+
+    found = [
+        Conflict(dest, tuple(p.src for p in pairs))
+        for dest, pairs in sorted(owners.items())
+        if len(pairs) > 1 and not all(isinstance(p, Mkdir) for p in pairs)
+    ]
+    shared = {dest for dest, pairs in owners.items() if len(pairs) > 1}
+    return plans, found, shared
+
+
+def conflicts(instances: 'Sequence[Emanate]') -> 'list[Conflict]':
+    """List the destination paths provided by more than one package."""
+    return _index(instances)[1]
+
+
+def create(instances: 'Iterable[Emanate]', jobs: int = 1) -> Execution:
+    """Create the links of several packages, in a single pass.
+
+    All packages are walked before anything is done: if any destination path
+    is provided by several packages, ConflictError is raised, listing every
+    conflict. Conflicts with files already in a destination are handled as
+    usual (see `Emanate.confirm_replace`).
+    """
+    instances = list(instances)
+    # Packages are walked right away: that is counted separately.
+    stats = RunStats() if any(instance.conf.stats for instance in instances) else None
+    if stats is not None:
+        stats.start()
+    for instance in instances:
+        instance.run_stats = stats
+    plans, found, shared = _index(instances)
+    if found:
+        raise ConflictError(found)
+
+    # pylint: disable=protected-access
+    return Execution.chain([instance._create(plan, nofold=shared)
+                            for instance, plan in zip(instances, plans)], jobs, stats)
+
+
+def clean(instances: 'Iterable[Emanate]', jobs: int = 1) -> Execution:
+    """Remove the links of several packages."""
+    return Execution.chain([instance.clean() for instance in instances], jobs)
@@ -0,0 +1,258 @@
+"""Planned actions for Emanate.
+
+`emanate.plan` defines `FilePair`, and the typed actions Emanate plans before
+touching the destination: `Mkdir`, `Unfold`, `Link`, `Replace`,
+`Overwrite`, `Skip` and `Unlink`.
+Actions are plain, immutable records; they can be converted to and from
+dictionaries of strings, to serialize a plan.
+
+`Plan` holds a large number of actions compactly, as paths relative to the
+source and destination directories.
+"""
+
+import os
+import sys
+from array import array
+from collections.abc import Iterable, Iterator
+from dataclasses import dataclass
+from pathlib import Path
+from typing import ClassVar
+
+
+@dataclass(frozen=True)
+class FilePair:
+    """Pairs of source/destination file paths."""
+
+    __slots__ = ('dest', 'src')
+
+    src: Path
+    dest: Path
+
+    # Name of the action, in serialized plans.
+    kind: ClassVar[str] = 'pair'
+    # Whether the action must be applied before any following one.
+    barrier: ClassVar[bool] = False
+
+    # Frozen, slotted dataclasses can't be unpickled with the default methods.
+    def __getstate__(self):
+        return (self.src, self.dest)
+
+    def __setstate__(self, state):
+        object.__setattr__(self, 'src', state[0])
+        object.__setattr__(self, 'dest', state[1])
+
+    def print_add(self):
+        """Print a message when creating a link."""
+        print(f"{str(self.src)!r} -> {str(self.dest)!r}")
+
+    def print_del(self):
+        """Print a message when deleting a link."""
+        print(f"{str(self.dest)!r}")
+
+    def del_symlink(self):
+        """Delete a link."""
+        try:
+            if self.dest.samefile(self.src):
+                self.dest.unlink()
+        except FileNotFoundError:
+            # The source is gone: only remove a link which still points to it.
+            if self.dest.is_symlink() and os.readlink(self.dest) == str(self.src):
+                self.dest.unlink()
+
+        return not os.path.lexists(self.dest)
+
+    def add_symlink(self) -> bool:
+        """Add a link."""
+        self.dest.symlink_to(self.src)
+        return self.src.samefile(self.dest)
+
+    def to_dict(self) -> dict[str, str]:
+        """Serialize the action."""
+        return {'action': self.kind, 'src': str(self.src), 'dest': str(self.dest)}
+
+    @staticmethod
+    def from_dict(data: dict[str, str]) -> 'FilePair':
+        """Deserialize an action produced by `to_dict`."""
+        return ACTIONS[data['action']](Path(data['src']), Path(data['dest']))
+
+
+class Mkdir(FilePair):
+    """Create the destination directory mirroring the `src` directory."""
+
+    __slots__ = ()
+    kind = 'mkdir'
+    # Directories must exist before anything is created inside them.
+    barrier = True
+
+    def print_add(self):
+        pass
+
+    def print_del(self):
+        pass
+
+
+class Unfold(FilePair):
+    """Replace the folded link at `dest` with a directory of links.
+
+    `dest` is a link to the `src` directory (usually from another source
+    directory); it is replaced with a real directory holding links to each
+    entry of `src`, so other links can be added to it.
+    """
+
+    __slots__ = ()
+    kind = 'unfold'
+    # The directory must be unfolded before anything is created inside it.
+    barrier = True
+
+    def print_add(self):
+        pass
+
+    def print_del(self):
+        pass
+
+
+class Link(FilePair):
+    """Create a symbolic link at `dest`, pointing to `src`."""
+
+    __slots__ = ()
+    kind = 'link'
+
+
+class Replace(FilePair):
+    """Back up the file at `dest`, and replace it with a link to `src`."""
+
+    __slots__ = ()
+    kind = 'replace'
+
+
+class Overwrite(FilePair):
+    """Remove the file at `dest` (without a backup), and link it to `src`."""
+
+    __slots__ = ()
+    kind = 'overwrite'
+
+
+class Skip(FilePair):
+    """Leave `dest` as it is (it is already linked, or isn't ours to remove)."""
+
+    __slots__ = ()
+    kind = 'skip'
+
+    def print_add(self):
+        pass
+
+    def print_del(self):
+        pass
+
+
+class Unlink(FilePair):
+    """Remove the link at `dest`, pointing to `src`."""
+
+    __slots__ = ()
+    kind = 'unlink'
+
+
+ACTIONS: dict[str, type[FilePair]] = {
+    cls.kind: cls for cls in (FilePair, Mkdir, Unfold, Link, Replace, Overwrite, Skip,
+                             Unlink)
+}
+
+
+class Plan:
+    """A compact, in-memory list of actions.
+
+    Each action is stored once, as its type and its path relative to the
+    `source` and `destination` directories; directory components are shared
+    between entries. Paths are only made absolute when iterating.
+    Actions whose paths aren't at the same place under both roots (such as
+    `Unfold`) are kept as they are.
+    """
+
+    __slots__ = ('_dest_prefix', '_dir_index', '_dirs', '_kinds', '_names', '_other',
+                 '_parents', '_src_prefix', 'destination', 'source')
+
+    # Action types, by their index in `_kinds`.
+    KINDS: ClassVar[tuple[type[FilePair], ...]] = tuple(ACTIONS.values())
+    _KIND_INDEX: ClassVar[dict[type[FilePair], int]] = {
+        cls: i for i, cls in enumerate(KINDS)
+    }
+
+    def __init__(self, source: Path, destination: Path,
+                 actions: 'Iterable[FilePair]' = ()):
+        self.source = source
+        self.destination = destination
+        self._src_prefix = os.path.join(source, '')
+        self._dest_prefix = os.path.join(destination, '')
+        self._dirs: list[str] = ['']
+        self._dir_index: dict[str, int] = {'': 0}
+        self._parents = array('I')
+        self._names: list[str] = []
+        self._kinds = bytearray()
+        self._other: dict[int, FilePair] = {}
+        self.extend(actions)
+
+    def _relpath(self, action: FilePair) -> 'str | None':
+        src, dest = str(action.src), str(action.dest)
+        if not (src.startswith(self._src_prefix) and dest.startswith(self._dest_prefix)):
+            return None
+        rel = src[len(self._src_prefix):]
+        return rel if rel == dest[len(self._dest_prefix):] else None
+
+    def append(self, action: FilePair):
+        rel = self._relpath(action)
+        if rel is None:
+            self._other[len(self._names)] = action
+            parent, name = 0, ''
+        else:
+            head, _, name = rel.rpartition(os.sep)
+            parent = self._dir_index.get(head, -1)
+            if parent < 0:
+                parent = self._dir_index[head] = len(self._dirs)
+                self._dirs.append(sys.intern(head))
+            name = sys.intern(name)
+
+        self._parents.append(parent)
+        self._names.append(name)
+        self._kinds.append(self._KIND_INDEX[type(action)])
+
+    def extend(self, actions: 'Iterable[FilePair]'):
+        for action in actions:
+            self.append(action)
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def relpaths(self) -> 'Iterator[tuple[type[FilePair], str]]':
+        """Yield the type and relative path of each action, without building paths.
+
+        Actions kept as they are yield their absolute destination path.
+        """
+        dirs, kinds, other = self._dirs, self.KINDS, self._other
+        for i, (parent, name, kind) in enumerate(zip(self._parents, self._names, self._kinds)):
+            if i in other:
+                yield kinds[kind], str(other[i].dest)
+            else:
+                head = dirs[parent]
+                yield kinds[kind], os.path.join(head, name) if head else name
+
+    def actions(self, destination: 'Path | None' = None) -> 'Iterator[FilePair]':
+        """Yield the actions, optionally rebased onto another `destination`."""
+        source = self.source
+        dest = self.destination if destination is None else destination
+        other = self._other
+        for i, (cls, rel) in enumerate(self.relpaths()):
+            if i in other:
+                yield other[i]
+            else:
+                yield cls(source / rel, dest / rel)
+
+    def __iter__(self) -> 'Iterator[FilePair]':
+        return self.actions()
+
+    def __getitem__(self, index: int) -> FilePair:
+        index = range(len(self))[index]
+        if index in self._other:
+            return self._other[index]
+        head = self._dirs[self._parents[index]]
+        rel = os.path.join(head, self._names[index]) if head else self._names[index]
+        return self.KINDS[self._kinds[index]](self.source / rel, self.destination / rel)
@@ -0,0 +1,137 @@
+"""Instrumentation of Emanate runs.
+
+`emanate.runstats` counts what a run did (entries walked and pruned, `stat`
+calls, actions applied) and how long each phase took. Instrumentation is
+only installed when the `stats` configuration option is set; otherwise,
+runs only pay for a few `is None` checks.
+"""
+
+import sys
+import time
+from collections import Counter
+from typing import Any, Callable, TextIO, TypeVar
+
+from .statcache import StatCache
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+# Timed phases. Ignore matching is timed within the walk, and prompts within
+# applying; `plan` is whatever time remains.
+PHASES = ('walk', 'ignore', 'plan', 'prompt', 'apply')
+
+
+class RunStats:
+    """Counters and per-phase timings for one execution."""
+
+    __slots__ = ('_included', '_start', '_stat_caches', 'actions', 'directories',
+                 'pruned', 'timings', 'walked')
+
+    def __init__(self):
+        self.walked = 0
+        self.pruned = 0
+        self.directories = 0
+        self.actions: Counter = Counter()
+        self.timings: dict[str, float] = dict.fromkeys(PHASES, 0.0)
+        self.timings['total'] = 0.0
+        self._start = None
+        self._stat_caches: list[StatCache] = []
+        self._included: list[RunStats] = []
+
+    @property
+    def stats(self) -> int:
+        """The number of `stat`/`lstat` calls made by the tracked caches."""
+        return sum(cache.calls for cache in self._stat_caches)
+
+    def include(self, other: 'RunStats'):
+        """Add what `other` counts (as it goes) to this summary.
+
+        This is used for chained executions (see `Execution.chain`), whose
+        own stats are never started.
+        """
+        self._included.append(other)
+
+    def track(self, stat_cache: StatCache):
+        """Count the `stat` calls made through `stat_cache`."""
+        self._stat_caches.append(stat_cache)
+
+    def start(self):
+        if self._start is None:
+            self._start = time.perf_counter()
+
+    def stop(self):
+        if self._start is not None:
+            self.timings['total'] += time.perf_counter() - self._start
+            self._start = None
+
+    def timed(self, phase: str, func: F) -> F:
+        """Wrap `func`, adding the time spent in it to `phase`."""
+        timings = self.timings
+        clock = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                timings[phase] += clock() - start
+
+        return wrapper  # type: ignore
+
+    def ignored(self, func: 'Callable[[str, bool], bool]') -> 'Callable[[str, bool], bool]':
+        """Wrap an ignore matcher, counting entries walked and pruned."""
+        timed = self.timed('ignore', func)
+
+        def wrapper(path: str, is_dir: bool = False) -> bool:
+            self.walked += 1
+            if timed(path, is_dir):
+                self.pruned += 1
+                return True
+            return False
+
+        return wrapper
+
+    def listdir(self, func: F) -> F:
+        """Wrap a directory lister, counting directories visited."""
+        timed = self.timed('walk', func)
+
+        def wrapper(*args, **kwargs):
+            self.directories += 1
+            return timed(*args, **kwargs)
+
+        return wrapper  # type: ignore
+
+    def as_dict(self) -> dict[str, Any]:
+        """Return the counters and exclusive per-phase timings.
+
+        With several jobs, `apply` is the time summed across all workers.
+        Included stats are summed with these.
+        """
+        parts = [self, *self._included]
+        actions: Counter = sum((part.actions for part in parts), Counter())
+        timings = {phase: sum(part.timings[phase] for part in parts)
+                   for phase in self.timings}
+        timings['plan'] = max(0.0, timings['total'] - timings['walk'] - timings['apply'])
+        timings['walk'] = max(0.0, timings['walk'] - timings['ignore'])
+        timings['apply'] = max(0.0, timings['apply'] - timings['prompt'])
+        return {
+            'walked': sum(part.walked for part in parts),
+            'pruned': sum(part.pruned for part in parts),
+            'directories': sum(part.directories for part in parts),
+            'stats': sum(part.stats for part in parts),
+            'actions': dict(actions),
+            'timings': timings,
+        }
+
+    def report(self, file: 'TextIO | None' = None):
+        """Print a human-readable summary, to the standard error by default."""
+        file = sys.stderr if file is None else file
+        data = self.as_dict()
+        actions = ", ".join(f"{kind} {count}"
+                            for kind, count in sorted(data['actions'].items()))
+        timings = ", ".join(f"{phase} {seconds:.3f}s"
+                            for phase, seconds in data['timings'].items())
+        print(f"walked: {data['walked']} entries ({data['pruned']} pruned) "
+              f"in {data['directories']} directories", file=file)
+        print(f"stat calls: {data['stats']}", file=file)
+        print(f"actions: {actions or 'none'}", file=file)
+        print(f"time: {timings}", file=file)
@@ -0,0 +1,115 @@
+"""Directory snapshots, for incremental runs of Emanate.
+
+`emanate.snapshot` records, for each directory of the source tree, its
+modification time and inode along with its (filtered) listing. On the next
+incremental run, directories which haven't changed since are not listed
+again, and their files are assumed to be linked already: an unchanged tree
+costs one `stat` per directory.
+
+Changes made directly in the destination (such as deleting a link) are not
+detected by incremental runs.
+"""
+
+import os
+import time
+from pathlib import Path
+from typing import Callable
+
+from .fs import FileSystem
+from .manifest import StateFile
+from .walk import WalkEntry
+
+SNAPSHOT_NAME = ".emanate-snapshot"
+SNAPSHOT_VERSION = 1
+
+# Kinds of entries, as stored in the snapshot.
+_FILE, _DIR, _DIR_LINK = 0, 1, 2
+
+# Timestamps are coarse on some filesystems (2 seconds on FAT), so directories
+# modified shortly before a snapshot are always listed again.
+_MTIME_MARGIN = 2 * 10**9
+
+
+def fingerprint(*values) -> str:
+    """Summarize the settings a snapshot is valid for."""
+    import hashlib  # pylint: disable=import-outside-toplevel
+    digest = hashlib.sha1()
+    for value in values:
+        digest.update(repr(value).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class Snapshot(StateFile):
+    """Cached listings of the directories in a source tree.
+
+    A snapshot is only valid for the `fingerprint` it was recorded with, which
+    should cover every setting that affects listings (such as ignore rules).
+    If `stamp` is given, it is called with each directory's path; a listing is
+    only reused if the result didn't change (see `IgnoreFiles.stamp`).
+    """
+
+    NAME = SNAPSHOT_NAME
+    VERSION = SNAPSHOT_VERSION
+
+    def __init__(self, source: Path, destination: Path, fingerprint: str,
+                 fs: 'FileSystem | None' = None,
+                 stamp: 'Callable[[str], str] | None' = None):
+        super().__init__(source, destination, fs)
+        self.fingerprint = fingerprint
+        self.stamp = stamp
+        self.cached: dict[str, list] = {}
+        self.dirs: dict[str, list] = {}
+        self.changed: set[str] = set()
+        # Directories modified after this point can't be trusted to be
+        # unchanged on the next run, as mtimes have a limited resolution.
+        self.started = time.time_ns() - _MTIME_MARGIN
+
+    @classmethod
+    def load(cls, source: Path, destination: Path, fingerprint: str,
+             fs: 'FileSystem | None' = None,
+             stamp: 'Callable[[str], str] | None' = None) -> 'Snapshot':
+        """Load the snapshot for `source`, if it matches `fingerprint`."""
+        snapshot = cls(source, destination, fingerprint, fs, stamp)
+        data = snapshot._read().get(snapshot.key)
+        if data is not None and data.get('fingerprint') == fingerprint:
+            snapshot.cached = data['dirs']
+        return snapshot
+
+    def save(self):
+        """Record the directories listed since the snapshot was loaded."""
+        self._write({'fingerprint': self.fingerprint, 'dirs': self.dirs})
+
+    def listdir(self, root: str, ignored: 'Callable[[str, bool], bool]',
+                relpath: str = '') -> 'list[WalkEntry]':
+        """List a directory, reusing the cached listing if it is unchanged.
+
+        Directories which had to be listed again are added to `changed`.
+        """
+        top = os.path.join(root, relpath) if relpath else root
+        try:
+            stat = self.fs.stat(top)
+        except OSError:
+            return []
+
+        cached = self.cached.get(relpath)
+        extra = [] if self.stamp is None else [self.stamp(top)]
+        if cached is not None and cached[:2] == [stat.st_mtime_ns, stat.st_ino] \
+           and cached[3:] == extra:
+            entries = [
+                WalkEntry(os.path.join(relpath, name) if relpath else name,
+                          os.path.join(top, name),
+                          kind != _FILE, kind == _DIR_LINK)
+                for name, kind in cached[2]
+            ]
+        else:
+            self.changed.add(relpath)
+            entries = self.fs.scandir(root, ignored, relpath)
+
+        mtime = stat.st_mtime_ns if stat.st_mtime_ns < self.started else -1
+        self.dirs[relpath] = [mtime, stat.st_ino, [
+            [os.path.basename(e.relpath),
+             _DIR_LINK if e.is_link else _DIR if e.is_dir else _FILE]
+            for e in entries
+        ], *extra]
+        return entries
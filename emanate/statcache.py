@@ -0,0 +1,77 @@
+"""Per-run cache of `stat` results.
+
+A single file is looked at several times during a run: to check whether it
+is already linked, whether it conflicts with an existing file, and whether
+the link was created properly. `emanate.statcache` lets all of these share
+the result of a single `stat` (or `lstat`) call, until the path is modified.
+"""
+
+import errno
+import os
+
+from .fs import FileSystem, OSFileSystem, StrPath
+
+# Errors meaning that a path doesn't exist (the same as `Path.exists`).
+_MISSING = frozenset((errno.ENOENT, errno.ENOTDIR, errno.EBADF, errno.ELOOP))
+
+
+class StatCache:
+    """Cache `stat`/`lstat` results for the duration of a run.
+
+    Callers must `invalidate` the paths they modify. The number of actual
+    `stat`/`lstat` calls is kept in `calls`. Files are looked up in `fs` (by
+    default, through the operating system).
+    """
+
+    __slots__ = ('_lstat', '_stat', 'calls', 'fs')
+
+    def __init__(self, fs: 'FileSystem | None' = None):
+        self.fs = OSFileSystem() if fs is None else fs
+        self._stat: dict[str, os.stat_result | None] = {}
+        self._lstat: dict[str, os.stat_result | None] = {}
+        self.calls = 0
+
+    def _call(self, func, path: str) -> 'os.stat_result | None':
+        self.calls += 1
+        try:
+            return func(path)
+        except OSError as error:
+            if error.errno in _MISSING:
+                return None
+            raise
+
+    def stat(self, path: StrPath) -> 'os.stat_result | None':
+        """Stat `path`, following symbolic links; None if it doesn't exist."""
+        key = os.fspath(path)
+        try:
+            return self._stat[key]
+        except KeyError:
+            result = self._stat[key] = self._call(self.fs.stat, key)
+            return result
+
+    def lstat(self, path: StrPath) -> 'os.stat_result | None':
+        """Stat `path`, without following symbolic links; None if it doesn't exist."""
+        key = os.fspath(path)
+        try:
+            return self._lstat[key]
+        except KeyError:
+            result = self._lstat[key] = self._call(self.fs.lstat, key)
+            return result
+
+    def exists(self, path: StrPath) -> bool:
+        return self.stat(path) is not None
+
+    def lexists(self, path: StrPath) -> bool:
+        return self.lstat(path) is not None
+
+    def samefile(self, path: StrPath, other: StrPath) -> bool:
+        """Check whether both paths exist, and refer to the same file."""
+        stat, other_stat = self.stat(path), self.stat(other)
+        return stat is not None and other_stat is not None and \
+            os.path.samestat(stat, other_stat)
+
+    def invalidate(self, path: StrPath):
+        """Forget cached results for a path which was modified."""
+        key = os.fspath(path)
+        self._stat.pop(key, None)
+        self._lstat.pop(key, None)
@@ -0,0 +1,181 @@
+"""Source tree walker for Emanate.
+
+`emanate.walk` lists the contents of a source directory using `os.scandir`,
+checking every directory against the ignore rules *before* descending into
+it, so ignored trees (such as `.git/`) are never listed at all.
+"""
+
+import os
+from collections.abc import Iterator
+from typing import TYPE_CHECKING, Callable, NamedTuple
+
+if TYPE_CHECKING:
+    import queue
+    import threading
+
+
+class WalkEntry(NamedTuple):
+    """An entry found while walking a source directory."""
+
+    relpath: str
+    path: str
+    is_dir: bool
+    # Symbolic links to directories are reported as directories, but never
+    # descended into (the same way `Path.glob("**")` behaves).
+    is_link: bool = False
+
+
+Lister = Callable[[str, 'Callable[[str, bool], bool]', str], 'list[WalkEntry]']
+
+
+def scandir(root: str, ignored: 'Callable[[str, bool], bool]',
+            relpath: str = '') -> 'list[WalkEntry]':
+    """List the entries of a single directory, sorted and filtered."""
+    top = os.path.join(root, relpath) if relpath else root
+    try:
+        with os.scandir(top) as scandir_it:
+            entries = sorted(scandir_it, key=lambda e: e.name)
+    except (FileNotFoundError, NotADirectoryError, PermissionError):
+        return []
+
+    result = []
+    for entry in entries:
+        try:
+            is_dir = entry.is_dir()
+            is_link = is_dir and entry.is_symlink()
+        except OSError:
+            is_dir = is_link = False
+
+        if ignored(entry.path, is_dir):
+            continue
+
+        rel = os.path.join(relpath, entry.name) if relpath else entry.name
+        result.append(WalkEntry(rel, entry.path, is_dir, is_link))
+
+    return result
+
+
+def walk(root: str, ignored: 'Callable[[str, bool], bool]',
+         relpath: str = '', listdir: Lister = scandir) -> 'Iterator[WalkEntry]':
+    """Walk `root`, yielding every entry which isn't ignored.
+
+    `ignored` is called with the absolute path of each entry, and whether it is
+    a directory; ignored directories are pruned, and their contents are never
+    listed.
+
+    Entries are yielded in a stable order: the (sorted) contents of a directory
+    come first, followed by the contents of each of its subdirectories, so a
+    directory is always yielded before anything it contains.
+
+    `listdir` lists a single directory, and defaults to `scandir`; it allows
+    callers to substitute cached listings.
+    """
+    entries = listdir(root, ignored, relpath)
+    yield from entries
+
+    for entry in entries:
+        if entry.is_dir and not entry.is_link:
+            yield from walk(root, ignored, entry.relpath, listdir)
+
+
+# Entries sent at once by a walking thread, and chunks buffered per shard.
+CHUNK_SIZE = 256
+MAX_CHUNKS = 64
+
+
+class _Stopped(Exception):
+    """Raised in walking threads, once the results aren't needed anymore."""
+
+
+def _walk_list(root: str, ignored: 'Callable[[str, bool], bool]',
+               relpath: str) -> 'list[WalkEntry]':
+    # Run in worker processes: results are sent back as a whole.
+    return list(walk(root, ignored, relpath))
+
+
+def _walk_chunks(root: str, ignored: 'Callable[[str, bool], bool]', relpath: str,
+                 listdir: Lister, chunks: 'queue.Queue', stop: 'threading.Event'):
+    # Run in worker threads: results are streamed back in chunks.
+    import queue  # pylint: disable=import-outside-toplevel,redefined-outer-name
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                chunks.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise _Stopped
+
+    try:
+        chunk: list[WalkEntry] = []
+        for entry in walk(root, ignored, relpath, listdir):
+            chunk.append(entry)
+            if len(chunk) >= CHUNK_SIZE:
+                put(chunk)
+                chunk = []
+        put(chunk)
+        put(None)
+    except _Stopped:
+        pass
+    except BaseException as error:  # noqa: BLE001  # pylint: disable=broad-except
+        # Errors are raised again in the consuming thread.
+        put(error)
+
+
+def walk_sharded(root: str, ignored: 'Callable[[str, bool], bool]',
+                 listdir: Lister = scandir, jobs: int = 4,
+                 processes: bool = False) -> 'Iterator[WalkEntry]':
+    """Walk `root` like `walk`, listing top-level subdirectories concurrently.
+
+    Each top-level subdirectory is walked by one of `jobs` worker threads,
+    which stream their entries back, or by worker processes if `processes` is
+    True. In that case `ignored` must be picklable, and `listdir` isn't used
+    below the top level (workers always use `scandir`); results are sent back
+    once each subdirectory was walked.
+    """
+    # Only imported when needed, as they are slow to import.
+    # pylint: disable=import-outside-toplevel,redefined-outer-name
+    import queue
+    import threading
+    from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+
+    entries = listdir(root, ignored, '')
+    yield from entries
+
+    shards = [e.relpath for e in entries if e.is_dir and not e.is_link]
+    if not shards:
+        return
+
+    executor: Executor
+    if processes:
+        executor = ProcessPoolExecutor(max_workers=jobs)
+        try:
+            futures = [executor.submit(_walk_list, root, ignored, rel) for rel in shards]
+            for future in futures:
+                yield from future.result()
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+        return
+
+    stop = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=jobs)
+    try:
+        queues: list[queue.Queue] = []
+        for rel in shards:
+            chunks: queue.Queue = queue.Queue(MAX_CHUNKS)
+            queues.append(chunks)
+            executor.submit(_walk_chunks, root, ignored, rel, listdir, chunks, stop)
+
+        for chunks in queues:
+            while True:
+                chunk: list[WalkEntry] | None = chunks.get()
+                if chunk is None:
+                    break
+                if isinstance(chunk, BaseException):
+                    raise chunk
+                yield from chunk
+    finally:
+        # Workers still running (if the walk was interrupted) give up.
+        stop.set()
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,187 @@
+"""Keep a destination in sync with its source, as the source changes.
+
+`emanate.watch` uses Linux's inotify (through `ctypes`) to watch every
+directory of the source which isn't ignored. Events are coalesced until the
+source has been quiet for a short while, then the changed paths are applied
+with `Emanate.sync`; a burst of events (such as a `git checkout`) results in
+a single batched update.
+"""
+
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+from collections.abc import Iterator
+from typing import Callable
+
+from .core import Emanate, Execution
+
+# Constants from <sys/inotify.h>.
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_ONLYDIR = 0x01000000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_Q_OVERFLOW = 0x00004000
+
+# Modified files matter too, for files installed as copies.
+WATCH_MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO | IN_MODIFY | \
+    IN_CLOSE_WRITE | IN_ONLYDIR
+
+_EVENT = struct.Struct('iIII')
+
+
+class Inotify:
+    """Minimal wrapper around an inotify file descriptor."""
+
+    def __init__(self):
+        if not sys.platform.startswith('linux'):
+            raise OSError("inotify is only available on Linux")
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            self._raise()
+
+    def _raise(self, path=None):
+        errno = ctypes.get_errno()
+        raise OSError(errno, os.strerror(errno), path)
+
+    def add_watch(self, path: str, mask: int = WATCH_MASK) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            self._raise(path)
+        return wd
+
+    def rm_watch(self, wd: int):
+        # The watch might already be gone, if its directory was deleted.
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self, timeout: 'float | None') -> 'Iterator[tuple[int, int, str]]':
+        """Yield (wd, mask, name) events, waiting at most `timeout` seconds."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, _cookie, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            yield wd, mask, name
+
+    def close(self):
+        os.close(self.fd)
+
+
+class Watcher:
+    """Watch the source of an `Emanate` instance, and apply its changes.
+
+    Changes are coalesced until no event was received for `debounce` seconds
+    (or for at most `max_delay` seconds after the first event).
+    """
+
+    def __init__(self, emanate: Emanate, debounce: float = 0.2,
+                 max_delay: float = 5.0):
+        self.emanate = emanate
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.inotify = Inotify()
+        self.watches: dict[int, str] = {}
+
+    def add_tree(self, relpath: str = ''):
+        """Watch a source directory, and its subdirectories which aren't ignored."""
+        # pylint: disable=protected-access
+        root = str(self.emanate.conf.source)
+        if relpath and self.emanate._ignored_relpath(relpath, True):
+            return
+
+        try:
+            self.watches[self.inotify.add_watch(os.path.join(root, relpath))] = relpath
+        except (FileNotFoundError, NotADirectoryError):
+            return
+
+        for pair in self.emanate._files(relpath=relpath):
+            # Symbolic links to directories are linked, not descended into.
+            if pair.barrier and not pair.src.is_symlink():
+                rel = os.path.relpath(pair.src, root)
+                try:
+                    self.watches[self.inotify.add_watch(str(pair.src))] = rel
+                except (FileNotFoundError, NotADirectoryError):
+                    continue
+
+    def remove_tree(self, relpath: str):
+        """Stop watching a source directory and its subdirectories."""
+        prefix = relpath + os.sep
+        for wd, rel in list(self.watches.items()):
+            if not relpath or rel == relpath or rel.startswith(prefix):
+                self.inotify.rm_watch(wd)
+                del self.watches[wd]
+
+    def wait(self, timeout: 'float | None' = None) -> 'set[str] | None':
+        """Wait for changes, and return the (relative) paths which changed.
+
+        Returns an empty set if nothing happened within `timeout` seconds, and
+        None if events were lost and the whole source must be synced again.
+        """
+        changed: set[str] = set()
+        overflow = False
+        deadline = None
+        wait = timeout
+        while True:
+            events = list(self.inotify.read(wait))
+            if not events:
+                break
+
+            for wd, mask, name in events:
+                if mask & IN_Q_OVERFLOW:
+                    overflow = True
+                    continue
+                if mask & IN_IGNORED or wd not in self.watches:
+                    self.watches.pop(wd, None)
+                    continue
+
+                rel = os.path.join(self.watches[wd], name) if self.watches[wd] else name
+                changed.add(rel)
+                if mask & IN_ISDIR:
+                    if mask & (IN_DELETE | IN_MOVED_FROM):
+                        self.remove_tree(rel)
+                    else:
+                        self.add_tree(rel)
+
+            now = time.monotonic()
+            deadline = deadline or now + self.max_delay
+            wait = min(self.debounce, max(0.0, deadline - now))
+            if wait <= 0:
+                break
+
+        return None if overflow else changed
+
+    def run(self, execute: 'Callable[[Execution], object]' = Execution.run):
+        """Sync the whole source, then keep applying changes until interrupted."""
+        # Start watching first, so changes made during the sync aren't missed.
+        self.add_tree()
+        execute(self.emanate.create())
+        while True:
+            changed = self.wait()
+            if changed is None:
+                self.remove_tree('')
+                self.add_tree()
+                execute(self.emanate.create())
+            elif changed:
+                execute(self.emanate.sync(changed))
+
+    def close(self):
+        self.inotify.close()
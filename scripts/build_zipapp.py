@@ -0,0 +1,67 @@
+"""Build a zipapp of Emanate, optimized for startup time.
+
+Python can't write bytecode caches for modules imported from a zip file, so a
+zipapp holding only sources compiles every module it imports, each time it
+runs. This adds bytecode (as unchecked hash-based `.pyc` files, which
+`zipimport` prefers to sources) for every module. Python versions with a
+different bytecode format ignore them, and fall back to the sources.
+
+Releases run it over the zipapp built by bork (see .cirrus.yml), replacing it.
+
+Usage: python scripts/build_zipapp.py [--no-compile] OUTPUT...
+"""
+
+import io
+import py_compile
+import sys
+import zipfile
+from argparse import ArgumentParser
+from importlib.util import MAGIC_NUMBER
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+ROOT = Path(__file__).resolve().parent.parent
+MAIN = "from emanate.cli import main\nmain()\n"
+
+
+def _bytecode(source: str, name: str, tmpdir: Path) -> bytes:
+    """Compile `source` into the contents of an unchecked hash-based .pyc file."""
+    path, cfile = tmpdir / "module.py", tmpdir / "module.pyc"
+    path.write_text(source)
+    py_compile.compile(str(path), str(cfile), dfile=name, doraise=True,
+                       invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH)
+    return cfile.read_bytes()
+
+
+def build(output: Path, compiled: bool = True) -> Path:
+    """Write the zipapp to `output`, and return it."""
+    files = {'__main__.py': MAIN}
+    for path in sorted((ROOT / 'emanate').glob('*.py')):
+        files[f"emanate/{path.name}"] = path.read_text()
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive, \
+            TemporaryDirectory() as tmpdir:
+        for name, source in files.items():
+            archive.writestr(name, source)
+            if compiled:
+                archive.writestr(name + 'c', _bytecode(source, name, Path(tmpdir)))
+
+    output.write_bytes(b"#!/usr/bin/env python3\n" + buffer.getvalue())
+    output.chmod(0o755)
+    return output
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--no-compile", action="store_false", dest="compiled")
+    parser.add_argument("outputs", type=Path, nargs="+", metavar="OUTPUT")
+    args = parser.parse_args()
+    for output in args.outputs:
+        build(output, args.compiled)
+        print(f"{output} (bytecode for Python {sys.version.split()[0]}, "
+              f"magic {MAGIC_NUMBER.hex()})" if args.compiled else output)
+
+
+if __name__ == "__main__":
+    main()
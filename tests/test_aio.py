@@ -0,0 +1,88 @@
+import asyncio
+import sys
+from pathlib import Path
+
+import pytest
+from utils import emanate
+
+from emanate.fs import MemoryFileSystem
+from emanate.journal import Journal
+from emanate.manifest import Manifest
+
+ROOT = Path('/tree')
+
+
+def links(fs):
+    return {name for name, node in fs.tree(ROOT / 'dest').items()
+            if isinstance(node, dict) and node.get('type') == 'link'}
+
+
+@pytest.fixture(autouse=True)
+def no_stdin(monkeypatch):
+    """Nothing may be read from the standard input."""
+    monkeypatch.setattr(sys, 'stdin', None)
+
+
+def test_create_and_clean():
+    fs = MemoryFileSystem()
+    fs.populate(ROOT, {'src': {f'f{i:02}': '' for i in range(20)}, 'dest': {}})
+
+    async def main():
+        planned = [a.kind async for a in emanate(ROOT, fs=fs).aplan(batch=3)]
+        assert planned == ['link'] * 20
+        await emanate(ROOT, fs=fs).acreate(batch=3)
+        assert len(links(fs)) == 20
+        await emanate(ROOT, fs=fs).aclean(batch=3)
+        assert not links(fs)
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize('policy, calls', [
+    ('ask', [['a'], ['b']]),
+    ('ask-once', [['a', 'b']]),
+])
+def test_confirm(policy, calls):
+    fs = MemoryFileSystem()
+    fs.populate(ROOT, {'src': {'a': '', 'b': '', 'c': ''}, 'dest': {'a': 'a', 'b': 'b'}})
+    asked = []
+
+    async def confirm(paths):
+        await asyncio.sleep(0)
+        asked.append([path.name for path in paths])
+        return paths[0].name != 'b'
+
+    asyncio.run(emanate(ROOT, fs=fs, conflicts=policy).acreate(confirm=confirm, batch=1))
+    assert asked == calls
+    if policy == 'ask':
+        assert links(fs) == {'a', 'c'} and fs.tree(ROOT / 'dest' / 'b') == 'b'
+    else:
+        assert links(fs) == {'a', 'b', 'c'}
+
+
+def test_cancel():
+    """Cancelled runs stop after the current batch, and record it."""
+    fs = MemoryFileSystem()
+    fs.populate(ROOT, {'src': {f'f{i:02}': '' for i in range(50)},
+                       'dest': {'f00': 'conflict'}})
+    instance = emanate(ROOT, fs=fs, incremental=True, atomic=True)
+
+    async def main():
+        task = asyncio.current_task()
+
+        async def confirm(paths):
+            task.cancel()
+            return True
+
+        with pytest.raises(asyncio.CancelledError):
+            await instance.acreate(confirm=confirm, batch=10)
+
+    asyncio.run(main())
+    assert links(fs) == {f'f{i:02}' for i in range(10)}
+    assert Manifest.load(ROOT / 'src', ROOT / 'dest', fs).links == links(fs)
+    # No snapshot is saved (the next run looks at everything again), and
+    # the journal is kept, so the run can be resumed.
+    assert Journal.load(ROOT / 'src', ROOT / 'dest', fs).operation == 'create'
+    assert {name for name in fs.listdir(ROOT / 'dest')
+            if not name.startswith('.emanate-journal')} == \
+        links(fs) | {'.emanate-manifest', 'f00.emanate'}
@@ -0,0 +1,107 @@
+import io
+
+import pytest
+from utils import directory_tree, emanate
+
+from emanate import ConflictingFilesError
+from emanate.manifest import Manifest
+
+TREE = {
+    'src': {'foo': '', 'bar': '', 'dir': ''},
+    'dest': {'foo': 'conflict', 'dir': {'file': ''}},
+}
+
+
+def never(*_):
+    raise AssertionError("Unexpected prompt")
+
+
+def test_backup(monkeypatch):
+    with directory_tree(TREE) as tmpdir:
+        dest = tmpdir / 'dest'
+        instance = emanate(tmpdir, conflicts='backup')
+        monkeypatch.setattr(instance, 'confirm_replace', never)
+        instance.create().run()
+        assert (dest / 'foo').samefile(tmpdir / 'src' / 'foo')
+        assert (dest / 'foo.emanate').read_text() == 'conflict'
+        assert (dest / 'dir.emanate' / 'file').exists()
+
+
+def test_backup_lazy():
+    """With the `backup` policy, the source is walked as links are created."""
+    with directory_tree({'src': {'a': '', 'z': {}}, 'dest': {'a': 'conflict'}}) as tmpdir:
+        steps = emanate(tmpdir, conflicts='backup').create().steps()
+        assert next(steps).kind == 'replace'
+        (tmpdir / 'src' / 'z' / 'new').write_text('')
+        for _ in steps:
+            pass
+        assert (tmpdir / 'dest' / 'z' / 'new').is_symlink()
+
+
+def test_skip():
+    with directory_tree(TREE) as tmpdir:
+        dest = tmpdir / 'dest'
+        emanate(tmpdir, conflicts='skip').create().run()
+        assert (dest / 'foo').read_text() == 'conflict'
+        assert not (dest / 'foo').is_symlink()
+        assert (dest / 'bar').samefile(tmpdir / 'src' / 'bar')
+        # Files which weren't linked aren't recorded.
+        assert set(Manifest.load(tmpdir / 'src', dest)) == {'bar'}
+
+
+def test_overwrite():
+    with directory_tree(TREE) as tmpdir:
+        dest = tmpdir / 'dest'
+        emanate(tmpdir, conflicts='overwrite').create().run()
+        assert (dest / 'foo').samefile(tmpdir / 'src' / 'foo')
+        assert not (dest / 'foo.emanate').exists()
+        # Directories are backed up rather than removed.
+        assert (dest / 'dir.emanate' / 'file').exists()
+
+
+def test_fail():
+    with directory_tree(TREE) as tmpdir:
+        dest = tmpdir / 'dest'
+        with pytest.raises(ConflictingFilesError) as error:
+            emanate(tmpdir, conflicts='fail').create().run()
+        assert error.value.paths == [dest / 'dir', dest / 'foo']
+        # Nothing was done.
+        assert not (dest / 'bar').exists()
+
+
+@pytest.mark.parametrize('answer, replaced', [('y\n', True), ('n\n', False)])
+def test_ask_once(monkeypatch, capsys, answer, replaced):
+    with directory_tree(TREE) as tmpdir:
+        dest = tmpdir / 'dest'
+        monkeypatch.setattr('sys.stdin', io.StringIO(answer))
+        emanate(tmpdir, conflicts='ask-once').create().run()
+
+        # Prompts don't mix with the output.
+        out, err = capsys.readouterr()
+        assert "already exists" not in out
+        assert err.count("already exists") == 2
+        assert err.count("[Y/n]") == 1
+        assert (dest / 'foo').is_symlink() == replaced
+        assert (dest / 'bar').samefile(tmpdir / 'src' / 'bar')
+
+
+def test_ask_once_dry(monkeypatch, capsys):
+    """Dry runs report the conflicts without prompting."""
+    with directory_tree(TREE) as tmpdir:
+        instance = emanate(tmpdir, conflicts='ask-once')
+        monkeypatch.setattr(instance, 'confirm_conflicts', never)
+        instance.create().dry()
+
+        # Conflicting files are listed as they'd be replaced.
+        out = capsys.readouterr().out
+        assert "already exists" not in out
+        assert len(out.splitlines()) == 3
+        assert (tmpdir / 'dest' / 'foo').read_text() == 'conflict'
+
+
+def test_default_policy():
+    with directory_tree(TREE) as tmpdir:
+        assert emanate(tmpdir, conflicts=None).conflicts == 'ask'
+        assert emanate(tmpdir, conflicts=None, confirm=False).conflicts == 'backup'
+        with pytest.raises(ValueError):
+            _ = emanate(tmpdir, conflicts='bogus').conflicts
@@ -0,0 +1,137 @@
+import errno
+import json
+import os
+from pathlib import Path
+
+import pytest
+from utils import directory_tree, emanate
+
+from emanate import fs as fs_module
+from emanate.fs import MemoryFileSystem, OSFileSystem
+from emanate.manifest import Manifest
+
+DATA = os.path.join('sub', 'data.conf')
+TREE = {
+    'src': {'app.conf': 'conf', 'script': 'script', 'sub': {'data.conf': 'data'}},
+    'dest': {},
+}
+
+
+def kinds(emanate_obj):
+    return [(action.kind, str(action.dest.relative_to(emanate_obj.dest)))
+            for action in emanate_obj.plan()]
+
+
+@pytest.mark.parametrize('reflink', [False, True])
+@pytest.mark.parametrize('fd_metadata', [False, True])
+def test_copy_file(monkeypatch, reflink, fd_metadata):
+    # Without descriptors, metadata is set through the path (as on Windows).
+    monkeypatch.setattr(fs_module, '_FD_METADATA', fs_module._FD_METADATA and fd_metadata)
+    with directory_tree({'big': 'x' * 3_000_001, 'other': ''}) as tmpdir:
+        fs = OSFileSystem()
+        os.chmod(tmpdir / 'big', 0o751)
+        os.utime(tmpdir / 'big', ns=(1, 123_456_789))
+        fs.copy(tmpdir / 'big', tmpdir / 'copy', reflink)
+
+        stat = os.stat(tmpdir / 'copy')
+        assert (tmpdir / 'copy').read_text() == 'x' * 3_000_001
+        # Only the read-only flag can be set on Windows.
+        assert stat.st_mode & 0o7777 == os.stat(tmpdir / 'big').st_mode & 0o7777
+        assert stat.st_mtime_ns == 123_456_789
+        with pytest.raises(FileExistsError):
+            fs.copy(tmpdir / 'big', tmpdir / 'other')
+
+
+def test_copy_fallback(monkeypatch):
+    """Files are still copied where `copy_file_range` isn't supported."""
+    def unsupported(*_):
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    monkeypatch.setattr(os, 'copy_file_range', unsupported, raising=False)
+    with directory_tree({'file': 'contents'}) as tmpdir:
+        OSFileSystem().copy(tmpdir / 'file', tmpdir / 'copy')
+        assert (tmpdir / 'copy').read_text() == 'contents'
+
+
+def test_create_and_clean():
+    with directory_tree(TREE) as tmpdir:
+        emanate(tmpdir, mode='copy').create().run()
+        dest = tmpdir / 'dest'
+        for rel in ('app.conf', 'script', DATA):
+            assert not (dest / rel).is_symlink()
+            assert (dest / rel).read_text() == (tmpdir / 'src' / rel).read_text()
+        # Unchanged files are skipped.
+        assert {kind for kind, _ in kinds(emanate(tmpdir, mode='copy'))} == {'skip'}
+
+        # Modified sources are copied again, without a backup.
+        (tmpdir / 'src' / 'script').write_text('new script')
+        os.utime(tmpdir / 'src' / 'script', ns=(0, 10**18))
+        emanate(tmpdir, mode='copy').create().run()
+        assert (dest / 'script').read_text() == 'new script'
+        assert not (dest / 'script.emanate').exists()
+
+        # Copies modified in the destination are left by `clean`.
+        (dest / 'app.conf').write_text('edited')
+        emanate(tmpdir, mode='copy').clean().run()
+        assert sorted(p.name for p in dest.rglob('*')) == ['.emanate-manifest', 'app.conf', 'sub']
+        assert (dest / 'app.conf').read_text() == 'edited'
+
+
+def test_patterns():
+    """Files matching the `copy` patterns are copied, and the others linked."""
+    with directory_tree(TREE) as tmpdir:
+        emanate(tmpdir, copy=['src/*.conf']).create().run()
+        dest = tmpdir / 'dest'
+        assert dest.joinpath('script').is_symlink()
+        assert not dest.joinpath('app.conf').is_symlink()
+        assert not dest.joinpath('sub', 'data.conf').is_symlink()
+
+        manifest = Manifest.load(tmpdir / 'src', dest)
+        assert manifest.links == {'script'}
+        assert sorted(manifest.copies) == ['app.conf', DATA]
+        assert list(manifest) == ['app.conf', 'script', DATA]
+
+        # Switching to copies replaces the links we created, without backups.
+        assert kinds(emanate(tmpdir, mode='reflink'))[-2:] == \
+            [('overwrite', 'script'), ('skip', DATA)]
+        emanate(tmpdir, mode='reflink').create().run()
+        assert not dest.joinpath('script').is_symlink()
+        assert sorted(Manifest.load(tmpdir / 'src', dest).copies) == \
+            ['app.conf', 'script', DATA]
+
+
+def test_status():
+    with directory_tree({'src': {'a': 'a', 'b': 'b', 'c': 'c'},
+                         'dest': {'c': 'other'}}) as tmpdir:
+        instance = emanate(tmpdir, mode='copy', conflicts='skip')
+        instance.create().run()
+        (tmpdir / 'src' / 'b').write_text('changed')
+        os.utime(tmpdir / 'src' / 'b', ns=(0, 10**18))
+        states = {str(pair.dest.name): state for state, pair in instance.status()}
+        assert states == {'a': 'copied', 'b': 'outdated', 'c': 'conflicting'}
+
+
+def test_manifest():
+    """Links and copies are recorded separately, for each source."""
+    with directory_tree({'src': {'foo': '', 'bar.conf': 'bar'}, 'dest': {}}) as tmpdir:
+        emanate(tmpdir, copy=['src/*.conf']).create().run()
+        data = json.loads((tmpdir / 'dest' / '.emanate-manifest').read_text())
+        assert data['version'] == 1
+        entry = data['sources'][str(tmpdir / 'src')]
+        assert entry['links'] == ['foo'] and list(entry['copies']) == ['bar.conf']
+
+        manifest = Manifest.load(tmpdir / 'src', tmpdir / 'dest')
+        assert manifest.links == {'foo'} and set(manifest.copies) == {'bar.conf'}
+
+
+def test_memory():
+    fs = MemoryFileSystem()
+    fs.populate('/tree', TREE)
+    root = Path('/tree')
+    emanate(root, fs=fs, mode='copy', atomic=True).create().run()
+    assert fs.tree('/tree/dest/sub') == {'data.conf': 'data'}
+    assert fs.stat('/tree/dest/app.conf').st_mtime_ns == \
+        fs.stat('/tree/src/app.conf').st_mtime_ns
+
+    emanate(root, fs=fs, mode='copy').clean().run()
+    assert fs.tree('/tree/dest') == {'sub': {}}
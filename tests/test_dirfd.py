@@ -0,0 +1,82 @@
+import os
+
+import pytest
+from utils import directory_tree, emanate
+
+from emanate.dirfd import SUPPORTED, DirFDs, Paths, applier
+
+needs_dirfd = pytest.mark.skipif(not SUPPORTED, reason="dir_fd isn't supported")
+
+
+@pytest.mark.parametrize('cls', [Paths, pytest.param(DirFDs, marks=needs_dirfd)])
+def test_operations(cls):
+    with directory_tree({'src': {'file': '', 'dir': {'a': ''}}, 'dest': {'file': ''}}) as tmpdir:
+        src, dest = tmpdir / 'src', tmpdir / 'dest'
+        paths = cls()
+        paths.mkdir(dest / 'sub')
+        paths.mkdir(dest / 'sub')
+        paths.symlink(src / 'file', dest / 'sub' / 'file')
+        assert (dest / 'sub' / 'file').samefile(src / 'file')
+
+        paths.rename(dest / 'file', 'file.emanate')
+        assert sorted(os.listdir(dest)) == ['file.emanate', 'sub']
+
+        paths.symlink(src / 'dir', dest / 'dir')
+        paths.unfold(src / 'dir', dest / 'dir')
+        assert not (dest / 'dir').is_symlink()
+        assert (dest / 'dir' / 'a').samefile(src / 'dir' / 'a')
+
+        (dest / 'plain').write_text('plain')
+        paths.replace(src / 'file', dest / 'plain', 'plain.emanate')
+        assert (dest / 'plain').samefile(src / 'file')
+        assert (dest / 'plain.emanate').read_text() == 'plain'
+        paths.replace(src / 'dir', dest / 'dir')
+        assert (dest / 'dir').samefile(src / 'dir')
+        assert (dest / 'dir.emanate' / 'a').is_symlink()
+        for name in ('plain', 'plain.emanate', 'dir'):
+            paths.unlink(dest / name)
+        paths.rename(dest / 'dir.emanate', 'dir')
+
+        paths.unlink(dest / 'sub' / 'file')
+        assert not os.listdir(dest / 'sub')
+        with pytest.raises(FileExistsError):
+            paths.mkdir(dest / 'file.emanate')
+        paths.close()
+
+
+@needs_dirfd
+def test_create_clean():
+    """create() and clean() go through directory descriptors."""
+    with directory_tree({'src': {'foo': '', 'dir': {'bar': ''}}, 'dest': {'foo': ''}}) as tmpdir:
+        assert isinstance(applier(), DirFDs)
+        instance = emanate(tmpdir, confirm=False)
+
+        instance.create().run()
+        dest = tmpdir / 'dest'
+        assert (dest / 'foo').samefile(tmpdir / 'src' / 'foo')
+        assert (dest / 'foo.emanate').is_file()
+        assert (dest / 'dir' / 'bar').samefile(tmpdir / 'src' / 'dir' / 'bar')
+
+        instance.clean().run()
+        assert not (dest / 'foo').exists()
+        assert not (dest / 'dir' / 'bar').exists()
+
+
+@needs_dirfd
+def test_many_directories():
+    """Descriptors are closed as they go, with more directories than allowed open files."""
+    resource = pytest.importorskip('resource')
+    count = 300
+    tree = {f'd{i:03}': {'file': ''} for i in range(count)}
+    with directory_tree({'src': tree, 'dest': {}}) as tmpdir:
+        instance = emanate(tmpdir, confirm=False)
+
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (count // 2, hard))
+        try:
+            instance.create().run()
+            assert all((tmpdir / 'dest' / name / 'file').is_symlink() for name in tree)
+            instance.clean().run()
+            assert not any((tmpdir / 'dest' / name / 'file').exists() for name in tree)
+        finally:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
@@ -0,0 +1,64 @@
+from utils import directory_tree, emanate
+
+from emanate import cli
+
+
+def test_parallel_run_order(capsys):
+    """Running with several jobs prints changes in the serial order."""
+    tree = {
+        'src': {
+            f'dir{i}': {f'file{j}': '' for j in range(10)} for i in range(5)
+        },
+        'dest': {},
+    }
+    tree['src'].update({f'file{j}': '' for j in range(10)})
+
+    with directory_tree(tree) as tmpdir:
+        instance = emanate(tmpdir, jobs=4)
+
+        instance.create().dry()
+        expected = capsys.readouterr().out
+        instance.create().run()
+        assert capsys.readouterr().out == expected
+        assert len(expected.splitlines()) == 60
+
+        for i in range(5):
+            for j in range(10):
+                link = tmpdir / 'dest' / f'dir{i}' / f'file{j}'
+                assert link.samefile(tmpdir / 'src' / f'dir{i}' / f'file{j}')
+
+
+def test_fan_out(capsys):
+    """Linking into several destinations, walking the source once."""
+    with directory_tree({
+            'src': {'foo': '', 'bar': {'baz': ''}},
+            'a': {}, 'b': {},
+    }) as tmpdir:
+        instance = emanate(tmpdir, jobs=2)
+
+        instance.fan_out([tmpdir / 'a', tmpdir / 'b']).run()
+        out = capsys.readouterr().out.splitlines()
+        assert len(out) == 4
+        assert out[0].endswith(f"{str(tmpdir / 'a' / 'foo')!r}")
+        assert out[2].endswith(f"{str(tmpdir / 'b' / 'foo')!r}")
+        for dest in ('a', 'b'):
+            assert (tmpdir / dest / 'bar' / 'baz').samefile(tmpdir / 'src' / 'bar' / 'baz')
+
+        instance.fan_out([tmpdir / 'a', tmpdir / 'b'], clean=True).run()
+        for dest in ('a', 'b'):
+            assert not (tmpdir / dest / 'foo').exists()
+
+
+def test_fan_out_cli(capsys):
+    """Destinations are given one per --fan-out, and linked in that order."""
+    with directory_tree({'src': {'foo': ''}, 'a': {}, 'b': {}}) as tmpdir:
+        args = ['--source', str(tmpdir / 'src'), '--no-confirm',
+                '--fan-out', str(tmpdir / 'b'), '--fan-out', str(tmpdir / 'a')]
+        cli.main(args + ['create'])
+        out = capsys.readouterr().out.splitlines()
+        assert out[0].endswith(f"{str(tmpdir / 'b' / 'foo')!r}")
+        assert out[1].endswith(f"{str(tmpdir / 'a' / 'foo')!r}")
+
+        cli.main(args + ['clean'])
+        for dest in ('a', 'b'):
+            assert not (tmpdir / dest / 'foo').exists()
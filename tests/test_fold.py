@@ -0,0 +1,99 @@
+import pytest
+from utils import directory_tree, emanate
+
+from emanate import packages
+from emanate.plan import Link, Unfold
+
+
+def test_fold():
+    """Directories missing from the destination are linked as a whole."""
+    with directory_tree({
+            'src': {'.vim': {'vimrc': '', 'ftplugin': {'py.vim': ''}}, 'foo': ''},
+            'dest': {},
+    }) as tmpdir:
+        dest = tmpdir / 'dest'
+        emanate(tmpdir, fold=True).create().run()
+        assert (dest / '.vim').is_symlink()
+        assert (dest / '.vim').samefile(tmpdir / 'src' / '.vim')
+        assert (dest / 'foo').samefile(tmpdir / 'src' / 'foo')
+
+        # Already folded: nothing left to do.
+        assert not [a for a in emanate(tmpdir, fold=True).plan() if a.kind != 'skip']
+
+        emanate(tmpdir, fold=True).clean().run()
+        assert not list(dest.iterdir())
+        assert (tmpdir / 'src' / '.vim' / 'ftplugin' / 'py.vim').exists()
+
+
+def test_unfold():
+    """A folded directory is unfolded when another source adds to it."""
+    with directory_tree({
+            'foo': {'.config': {'foo': {'rc': ''}}},
+            'bar': {'.config': {'bar': {'rc': ''}}},
+            'dest': {},
+    }) as tmpdir:
+        dest = tmpdir / 'dest'
+        emanate(tmpdir, 'foo', fold=True).create().run()
+        assert (dest / '.config').is_symlink()
+
+        plan = list(emanate(tmpdir, 'bar', fold=True).plan())
+        assert Unfold(tmpdir / 'foo' / '.config', dest / '.config') in plan
+        assert Link(tmpdir / 'bar' / '.config' / 'bar', dest / '.config' / 'bar') in plan
+
+        emanate(tmpdir, 'bar', fold=True).create().run()
+        assert not (dest / '.config').is_symlink()
+        assert (dest / '.config' / 'foo').samefile(tmpdir / 'foo' / '.config' / 'foo')
+        assert (dest / '.config' / 'bar').samefile(tmpdir / 'bar' / '.config' / 'bar')
+
+        # Each source only removes its own links, even after unfolding.
+        emanate(tmpdir, 'foo', fold=True).clean().run()
+        assert sorted(p.name for p in (dest / '.config').iterdir()) == ['bar']
+        emanate(tmpdir, 'bar', fold=True).clean().run()
+        assert not list((dest / '.config').iterdir())
+        assert (tmpdir / 'foo' / '.config' / 'foo' / 'rc').exists()
+        assert (tmpdir / 'bar' / '.config' / 'bar' / 'rc').exists()
+
+
+def test_clean_without_manifest():
+    """Cleaning by walking the source removes folded links, not their contents."""
+    with directory_tree({
+            'src': {'dir': {'file': ''}},
+            'dest': {},
+    }) as tmpdir:
+        emanate(tmpdir, fold=True).create().run()
+        (tmpdir / 'dest' / '.emanate-manifest').unlink()
+
+        emanate(tmpdir, fold=True).clean().run()
+        assert not (tmpdir / 'dest' / 'dir').exists()
+        assert (tmpdir / 'src' / 'dir' / 'file').exists()
+
+
+def test_packages_no_fold():
+    """Directories shared by several packages aren't folded."""
+    with directory_tree({
+            'foo': {'bin': {'foo': ''}, 'share': {'foo': {'doc': ''}}},
+            'bar': {'bin': {'bar': ''}},
+            'dest': {},
+    }) as tmpdir:
+        dest = tmpdir / 'dest'
+        packages.create([emanate(tmpdir, 'foo', fold=True), emanate(tmpdir, 'bar', fold=True)]).run()
+        assert not (dest / 'bin').is_symlink()
+        assert (dest / 'bin' / 'foo').samefile(tmpdir / 'foo' / 'bin' / 'foo')
+        assert (dest / 'bin' / 'bar').samefile(tmpdir / 'bar' / 'bin' / 'bar')
+        assert (dest / 'share').is_symlink()
+
+
+@pytest.mark.parametrize('fold', [False, True])
+def test_foreign_link(fold):
+    """Links to directories emanate didn't fold are used as they are."""
+    with directory_tree({
+            'src': {'.config': {'app': ''}},
+            'elsewhere': {'cfg': {}},
+            'dest': {'.config': {'type': 'link', 'target': '../elsewhere/cfg'}},
+    }) as tmpdir:
+        dest = tmpdir / 'dest'
+        assert not [a for a in emanate(tmpdir, fold=fold).plan()
+                    if isinstance(a, Unfold)]
+        emanate(tmpdir, fold=fold).create().run()
+        assert (dest / '.config').is_symlink()
+        assert (tmpdir / 'elsewhere' / 'cfg' / 'app').samefile(tmpdir / 'src' / '.config' / 'app')
@@ -0,0 +1,130 @@
+import errno
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+import pytest
+from utils import directory_tree, emanate
+
+from emanate.dirfd import Paths, applier
+from emanate.fs import MemoryFileSystem, OSFileSystem
+
+TREE = {
+    'src': {'foo': 'foo', 'bar': {'baz': ''}, 'qux': '', 'link': {'type': 'link', 'target': 'bar'}},
+    'dest': {'qux': 'conflict', 'bar': {'other': ''}},
+}
+
+
+@contextmanager
+def os_tree(tree):
+    with directory_tree(tree) as tmpdir:
+        yield OSFileSystem(), tmpdir
+
+
+@contextmanager
+def memory_tree(tree):
+    fs = MemoryFileSystem()
+    fs.populate('/tree', tree)
+    yield fs, Path('/tree')
+
+
+def read_tree(path: Path):
+    """Describe a directory on disk, like `MemoryFileSystem.tree`."""
+    if path.is_symlink():
+        return {'type': 'link', 'target': os.readlink(path)}
+    if not path.is_dir():
+        return path.read_text()
+    return {child.name: read_tree(child) for child in sorted(path.iterdir())}
+
+
+@pytest.mark.parametrize('backend', [os_tree, memory_tree])
+def test_operations(backend):
+    with backend(TREE) as (fs, root):
+        src, dest = root / 'src', root / 'dest'
+        assert fs.readlink(src / 'link') == 'bar'
+        assert fs.is_dir(src / 'link') and fs.islink(src / 'link')
+        assert os.path.samestat(fs.stat(src / 'link' / 'baz'), fs.stat(src / 'bar' / 'baz'))
+        assert [(e.relpath, e.is_dir, e.is_link) for e in fs.scandir(str(src), lambda *_: False)] \
+            == [('bar', True, False), ('foo', False, False), ('link', True, True),
+                ('qux', False, False)]
+        assert sorted(fs.listdir(dest)) == ['bar', 'qux']
+
+        fs.symlink(src / 'foo', dest / 'foo')
+        fs.link(dest / 'qux', dest / 'qux.emanate')
+        fs.rename(dest / 'foo', dest / 'qux')
+        assert fs.readlink(dest / 'qux') == str(src / 'foo')
+        with fs.open(dest / 'qux.emanate') as file:
+            assert file.read() == 'conflict'
+        with fs.open(dest / 'new', 'w') as file:
+            file.write('new')
+        assert fs.stat(dest / 'new').st_size == 3
+
+        # Looking paths up again after a directory moved finds the new tree.
+        fs.mkdir(dest / 'dir')
+        fs.symlink(src / 'foo', dest / 'dir' / 'foo')
+        assert fs.islink(dest / 'dir' / 'foo')
+        fs.rename(dest / 'dir', dest / 'moved')
+        assert not fs.lexists(dest / 'dir' / 'foo')
+        assert fs.islink(dest / 'moved' / 'foo')
+
+        for func, args, code in [
+                (fs.stat, (dest / 'missing',), errno.ENOENT),
+                (fs.lstat, (dest / 'new' / 'sub',), errno.ENOTDIR),
+                (fs.mkdir, (dest / 'bar',), errno.EEXIST),
+                (fs.symlink, (src, dest / 'new'), errno.EEXIST),
+                (fs.unlink, (dest / 'bar',), errno.EISDIR),
+                (fs.rmdir, (dest / 'bar',), errno.ENOTEMPTY),
+                (fs.rename, (dest / 'new', dest / 'bar'), errno.EISDIR),
+                (fs.readlink, (dest / 'new',), errno.EINVAL),
+        ]:
+            with pytest.raises(OSError) as error:
+                func(*args)
+            assert error.value.errno == code
+
+        fs.unlink(dest / 'bar' / 'other')
+        fs.rmdir(dest / 'bar')
+        assert not fs.lexists(dest / 'bar')
+        assert not fs.exists(src / 'missing') and fs.exists(src)
+
+
+def test_applier():
+    fs = MemoryFileSystem()
+    paths = applier(fs)
+    assert type(paths) is Paths and paths.fs is fs  # pylint: disable=unidiomatic-typecheck
+    fs.populate('/src', {'dir': {'a': '', 'b': ''}})
+    fs.makedirs('/dest')
+    paths.mkdir(Path('/dest/sub'))
+    paths.mkdir(Path('/dest/sub'))
+    paths.symlink(Path('/src/dir'), Path('/dest/dir'))
+    paths.unfold(Path('/src/dir'), Path('/dest/dir'))
+    paths.replace(Path('/src/dir'), Path('/dest/sub'))
+    assert fs.tree('/dest') == {
+        'dir': {'a': {'type': 'link', 'target': '/src/dir/a'},
+                'b': {'type': 'link', 'target': '/src/dir/b'}},
+        'sub': {'type': 'link', 'target': '/src/dir'},
+        'sub.emanate': {},
+    }
+
+
+@pytest.mark.parametrize('options', [{}, {'fold': True}, {'atomic': True, 'jobs': 4},
+                                     {'incremental': True}, {'conflicts': 'skip'}])
+def test_simulate(options):
+    """Runs on a MemoryFileSystem give exactly the same result as on disk."""
+    with directory_tree(TREE) as tmpdir:
+        memory = MemoryFileSystem()
+        memory.populate(tmpdir, TREE)
+
+        results = []
+        for fs, describe in ((OSFileSystem(), read_tree), (memory, memory.tree)):
+            instance = emanate(tmpdir, fs=fs, confirm=False, **options)
+            instance.create().run()
+            states = list(instance.status())
+            created = describe(tmpdir / 'dest')
+            # Snapshots record inode numbers and timestamps.
+            created.pop('.emanate-snapshot', None)
+            instance.clean().run()
+            results.append((states, created, describe(tmpdir / 'dest')))
+
+    on_disk, in_memory = results
+    assert in_memory == on_disk
+    assert in_memory[1]['foo'] == {'type': 'link', 'target': str(tmpdir / 'src' / 'foo')}
@@ -0,0 +1,122 @@
+from pathlib import Path
+
+import pytest
+from utils import directory_tree, emanate
+
+from emanate import cli
+from emanate.fs import MemoryFileSystem
+from emanate.gitignore import IgnoreFiles, Rule
+
+RULES = (
+    "# comment", "*.o", "!keep.o", "/build", "docs/*.md", "!docs/README.md", "logs/",
+    "**/cache", "a/**/z", "tmp*/", "foo\\ ", "\\#hash", "[abc].txt", "[!x]y.txt",
+    "deep/**", "*.sw[op]",
+)
+GITIGNORE = "\n".join(RULES)
+
+
+@pytest.mark.parametrize('rel, is_dir, ignored', [
+    ('x.o', False, True), ('keep.o', False, False), ('sub/x.o', False, False),
+    ('sub/keep.o', False, False), ('sub/local', False, True), ('local', False, False),
+    ('build', False, True), ('sub/build', False, False),
+    ('docs/a.md', False, True), ('docs/README.md', False, False),
+    ('docs/sub/a.md', False, False),
+    ('logs', True, True), ('logs', False, False), ('sub/logs', True, True),
+    ('cache', False, True), ('q/r/cache', True, True),
+    ('a/z', False, True), ('a/b/c/z', False, True), ('b/a/z', False, False),
+    ('tmp1', True, True), ('tmp1', False, False),
+    ('foo ', False, True), ('foo', False, False), ('#hash', False, True),
+    ('a.txt', False, True), ('d.txt', False, False),
+    ('ay.txt', False, True), ('xy.txt', False, False),
+    ('deep/x', False, True), ('deep', True, False),
+    ('v.swp', False, True), ('v.swx', False, False),
+    ('.gitignore', False, True), ('sub/.gitignore', False, True),
+])
+def test_syntax(rel, is_dir, ignored):
+    """Rules are matched the same way as `git check-ignore` does."""
+    with directory_tree({'.gitignore': GITIGNORE,
+                         'sub': {'.gitignore': 'local\n!*.o\n'}}) as tmpdir:
+        matcher = IgnoreFiles(str(tmpdir), ['.gitignore'], lambda *_: False)
+        assert matcher(str(tmpdir / rel), is_dir) == ignored
+
+
+def test_whitelist():
+    """Everything can be ignored, except for a few files."""
+    with directory_tree({'.gitignore': '*\n!keep\n'}) as tmpdir:
+        matcher = IgnoreFiles(str(tmpdir), ['.gitignore'], lambda *_: False)
+        assert not matcher(str(tmpdir / 'keep'), False)
+        assert matcher(str(tmpdir / 'drop'), False)
+        assert matcher(str(tmpdir / 'sub'), True)
+        assert matcher(str(tmpdir / 'sub' / 'x'), False)
+
+
+def test_parse():
+    assert Rule.parse('\n') is None
+    assert Rule.parse('# comment\n') is None
+    assert Rule.parse('!/build/\n') == Rule('build', True, True, True)
+    assert Rule.parse('name  \n') == Rule('name', False, False, False)
+
+
+def test_create():
+    with directory_tree({
+            'src': {
+                '.gitignore': '*.log\n/secret\n',
+                'app.log': '', 'secret': '', 'keep': '',
+                'sub': {'.gitignore': '!debug.log\n', 'debug.log': '', 'x.log': '',
+                        'secret': ''},
+            },
+            'dest': {},
+    }) as tmpdir:
+        emanate(tmpdir, ignore_files=['.gitignore']).create().run()
+
+        linked = sorted(str(p.relative_to(tmpdir / 'dest'))
+                        for p in (tmpdir / 'dest').rglob('*') if p.is_symlink())
+        assert linked == ['keep', 'sub/debug.log', 'sub/secret']
+
+
+def test_cli():
+    """Ignore files are given one per --ignore-files."""
+    with directory_tree({
+            'src': {'.gitignore': 'a\n', '.ignore': 'b\n', 'a': '', 'b': '', 'c': ''},
+            'dest': {},
+    }) as tmpdir:
+        cli.main(['--source', str(tmpdir / 'src'), '--destination', str(tmpdir / 'dest'),
+                  '--ignore-files', '.gitignore', '--ignore-files', '.ignore',
+                  '--no-confirm', 'create'])
+        assert sorted(p.name for p in (tmpdir / 'dest').iterdir()) == ['.emanate-manifest', 'c']
+
+
+def test_cache():
+    """Compiled files are reused until they are modified."""
+    fs = MemoryFileSystem()
+    fs.populate('/src', {'.ignore': 'a\n', 'a': '', 'b': ''})
+    matcher = IgnoreFiles('/src', ['.ignore'], lambda *_: False, fs)
+    assert matcher('/src/a') and not matcher('/src/b')
+    runs = matcher.rules('/src').runs
+
+    other = IgnoreFiles('/src', ['.ignore'], lambda *_: False, fs)
+    assert other.rules('/src').runs == runs
+    stamp = other.stamp('/src')
+
+    with fs.open('/src/.ignore', 'w') as file:
+        file.write('b\n')
+    # Still cached, until refreshed.
+    assert matcher('/src/a')
+    matcher.refresh()
+    assert not matcher('/src/a') and matcher('/src/b')
+    assert matcher.stamp('/src') != stamp
+
+
+def test_incremental():
+    """Editing an ignore file invalidates the snapshot of the directories below it."""
+    fs = MemoryFileSystem()
+    fs.populate('/tree', {'src': {'.gitignore': '*.conf\n', 'sub': {'a.conf': '', 'b': ''}},
+                          'dest': {}})
+    options = {'fs': fs, 'ignore_files': ['.gitignore'], 'incremental': True}
+    emanate(Path('/tree'), **options).create().run()
+    assert sorted(fs.tree('/tree/dest/sub')) == ['b']
+
+    with fs.open('/tree/src/.gitignore', 'w') as file:
+        file.write('b\n')
+    emanate(Path('/tree'), **options).create().run()
+    assert sorted(fs.tree('/tree/dest/sub')) == ['a.conf', 'b']
@@ -0,0 +1,43 @@
+import os
+from fnmatch import fnmatch
+
+from utils import directory_tree, emanate
+
+from emanate.config import Config
+from emanate.ignore import IgnoreMatcher
+
+
+def test_matches_fnmatch():
+    """IgnoreMatcher agrees with matching each pattern using fnmatch."""
+    with directory_tree({'vendor': {'lib': {'x.c': ''}}, 'foo': ''}) as src:
+        ignore = Config({'ignore': [
+            '*~', '.*.sw?', 'emanate.json', '*/emanate.json', 'vendor/',
+            'build/*', 'docs/[ab].md',
+        ]}).resolve(src).ignore
+        matcher = IgnoreMatcher(ignore)
+
+        def expected(path):
+            patterns = [str(p) for p in ignore]
+            patterns.append(str(src / 'vendor' / '*'))
+            return any(fnmatch(path, p) for p in patterns)
+
+        for rel in ('foo', 'foo~', 'a/b/c~', '.x.swp', 'x.swp',
+                    'emanate.json', 'sub/emanate.json', 'vendor',
+                    'vendor/lib/x.c', 'vendored', 'build', 'build/out',
+                    'docs/a.md', 'docs/c.md'):
+            path = str(src / rel)
+            assert matcher(path) == expected(path), rel
+
+
+
+def test_valid_file():
+    with directory_tree({'src': {'foo': '', 'foo~': '', 'dir': {}, 'build': {},
+                                 '.gitignore': 'build/\n'},
+                         'dest': {}}) as tmpdir:
+        instance = emanate(tmpdir, ignore_files=['.gitignore'])
+        assert instance.valid_file(tmpdir / 'src' / 'foo')
+        assert not instance.valid_file(tmpdir / 'src' / 'foo~')
+        # Directories are created in the destination, unless ignored.
+        assert not instance.valid_file(tmpdir / 'src' / 'dir')
+        assert not instance.valid_file(tmpdir / 'src' / 'build')
+        assert sorted(os.listdir(tmpdir / 'dest')) == ['dir']
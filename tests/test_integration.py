@@ -2,6 +2,8 @@ import json
 import tempfile
 from pathlib import Path
 
+import pytest
+
 from utils import chdir, directory_tree, home
 from emanate import cli
 
@@ -126,3 +128,51 @@ def test_clean():
             assert (tmpdir / 'src' / filename).exists()
 
         assert (tmpdir / 'src' / 'emanate.json').exists()
+
+
+def test_clean_manifest():
+    """Test cleaning links recorded by `create`, after their source was removed."""
+    for tmpdir in helper(
+            tree={
+                'src': {
+                    'foo': '',
+                    'bar': {'baz': ''},
+                    'emanate.json': json.dumps({
+                        'destination': str(Path('..') / 'dest'),
+                    }),
+                },
+                'dest': {},
+            }):
+        src, dest = tmpdir / 'src', tmpdir / 'dest'
+        assert (dest / 'foo').samefile(src / 'foo')
+        assert (dest / '.emanate-manifest').exists()
+
+        (src / 'bar' / 'baz').unlink()
+        main('--source', src, 'clean')
+        assert not (dest / 'foo').exists()
+        assert not (dest / 'bar' / 'baz').is_symlink()
+        assert not (dest / '.emanate-manifest').exists()
+        assert (src / 'foo').exists()
+
+
+def test_status(capsys):
+    """Test reporting the state of recorded links."""
+    for tmpdir in helper(
+            tree={
+                'src': {
+                    'foo': '',
+                    'bar': '',
+                    'emanate.json': json.dumps({
+                        'destination': str(Path('..') / 'dest'),
+                    }),
+                },
+                'dest': {},
+            }):
+        (tmpdir / 'dest' / 'bar').unlink()
+        capsys.readouterr()
+        with pytest.raises(SystemExit) as error:
+            main('--source', tmpdir / 'src', 'status')
+        assert error.value.code == 1
+        out = capsys.readouterr().out.splitlines()
+        assert [line.split(':')[0] for line in out[-2:]] == ['missing', 'linked']
+        assert out[-2].endswith("bar'") and out[-1].endswith("foo'")
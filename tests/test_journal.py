@@ -0,0 +1,108 @@
+import dataclasses
+
+import pytest
+from utils import directory_tree, emanate
+
+from emanate.journal import Journal
+from emanate.manifest import Manifest
+
+TREE = {
+    'src': {'foo': '', 'bar': {'baz': ''}, 'qux': ''},
+    'dest': {'qux': 'conflict'},
+}
+
+
+def interrupt(execution, count):
+    """Apply the first `count` actions of an execution, as a crashed run would."""
+    for journal in execution.journals:
+        journal.enabled = True
+    ops = iter(execution.ops)
+    for _ in range(count):
+        execution.func(next(ops))
+
+
+def test_atomic_create():
+    with directory_tree(TREE) as tmpdir:
+        dest = tmpdir / 'dest'
+        (dest / 'qux.emanate').write_text('older backup')
+        instance = emanate(tmpdir, atomic=True, confirm=False)
+        instance.create().run()
+
+        assert (dest / 'qux').samefile(tmpdir / 'src' / 'qux')
+        assert (dest / 'qux.emanate').read_text() == 'conflict'
+        assert (dest / 'bar' / 'baz').samefile(tmpdir / 'src' / 'bar' / 'baz')
+        assert sorted(p.name for p in dest.iterdir()) == \
+            ['.emanate-manifest', 'bar', 'foo', 'qux', 'qux.emanate']
+
+        # Dry runs don't write a journal.
+        instance.clean().dry()
+        assert Journal.load(instance.conf.source, dest) is None
+
+
+def test_resume():
+    with directory_tree(TREE) as tmpdir:
+        dest = tmpdir / 'dest'
+        interrupt(emanate(tmpdir, atomic=True, confirm=False).create(), 2)
+        journal = Journal.load(tmpdir / 'src', dest)
+        assert journal.operation == 'create'
+        assert [a.kind for a in journal.actions] == ['mkdir', 'link', 'replace', 'link']
+        assert not (dest / 'qux').is_symlink()
+
+        emanate(tmpdir, atomic=True, confirm=False).resume().run()
+        assert (dest / 'foo').samefile(tmpdir / 'src' / 'foo')
+        assert (dest / 'qux').samefile(tmpdir / 'src' / 'qux')
+        assert (dest / 'qux.emanate').read_text() == 'conflict'
+        assert (dest / 'bar' / 'baz').samefile(tmpdir / 'src' / 'bar' / 'baz')
+        assert set(Manifest.load(tmpdir / 'src', dest)) == {'foo', 'qux', 'bar/baz'}
+        assert Journal.load(tmpdir / 'src', dest) is None
+
+
+def test_rollback():
+    with directory_tree(TREE) as tmpdir:
+        dest = tmpdir / 'dest'
+        interrupt(emanate(tmpdir, atomic=True, confirm=False).create(), 3)
+        assert (dest / 'qux').is_symlink()
+
+        emanate(tmpdir, atomic=True, confirm=False).rollback().run()
+        assert sorted(p.name for p in dest.iterdir()) == ['qux']
+        assert (dest / 'qux').read_text() == 'conflict'
+
+        # Interrupted cleans can be rolled back too.
+        emanate(tmpdir, atomic=True, confirm=False).create().run()
+        interrupt(emanate(tmpdir, atomic=True, confirm=False).clean(), 2)
+        emanate(tmpdir, atomic=True, confirm=False).rollback().run()
+        assert (dest / 'foo').samefile(tmpdir / 'src' / 'foo')
+        assert (dest / 'qux').samefile(tmpdir / 'src' / 'qux')
+        assert set(Manifest.load(tmpdir / 'src', dest)) == {'foo', 'qux', 'bar/baz'}
+
+
+def test_truncated():
+    """A line cut short by a crash is ignored."""
+    with directory_tree(TREE) as tmpdir:
+        interrupt(emanate(tmpdir, atomic=True, confirm=False).create(), 1)
+        path = Journal(tmpdir / 'src', tmpdir / 'dest', '').path
+        path.write_text(path.read_text()[:-10])
+        assert len(Journal.load(tmpdir / 'src', tmpdir / 'dest').actions) == 3
+
+
+def test_failure():
+    """Actions applied before a failure are recorded."""
+    with directory_tree(TREE) as tmpdir:
+        execution = emanate(tmpdir, atomic=True, confirm=False).create()
+
+        def apply(action):
+            if action.kind == 'replace':
+                raise PermissionError(action.dest)
+            return execution.func(action)
+
+        with pytest.raises(PermissionError):
+            dataclasses.replace(execution, func=apply).run()
+        dest = tmpdir / 'dest'
+        assert set(Manifest.load(tmpdir / 'src', dest)) == {'foo'}
+        assert (dest / 'qux').read_text() == 'conflict'
+
+        # The journal is kept, so the run can be rolled back.
+        assert Journal.load(tmpdir / 'src', dest).operation == 'create'
+        emanate(tmpdir, atomic=True, confirm=False).rollback().run()
+        assert sorted(p.name for p in dest.iterdir()) == ['qux']
+        assert Journal.load(tmpdir / 'src', dest) is None
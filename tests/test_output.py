@@ -0,0 +1,51 @@
+import io
+import json
+
+from utils import directory_tree, emanate
+
+from emanate.output import JSONLines, NulSeparated
+
+TREE = {
+    'src': {'bar': {'baz': ''}, 'foo': '', 'linked': '', 'qux': ''},
+    'dest': {
+        'linked': {'type': 'link', 'target': '../src/linked'},
+        'qux': 'conflict',
+    },
+}
+
+
+def test_json_lines():
+    with directory_tree(TREE) as tmpdir:
+        src, dest = tmpdir / 'src', tmpdir / 'dest'
+        stream = io.BytesIO()
+        emanate(tmpdir, confirm=False).create().run(JSONLines(stream))
+
+        records = [json.loads(line) for line in stream.getvalue().splitlines()]
+        assert records == [
+            {'action': 'mkdir', 'src': str(src / 'bar'), 'dest': str(dest / 'bar')},
+            {'action': 'link', 'src': str(src / 'foo'), 'dest': str(dest / 'foo')},
+            {'action': 'skip', 'src': str(src / 'linked'), 'dest': str(dest / 'linked')},
+            {'action': 'backup', 'src': str(dest / 'qux'), 'dest': str(dest / 'qux.emanate')},
+            {'action': 'replace', 'src': str(src / 'qux'), 'dest': str(dest / 'qux')},
+            {'action': 'link', 'src': str(src / 'bar' / 'baz'),
+             'dest': str(dest / 'bar' / 'baz')},
+        ]
+
+        stream = io.BytesIO()
+        emanate(tmpdir, confirm=False).clean().run(JSONLines(stream))
+        actions = [json.loads(line)['action'] for line in stream.getvalue().splitlines()]
+        assert sorted(actions) == ['unlink'] * 4
+
+
+def test_nul_separated():
+    with directory_tree(TREE) as tmpdir:
+        stream = io.BytesIO()
+        emanate(tmpdir, confirm=False).create().dry(NulSeparated(stream))
+        fields = stream.getvalue().split(b'\0')
+        assert fields.pop() == b''
+        assert len(fields) % 3 == 0
+        assert fields[::3] == [b'mkdir', b'link', b'skip', b'backup', b'replace', b'link']
+        assert fields[2] == bytes(tmpdir / 'dest' / 'bar')
+
+        # Dry runs don't change anything.
+        assert not (tmpdir / 'dest' / 'foo').exists()
@@ -0,0 +1,74 @@
+import json
+
+import pytest
+from utils import directory_tree, emanate, home
+
+from emanate import cli, packages
+
+
+def test_packages():
+    """Packages sharing directories are linked together."""
+    with directory_tree({
+            'foo': {'bin': {'foo': ''}, 'lib': {'libfoo.so': ''}},
+            'bar': {'bin': {'bar': ''}},
+            'dest': {},
+    }) as tmpdir:
+        pkgs = [emanate(tmpdir, name) for name in ('foo', 'bar')]
+        assert not packages.conflicts(pkgs)
+        packages.create(pkgs).run()
+
+        dest = tmpdir / 'dest'
+        assert (dest / 'bin' / 'foo').samefile(tmpdir / 'foo' / 'bin' / 'foo')
+        assert (dest / 'bin' / 'bar').samefile(tmpdir / 'bar' / 'bin' / 'bar')
+        assert (dest / 'lib' / 'libfoo.so').samefile(tmpdir / 'foo' / 'lib' / 'libfoo.so')
+
+        packages.clean([emanate(tmpdir, name) for name in ('foo', 'bar')]).run()
+        assert not list((dest / 'bin').iterdir())
+
+
+def test_conflicts():
+    """Every conflict is reported before anything is done."""
+    with directory_tree({
+            'foo': {'bin': {'tool': ''}, 'share': ''},
+            'bar': {'bin': {'tool': ''}, 'share': {'doc': ''}},
+            'dest': {},
+    }) as tmpdir:
+        with pytest.raises(packages.ConflictError) as error:
+            packages.create([emanate(tmpdir, name) for name in ('foo', 'bar')])
+
+        assert [c.dest.name for c in error.value.conflicts] == ['tool', 'share']
+        assert not list((tmpdir / 'dest').iterdir())
+
+
+def test_packages_cli():
+    """Packages are given one per --packages, and reported in that order."""
+    with directory_tree({
+            'foo': {'tool': ''},
+            'bar': {'tool': ''},
+            'dest': {},
+    }) as tmpdir:
+        with pytest.raises(SystemExit) as error:
+            cli.main(['--packages', str(tmpdir / 'foo'), '--packages', str(tmpdir / 'bar'),
+                      '--destination', str(tmpdir / 'dest'), '--no-confirm', 'create'])
+
+        sources = [repr(str(tmpdir / name / 'tool')) for name in ('foo', 'bar')]
+        assert str(error.value).endswith(", ".join(sources))
+        assert not list((tmpdir / 'dest').iterdir())
+
+
+def test_packages_config():
+    """Packages use the settings of the configuration listing them."""
+    with directory_tree({
+            'pkgs': {
+                'emanate.json': json.dumps({'packages': ['foo', 'bar'],
+                                            'destination': '../dest'}),
+                'foo': {'foo': ''},
+                'bar': {'bar': '', 'emanate.json': json.dumps({'ignore': ['bar']})},
+            },
+            'dest': {},
+            'home': {},
+    }) as tmpdir, home(tmpdir / 'home'):
+        cli.main(['--source', str(tmpdir / 'pkgs'), '--no-confirm', 'create'])
+        assert (tmpdir / 'dest' / 'foo').samefile(tmpdir / 'pkgs' / 'foo' / 'foo')
+        assert not (tmpdir / 'dest' / 'bar').exists()
+        assert not list((tmpdir / 'home').iterdir())
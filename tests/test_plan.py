@@ -0,0 +1,65 @@
+import os
+
+from utils import directory_tree, emanate
+
+from emanate.plan import FilePair, Link, Mkdir, Plan, Replace, Skip, Unfold, Unlink
+
+
+def test_plan_is_read_only():
+    """Planning and dry-runs never modify the destination."""
+    with directory_tree({
+            'src': {'foo': '', 'bar': {'baz': ''}, 'qux': ''},
+            'dest': {'qux': 'conflict'},
+    }) as tmpdir:
+        src, dest = tmpdir / 'src', tmpdir / 'dest'
+        plan = list(emanate(tmpdir).plan())
+        assert plan == [
+            Mkdir(src / 'bar', dest / 'bar'),
+            Link(src / 'foo', dest / 'foo'),
+            Replace(src / 'qux', dest / 'qux'),
+            Link(src / 'bar' / 'baz', dest / 'bar' / 'baz'),
+        ]
+
+        emanate(tmpdir).create().dry()
+        assert [p.name for p in dest.iterdir()] == ['qux']
+
+        # Plans can be serialized.
+        assert [FilePair.from_dict(a.to_dict()) for a in plan] == plan
+
+
+def test_plan_clean():
+    with directory_tree({
+            'src': {'foo': '', 'bar': ''},
+            'dest': {
+                'foo': {'type': 'link', 'target': '../src/foo'},
+                'bar': 'not a link',
+            },
+    }) as tmpdir:
+        src, dest = tmpdir / 'src', tmpdir / 'dest'
+        assert list(emanate(tmpdir).plan(clean=True)) == [
+            Skip(src / 'bar', dest / 'bar'),
+            Unlink(src / 'foo', dest / 'foo'),
+        ]
+
+
+def test_compact_plan():
+    """Plans can be stored compactly, and rebased onto another destination."""
+    with directory_tree({
+            'src': {'foo': '', 'bar': {'baz': '', 'qux': {'quux': ''}}},
+            'dest': {},
+    }) as tmpdir:
+        src, dest = tmpdir / 'src', tmpdir / 'dest'
+        actions = list(emanate(tmpdir).plan())
+        other = Unfold(tmpdir / 'elsewhere', dest / 'bar')
+        plan = Plan(src, dest, actions + [other])
+
+        assert len(plan) == len(actions) + 1
+        assert list(plan) == actions + [other]
+        assert plan[0] == actions[0]
+        assert plan[-1] == other
+        assert ('link', os.path.join('bar', 'qux', 'quux')) in \
+            [(cls.kind, rel) for cls, rel in plan.relpaths()]
+
+        other_dest = tmpdir / 'other'
+        assert list(Plan(src, dest, actions).actions(other_dest)) == \
+            [type(a)(a.src, other_dest / a.dest.relative_to(dest)) for a in actions]
@@ -0,0 +1,57 @@
+import json
+
+from utils import directory_tree, emanate
+
+from emanate import cli
+
+
+def test_run_stats():
+    with directory_tree({
+            'src': {'foo': '', 'bar': {'baz': ''}, 'foo~': '', '.git': {'a': ''}},
+            'dest': {'foo': {'type': 'link', 'target': '../src/foo'}},
+    }) as tmpdir:
+        instance = emanate(tmpdir, stats=True)
+        execution = instance.create()
+        execution.run()
+
+        assert execution.stats is instance.run_stats
+        stats = execution.stats.as_dict()
+        assert stats['walked'] == 5
+        assert stats['pruned'] == 2
+        assert stats['directories'] == 2
+        assert stats['actions'] == {'mkdir': 1, 'link': 1, 'skip': 1}
+        assert stats['stats'] > 0
+        assert stats['timings']['total'] >= stats['timings']['apply']
+
+
+def test_no_run_stats():
+    with directory_tree({'src': {'foo': ''}, 'dest': {}}) as tmpdir:
+        execution = emanate(tmpdir).create()
+        execution.run()
+        assert execution.stats is None
+
+
+def test_fan_out_stats(capsys):
+    """Stats are reported once for all destinations."""
+    with directory_tree({'src': {'foo': '', 'bar': {'baz': ''}}, 'a': {}, 'b': {}}) as tmpdir:
+        cli.main(['--fan-out', str(tmpdir / 'a'), '--fan-out', str(tmpdir / 'b'),
+                  '--source', str(tmpdir / 'src'), '--stats', '--no-confirm', 'create'])
+        err = capsys.readouterr().err
+        assert "walked: 3 entries (0 pruned) in 2 directories" in err
+        assert "actions: link 4, mkdir 2" in err
+
+
+def test_packages_stats(capsys):
+    with directory_tree({
+            'pkgs': {
+                'emanate.json': json.dumps({'packages': ['foo', 'bar'],
+                                            'destination': '../dest'}),
+                'foo': {'foo': ''},
+                'bar': {'bar': ''},
+            },
+            'dest': {},
+    }) as tmpdir:
+        cli.main(['--source', str(tmpdir / 'pkgs'), '--stats', '--no-confirm', 'create'])
+        err = capsys.readouterr().err
+        assert "walked: 2 entries (0 pruned) in 2 directories" in err
+        assert "actions: link 2" in err
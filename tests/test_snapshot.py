@@ -0,0 +1,35 @@
+import os
+import time
+
+from utils import directory_tree, emanate
+
+
+def test_incremental():
+    """Only directories changed since the last run are listed again."""
+    with directory_tree({
+            'src': {'foo': '', 'bar': {'baz': ''}, 'qux': {'quux': ''}},
+            'dest': {},
+    }) as tmpdir:
+        # Recently-modified directories are never considered unchanged.
+        past = time.time() - 3600
+        for path in ('src', 'src/bar', 'src/qux'):
+            os.utime(tmpdir / path, (past, past))
+
+        emanate(tmpdir, incremental=True).create().run()
+        assert (tmpdir / 'dest' / 'bar' / 'baz').samefile(tmpdir / 'src' / 'bar' / 'baz')
+
+        (tmpdir / 'src' / 'bar' / 'new').write_text('')
+        # Links removed from unchanged directories aren't restored.
+        (tmpdir / 'dest' / 'foo').unlink()
+        execution = emanate(tmpdir, incremental=True).create()
+        ops = [p for p in execution.ops if p.kind != 'skip']
+        assert [p.dest for p in ops] == [tmpdir / 'dest' / 'bar' / 'new']
+
+        (tmpdir / 'src' / 'qux' / 'quux').unlink()
+        emanate(tmpdir, incremental=True).clean().run()
+        assert not (tmpdir / 'dest' / 'bar' / 'baz').exists()
+
+        # Cleaning invalidates the snapshot.
+        emanate(tmpdir, incremental=True).create().run()
+        assert (tmpdir / 'dest' / 'bar' / 'new').samefile(tmpdir / 'src' / 'bar' / 'new')
+        assert (tmpdir / 'dest' / 'foo').samefile(tmpdir / 'src' / 'foo')
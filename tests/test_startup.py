@@ -0,0 +1,31 @@
+import subprocess
+import sys
+
+# Slow-to-import modules which trivial commands mustn't need.
+HEAVY = ('argparse', 'concurrent.futures', 'dataclasses', 'emanate.core', 'json',
+         'pathlib', 'typing')
+
+
+def imported(code):
+    """Run `code` in a fresh interpreter, and return the modules it imported."""
+    result = subprocess.run(
+        [sys.executable, '-c', code + '\nimport sys\nprint(*sys.modules, file=sys.stderr)'],
+        capture_output=True, text=True, check=True)
+    return result.stdout, set(result.stderr.split())
+
+
+def test_version_fast_path():
+    for command in ('--version', 'version'):
+        out, modules = imported(f"from emanate import cli\ncli.main([{command!r}])")
+        assert out.startswith("Emanate v")
+        assert modules.isdisjoint(HEAVY)
+
+
+def test_lazy_core():
+    """`emanate.core` is only imported when its names are used."""
+    _, modules = imported("import emanate")
+    assert 'emanate.core' not in modules
+    _, modules = imported("from emanate import Emanate")
+    assert 'emanate.core' in modules
+    _, modules = imported("from emanate import Config\nassert Config.defaults")
+    assert 'emanate.config' in modules and 'emanate.core' not in modules
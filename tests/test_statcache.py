@@ -0,0 +1,17 @@
+from utils import directory_tree
+
+from emanate.statcache import StatCache
+
+
+def test_cache_and_invalidate():
+    with directory_tree({'foo': '', 'link': {'type': 'link', 'target': 'foo'}}) as tmpdir:
+        stats = StatCache()
+        assert stats.samefile(tmpdir / 'foo', tmpdir / 'link')
+        assert stats.stat(tmpdir / 'missing') is None
+
+        (tmpdir / 'link').unlink()
+        # Still cached, until invalidated.
+        assert stats.exists(tmpdir / 'link')
+        stats.invalidate(tmpdir / 'link')
+        assert not stats.exists(tmpdir / 'link')
+        assert not stats.lexists(tmpdir / 'link')
@@ -0,0 +1,80 @@
+import pytest
+from utils import directory_tree, emanate
+
+from emanate import Emanate, cli
+from emanate.plan import FilePair
+
+TREE = {
+    'src': {
+        'conflicting': '', 'dangling': '', 'elsewhere': '', 'linked': '',
+        'missing': '', 'dir': {'file': ''}, 'other': '',
+    },
+    'dest': {
+        'conflicting': 'not a link',
+        'dangling': {'type': 'link', 'target': '../nowhere'},
+        'elsewhere': {'type': 'link', 'target': '../src/other'},
+        'linked': {'type': 'link', 'target': '../src/linked'},
+        'other': {'type': 'link', 'target': '../src/other'},
+        'dir': {'file': {'type': 'link', 'target': '../../src/dir/file'}},
+    },
+}
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+def test_status(jobs):
+    with directory_tree(TREE) as tmpdir:
+        states = {pair.dest.name: state
+                  for state, pair in emanate(tmpdir, jobs=jobs).status()}
+        assert states == {
+            'conflicting': 'conflicting',
+            'dangling': 'dangling',
+            'elsewhere': 'elsewhere',
+            'linked': 'linked',
+            'missing': 'missing',
+            'other': 'linked',
+            'file': 'linked',
+        }
+        # Nothing was changed.
+        assert not (tmpdir / 'dest' / 'missing').exists()
+        assert not (tmpdir / 'dest' / '.emanate-manifest').exists()
+
+
+def test_status_gone():
+    """Recorded links whose source was removed are reported as dangling."""
+    with directory_tree({'src': {'foo': '', 'bar': ''}, 'dest': {}}) as tmpdir:
+        emanate(tmpdir).create().run()
+        (tmpdir / 'src' / 'foo').unlink()
+        assert [(state, pair.dest.name) for state, pair in emanate(tmpdir).status()] \
+            == [('linked', 'bar'), ('dangling', 'foo')]
+
+
+@pytest.mark.parametrize('jobs', [1, 4])
+def test_status_file_parent(jobs):
+    """Files in place of a destination directory are conflicting, as a whole."""
+    with directory_tree({'src': {'foo': {'bar': '', 'baz': {'qux': ''}}, 'quux': ''},
+                         'dest': {'foo': 'file', 'quux': 'file'}}) as tmpdir:
+        assert [(state, pair.dest.name)
+                for state, pair in emanate(tmpdir, jobs=jobs).status()] \
+            == [('conflicting', 'foo'), ('conflicting', 'quux')]
+
+        pair = FilePair(tmpdir / 'src' / 'foo' / 'bar', tmpdir / 'dest' / 'foo' / 'bar')
+        assert Emanate.check(pair) == 'conflicting'
+
+
+def test_exit_code(capsys):
+    with directory_tree({'src': {'foo': ''}, 'dest': {}}) as tmpdir:
+        args = ['--source', str(tmpdir / 'src'), '--destination', str(tmpdir / 'dest')]
+        with pytest.raises(SystemExit) as error:
+            cli.main(args + ['verify'])
+        assert error.value.code == 1
+
+        cli.main(args + ['create'])
+        capsys.readouterr()
+        cli.main(args + ['status'])
+        assert capsys.readouterr().err.startswith("linked 1, missing 0")
+
+        (tmpdir / 'dest' / 'foo').unlink()
+        (tmpdir / 'dest' / 'foo').write_text('')
+        with pytest.raises(SystemExit) as error:
+            cli.main(args + ['status'])
+        assert error.value.code == 2
@@ -0,0 +1,80 @@
+import os
+
+import pytest
+from utils import directory_tree, emanate
+
+from emanate.ignore import IgnoreMatcher
+from emanate.walk import walk, walk_sharded
+
+
+def test_walk_order():
+    """Directories come before their contents, siblings are sorted."""
+    with directory_tree({
+            'b': '',
+            'a': {'y': '', 'x': {'z': ''}},
+            'c': {'w': ''},
+    }) as tmpdir:
+        entries = list(walk(str(tmpdir), lambda path, is_dir: False))
+        assert [e.relpath for e in entries] == [
+            'a', 'b', 'c',
+            os.path.join('a', 'x'), os.path.join('a', 'y'),
+            os.path.join('a', 'x', 'z'),
+            os.path.join('c', 'w'),
+        ]
+        assert [e.relpath for e in entries if e.is_dir] == [
+            'a', 'c', os.path.join('a', 'x'),
+        ]
+
+
+def test_walk_prunes_ignored_directories():
+    """Ignored directories are never listed."""
+    seen = []
+
+    def ignored(path, is_dir):
+        seen.append(path)
+        return is_dir and os.path.basename(path) == '.git'
+
+    with directory_tree({
+            'foo': '',
+            '.git': {'objects': {'aa': ''}, 'HEAD': ''},
+    }) as tmpdir:
+        entries = list(walk(str(tmpdir), ignored))
+        assert [e.relpath for e in entries] == ['foo']
+        assert seen == [str(tmpdir / '.git'), str(tmpdir / 'foo')]
+
+
+SHARDED_TREE = {
+    'b': '',
+    'a': {'y': '', 'x': {'z': '', '.git': {'HEAD': ''}}},
+    'c': {'w': '', 'v': {'u': ''}},
+    'd': {'type': 'link', 'target': 'c'},
+    'e': {},
+}
+
+
+@pytest.mark.parametrize('processes', [False, True])
+def test_walk_sharded(processes):
+    """Sharded walks yield the same entries, in the same order."""
+    with directory_tree(SHARDED_TREE) as tmpdir:
+        ignored = IgnoreMatcher(['.git/'])
+        expected = list(walk(str(tmpdir), ignored))
+        assert list(walk_sharded(str(tmpdir), ignored, jobs=3,
+                                 processes=processes)) == expected
+
+
+def test_walk_sharded_interrupted():
+    """Workers stop when the walk isn't consumed to the end."""
+    with directory_tree({str(i): {str(j): '' for j in range(50)}
+                         for i in range(20)}) as tmpdir:
+        entries = walk_sharded(str(tmpdir), lambda path, is_dir: False, jobs=2)
+        assert len([entry for _, entry in zip(range(30), entries)]) == 30
+        entries.close()
+
+
+def test_files_sharded():
+    """Emanate plans the same actions with sharded scanning, even when folding."""
+    with directory_tree({'src': SHARDED_TREE, 'dest': {}}) as tmpdir:
+        assert list(emanate(tmpdir, scan_jobs=3).plan()) == list(emanate(tmpdir).plan())
+        # Folded directories are pruned from the walk.
+        assert list(emanate(tmpdir, scan_jobs=3, fold=True).create().ops) == \
+            list(emanate(tmpdir, fold=True).create().ops)
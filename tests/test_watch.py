@@ -0,0 +1,85 @@
+import os
+import sys
+
+import pytest
+from utils import directory_tree, emanate
+
+
+def test_sync():
+    """Changed paths are linked, and links to removed paths are removed."""
+    with directory_tree({
+            'src': {'foo': '', 'bar': {'baz': ''}},
+            'dest': {},
+    }) as tmpdir:
+        src, dest = tmpdir / 'src', tmpdir / 'dest'
+        emanate(tmpdir).create().run()
+
+        (src / 'bar' / 'baz').unlink()
+        (src / 'bar').rmdir()
+        (src / 'new').mkdir()
+        (src / 'new' / 'file').write_text('')
+        (src / 'new' / 'file~').write_text('')
+        emanate(tmpdir).sync([
+            'bar', os.path.join('bar', 'baz'),
+            'new', os.path.join('new', 'file'), os.path.join('new', 'file~'),
+        ]).run()
+
+        assert not os.path.lexists(dest / 'bar' / 'baz')
+        assert (dest / 'new' / 'file').samefile(src / 'new' / 'file')
+        assert not (dest / 'new' / 'file~').exists()
+        assert (dest / 'foo').samefile(src / 'foo')
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="requires inotify")
+def test_watcher_events():
+    from emanate.watch import Watcher
+
+    with directory_tree({
+            'src': {'foo': '', 'bar': {}, '.git': {}},
+            'dest': {},
+    }) as tmpdir:
+        src = tmpdir / 'src'
+        watcher = Watcher(emanate(tmpdir), debounce=0.05)
+        try:
+            watcher.add_tree()
+            assert sorted(watcher.watches.values()) == ['', 'bar']
+
+            (src / 'bar' / 'baz').write_text('')
+            (src / 'new').mkdir()
+            (src / 'new' / 'file').write_text('')
+            (src / 'foo').unlink()
+            (src / '.git' / 'HEAD').write_text('')
+
+            changed = set()
+            while True:
+                batch = watcher.wait(timeout=0.5)
+                if not batch:
+                    break
+                changed |= batch
+
+            # Events in the new directory may arrive before it is watched.
+            assert {'bar/baz', 'new', 'foo'} <= changed <= {'bar/baz', 'new', 'foo', 'new/file'}
+            assert 'new' in watcher.watches.values()
+        finally:
+            watcher.close()
+
+
+@pytest.mark.skipif(not sys.platform.startswith('linux'), reason="requires inotify")
+def test_watcher_modified():
+    """Copies are refreshed when their source is edited."""
+    from emanate.watch import Watcher
+
+    with directory_tree({'src': {'foo': 'old'}, 'dest': {}}) as tmpdir:
+        src, dest = tmpdir / 'src', tmpdir / 'dest'
+        instance = emanate(tmpdir, mode='copy')
+        instance.create().run()
+        watcher = Watcher(instance, debounce=0.05)
+        try:
+            watcher.add_tree()
+            (src / 'foo').write_text('edited')
+            changed = watcher.wait(timeout=0.5)
+            assert changed == {'foo'}
+            instance.sync(changed).run()
+            assert (dest / 'foo').read_text() == 'edited'
+        finally:
+            watcher.close()
@@ -5,6 +5,9 @@ from pathlib import Path
 from tempfile import TemporaryDirectory
 from contextlib import contextmanager
 
+from emanate import Emanate
+from emanate.config import Config
+
 
 @contextmanager
 def chdir(path):
@@ -47,6 +50,15 @@ def directory_tree(obj):
         yield tmpdir
 
 
+def emanate(root, source='src', fs=None, **options):
+    """Provide an Emanate instance for `root/source`, with destination `root/dest`."""
+    return Emanate(Config({
+        'source': root / source,
+        'destination': root / 'dest',
+        **options,
+    }).resolve(root), fs=fs)
+
+
 @contextmanager
 def home(path):
     """Temporarily set the HOME environment variable."""